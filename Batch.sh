@@ -30,15 +30,28 @@ get_scale() {
     esac
 }
 
+# 任务清单（与 Python 脚本共用），没有 python3 时退回每次全部重新处理
+MANIFEST_SCRIPT="$(cd "$(dirname "$0")" && pwd)/batchManifest.py"
+# should-run 的退出码：0 需要处理，3 可以跳过（与 batchManifest.py 的 SKIP_EXIT_CODE 一致），其他值说明任务清单出错
+MANIFEST_SKIP=3
+manifest() {
+    if command -v python3 >/dev/null 2>&1 && [ -f "$MANIFEST_SCRIPT" ]; then
+        python3 "$MANIFEST_SCRIPT" "$@"
+    else
+        [ "$1" = "should-run" ]
+    fi
+}
+
 # 定义压缩视频的函数
 compress_video() {
-    input_file="$1"
-    output_file="$2"
-    crf="${3:-23}"
-    preset="${4:-medium}"
-    scale="$(get_scale ${5:-1080p})"
-    fps="${6:-30}"
-    audio_bitrate="${7:-128k}"
+    # 使用局部变量，避免覆盖批处理循环中的同名变量
+    local input_file="$1"
+    local output_file="$2"
+    local crf="${3:-23}"
+    local preset="${4:-medium}"
+    local scale="$(get_scale ${5:-1080p})"
+    local fps="${6:-30}"
+    local audio_bitrate="${7:-128k}"
 
     echo "正在处理: $input_file"
     echo "输出到: $output_file"
@@ -49,7 +62,7 @@ compress_video() {
         -vf "scale=$scale,fps=$fps" \
         -c:a aac -b:a $audio_bitrate \
         -movflags +faststart \
-        "$output_file"
+        -y "$output_file"
 }
 
 # 批量处理文件夹的函数
@@ -75,8 +88,27 @@ batch_compress_videos() {
         if ls "${input_dir}"*."${ext}" >/dev/null 2>&1; then
             for input_file in "${input_dir}"*."${ext}"; do
                 output_file="${output_dir}$(basename "${input_file%.*}").mp4"
+                settings="output=$output_file crf=$crf preset=$preset scale=$scale fps=$fps audio_bitrate=$audio_bitrate"
+                # 输入和参数都没变且输出仍在时跳过，中断后重新运行会从未完成的文件继续
+                manifest should-run "$input_file" compress "$settings"
+                status=$?
+                if [ "$status" -eq "$MANIFEST_SKIP" ]; then
+                    echo "跳过未变化的文件: $input_file"
+                    continue
+                elif [ "$status" -ne 0 ]; then
+                    echo "读取任务清单失败（退出码 $status），停止处理" >&2
+                    exit "$status"
+                fi
                 echo "处理文件: $input_file"
-                compress_video "$input_file" "$output_file" "$crf" "$preset" "$scale" "$fps" "$audio_bitrate"
+                # 先写到临时文件，完成后再改名，中途中断不会留下半成品
+                part_file="${output_file%.mp4}.part.mp4"
+                if compress_video "$input_file" "$part_file" "$crf" "$preset" "$scale" "$fps" "$audio_bitrate" < /dev/null \
+                    && mv -f "$part_file" "$output_file"; then
+                    manifest done "$input_file" compress "$settings" "$output_file"
+                else
+                    rm -f "$part_file"
+                    manifest fail "$input_file" compress "$settings" "ffmpeg 压缩失败"
+                fi
                 ((total_files++))
             done
         fi
@@ -7,43 +7,47 @@ FilePath: /add-srt-compress-video/addSrtToMp4.py
 '''
 import os
 from moviepy import VideoFileClip
-import speech_recognition as sr
+from asyncRecognizer import get_backend, recognize_files
+from srtStream import write_cues, segments_to_cues
+from batchManifest import BatchManifest
+
+# 识别引擎：vosk / sphinx 为离线引擎，google 为在线识别，stub 为本地测试桩，
+# mock / http / google-cloud 为异步后端（见 asyncRecognizer.py）
+ENGINE = os.environ.get("SRT_ENGINE", "vosk")
+# 同时在途的识别请求数
+CONCURRENCY = int(os.environ.get("SRT_CONCURRENCY", "16"))
 
 def extract_audio_from_video(video_path, audio_path):
     video = VideoFileClip(video_path)
     video.audio.write_audiofile(audio_path)
 
-def generate_srt_from_audio(audio_path, srt_path):
-    recognizer = sr.Recognizer()
-    with sr.AudioFile(audio_path) as source:
-        audio = recognizer.record(source)
-    try:
-        # 识别音频中的文字
-        text = recognizer.recognize_google(audio, language="zh-CN")
-        # 创建 SRT 文件
-        with open(srt_path, "w", encoding="utf-8") as f:
-            # 简单地将识别到的文本按行分割作为示例
-            lines = text.split(". ")
-            for i, line in enumerate(lines):
-                start_time = i * 3  # 假设每段文本持续3秒
-                end_time = start_time + 3
-                f.write(f"{i+1}\n")
-                f.write(f"{start_time // 60:02d}:{start_time % 60:02d},000 --> {end_time // 60:02d}:{end_time % 60:02d},000\n")
-                f.write(f"{line.strip()}\n\n")
-    except Exception as e:
-        print(f"错误: {e}")
-
-def process_mp4_files_in_folder(folder_path):
+def process_mp4_files_in_folder(folder_path, manifest=None):
+    # 任务清单记录已完成的文件，重新运行时只处理新增或变化的文件
+    manifest = manifest or BatchManifest()
+    settings = {"engine": ENGINE, "language": "zh-CN"}
+    pending = {}
     for filename in os.listdir(folder_path):
         if filename.endswith(".mp4"):
             video_path = os.path.join(folder_path, filename)
             audio_path = video_path.replace(".mp4", ".wav")
-            srt_path = video_path.replace(".mp4", ".srt")
-            
-            # 提取音频并生成 SRT 文件
+            if not manifest.needs_run(video_path, "mp4_to_srt", settings):
+                print(f"跳过未变化的文件: {filename}")
+                continue
+            # 先提取音频，再把所有文件一起并发识别
             extract_audio_from_video(video_path, audio_path)
-            generate_srt_from_audio(audio_path, srt_path)
-            print(f"已处理: {filename}")
+            pending[audio_path] = video_path
+
+    results = recognize_files(list(pending), get_backend(ENGINE), "zh-CN", CONCURRENCY)
+    for audio_path, video_path in pending.items():
+        segments = results[audio_path]
+        if isinstance(segments, Exception):
+            print(f"错误: {segments}")
+            manifest.fail(video_path, "mp4_to_srt", settings, str(segments))
+            continue
+        srt_path = video_path.replace(".mp4", ".srt")
+        write_cues(srt_path, segments_to_cues(segments))
+        manifest.done(video_path, "mp4_to_srt", settings, [audio_path, srt_path])
+        print(f"已处理: {os.path.basename(video_path)}")
 
 # 输入文件夹路径
 folder_path = "./videos"
@@ -0,0 +1,476 @@
+'''
+Author: Diana Tang
+Date: 2026-10-18 20:55:19
+LastEditors: Diana Tang
+Description: 异步语音识别：可替换的识别后端、连接复用、并发上限、指数退避重试和单次请求超时，自带本地模拟服务
+FilePath: /add-srt-compress-video/asyncRecognizer.py
+'''
+import os
+import json
+import random
+import asyncio
+import argparse
+import collections
+from urllib.parse import urlsplit, urlencode, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from audioStream import SAMPLE_RATE
+from longAudio import iter_chunks
+from segmentRecognizer import speech_bounds
+
+# 与 segmentRecognizer 相同的识别窗口长度（秒）
+MIN_WINDOW_SECONDS = 5
+MAX_WINDOW_SECONDS = 15
+DEFAULT_CONCURRENCY = 16
+# 同时切分的文件数。请求并发由 DEFAULT_CONCURRENCY 统一限制，多开几个文件只是为了在文件交替时不断档，
+# 每个文件都占一个 ffmpeg 进程和最多两倍并发数的窗口
+DEFAULT_FILES = 4
+DEFAULT_RETRIES = 3
+DEFAULT_TIMEOUT = 30.0
+# 第 n 次重试前等待 BACKOFF_SECONDS * 2^n 秒，再加上随机抖动
+BACKOFF_SECONDS = 0.5
+HTTP_ENDPOINT = os.environ.get("SRT_ENDPOINT", "http://127.0.0.1:8765/recognize")
+
+
+class RetryableError(Exception):
+    """可以重试的错误，如服务端 5xx、限流、连接中断"""
+
+
+class RecognitionError(Exception):
+    """不可重试的错误，如请求参数错误"""
+
+
+class ExecutorBackend:
+    """
+    把 segmentRecognizer 中的同步引擎（vosk / sphinx / google / stub）放到线程池里运行，
+    阻塞的识别调用也能并发进行。
+    """
+
+    def __init__(self, engine, workers=None):
+        self.engine = engine
+        self.workers = workers or DEFAULT_CONCURRENCY
+        self._executor = None
+        self._recognizer = None
+
+    async def start(self):
+        import speech_recognition as sr
+        self._sr = sr
+        self._recognizer = sr.Recognizer()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+
+    def _recognize(self, pcm, sample_rate, language):
+        audio = self._sr.AudioData(pcm, sample_rate, 2)
+        try:
+            return self.engine(self._recognizer, audio, language)
+        except self._sr.UnknownValueError:
+            return ""
+        except self._sr.RequestError as e:
+            raise RetryableError(str(e))
+
+    async def recognize(self, pcm, sample_rate, language):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._recognize, pcm, sample_rate, language)
+
+    async def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+class ConnectionPool:
+    """HTTP/1.1 长连接池，空闲连接复用，同时打开的连接数有上限"""
+
+    def __init__(self, host, port, size=DEFAULT_CONCURRENCY):
+        self.host = host
+        self.port = port
+        self._idle = collections.deque()
+        self._slots = asyncio.Semaphore(size)
+
+    async def acquire(self):
+        await self._slots.acquire()
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+            writer.close()
+        try:
+            return await asyncio.open_connection(self.host, self.port)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection, reuse=True):
+        if reuse:
+            self._idle.append(connection)
+        else:
+            connection[1].close()
+        self._slots.release()
+
+    async def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+
+async def _read_response(reader):
+    """
+    读取一个 HTTP 响应，返回 (状态码, 响应头, 正文)。
+    只支持带 Content-Length 的响应；分块传输或读到连接关闭为止的响应无法判断正文在哪里结束，
+    这时正文为 None，连接也不能再复用。
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("连接已关闭")
+    try:
+        status = int(status_line.split()[1])
+    except (IndexError, ValueError):
+        raise RecognitionError(f"无法解析的响应: {status_line[:200]!r}")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    length = headers.get("content-length")
+    if length is None or not length.isdigit():
+        return status, headers, None
+    return status, headers, await reader.readexactly(int(length))
+
+
+def _parse_text(body):
+    """解析识别结果 {"text": "..."}，格式不对时抛出 RecognitionError"""
+    try:
+        result = json.loads(body.decode("utf-8"))
+    except ValueError as e:
+        raise RecognitionError(f"无法解析识别结果: {e}: {body[:200]!r}")
+    if not isinstance(result, dict):
+        raise RecognitionError(f"识别结果不是 JSON 对象: {body[:200]!r}")
+    return result.get("text", "")
+
+
+class HTTPBackend:
+    """
+    通用的 HTTP 识别后端：POST 16 位 PCM（audio/l16）到 endpoint，响应为 {"text": "..."}。
+    连接通过 ConnectionPool 复用；5xx 和 429 视为可重试的错误。
+    """
+
+    def __init__(self, endpoint=HTTP_ENDPOINT, pool_size=DEFAULT_CONCURRENCY):
+        self.endpoint = endpoint
+        self.pool_size = pool_size
+        self._pool = None
+
+    async def start(self):
+        url = urlsplit(self.endpoint)
+        self._host = url.hostname
+        self._path = url.path or "/"
+        self._pool = ConnectionPool(url.hostname, url.port or 80, self.pool_size)
+
+    async def recognize(self, pcm, sample_rate, language):
+        query = urlencode({"rate": sample_rate, "language": language or ""})
+        request = (
+            f"POST {self._path}?{query} HTTP/1.1\r\n"
+            f"Host: {self._host}\r\n"
+            f"Content-Type: audio/l16; rate={sample_rate}\r\n"
+            f"Content-Length: {len(pcm)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode("latin-1")
+        connection = await self._pool.acquire()
+        reader, writer = connection
+        reuse = False
+        try:
+            writer.write(request)
+            writer.write(pcm)
+            await writer.drain()
+            status, headers, body = await _read_response(reader)
+            if status == 200:
+                if body is None:
+                    raise RecognitionError("服务端的响应没有 Content-Length")
+                text = _parse_text(body)
+            reuse = body is not None and headers.get("connection", "").lower() != "close"
+        except (ConnectionError, asyncio.IncompleteReadError, OSError) as e:
+            raise RetryableError(f"连接出错: {e}")
+        finally:
+            # 被取消（超时）或响应有问题时，连接上可能还有未读完的数据，不能复用
+            self._pool.release(connection, reuse)
+        if status == 429 or status >= 500:
+            raise RetryableError(f"服务端返回 {status}")
+        if status != 200:
+            raise RecognitionError(f"服务端返回 {status}: {(body or b'')[:200]!r}")
+        return text
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+
+
+class MockServer:
+    """
+    本地模拟识别服务，协议与 HTTPBackend 相同，完全离线。
+    可以设置延迟和失败率（返回 503）来检验并发、超时和重试。
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.05, fail_rate=0.0, seed=0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.requests = 0
+        self.connections = 0
+        self._random = random.Random(seed)
+        self._server = None
+        self._handlers = set()
+
+    @property
+    def endpoint(self):
+        return f"http://{self.host}:{self.port}/recognize"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def _handle(self, reader, writer):
+        self._handlers.add(asyncio.current_task())
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                pcm = await reader.readexactly(int(headers.get("content-length", 0)))
+                query = parse_qs(urlsplit(request_line.split()[1].decode()).query)
+                rate = int(query.get("rate", [SAMPLE_RATE])[0])
+                self.requests += 1
+                await asyncio.sleep(self.latency)
+                if self._random.random() < self.fail_rate:
+                    status, body = "503 Service Unavailable", b'{"error": "busy"}'
+                else:
+                    text = f"模拟识别{len(pcm) / 2 / rate:.1f}秒"
+                    status, body = "200 OK", json.dumps({"text": text}, ensure_ascii=False).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # 关闭服务时还挂着的长连接会被取消，正常结束即可
+            pass
+        finally:
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            for task in list(self._handlers):
+                task.cancel()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+
+
+class MockBackend(HTTPBackend):
+    """在当前事件循环里启动一个 MockServer 并通过 HTTP 访问它，完整走一遍网络路径"""
+
+    def __init__(self, latency=0.05, fail_rate=0.0, pool_size=DEFAULT_CONCURRENCY):
+        super().__init__(None, pool_size)
+        self.server = MockServer(latency=latency, fail_rate=fail_rate)
+
+    async def start(self):
+        await self.server.start()
+        self.endpoint = self.server.endpoint
+        await super().start()
+
+    async def close(self):
+        await super().close()
+        await self.server.close()
+
+
+class GoogleCloudBackend:
+    """Google Cloud Speech 异步客户端，整个运行期间共用一个 gRPC 通道"""
+
+    async def start(self):
+        from google.cloud import speech_v1p1beta1 as speech
+        self._speech = speech
+        self._client = speech.SpeechAsyncClient()
+
+    async def recognize(self, pcm, sample_rate, language):
+        speech = self._speech
+        config = speech.RecognitionConfig(
+            encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+            sample_rate_hertz=sample_rate,
+            language_code=language,
+        )
+        try:
+            response = await self._client.recognize(config=config, audio=speech.RecognitionAudio(content=pcm))
+        except Exception as e:
+            # 限流、服务不可用等 gRPC 错误都交给重试逻辑
+            raise RetryableError(str(e))
+        return " ".join(r.alternatives[0].transcript for r in response.results if r.alternatives)
+
+    async def close(self):
+        pass
+
+
+def get_backend(name):
+    """按名称创建后端：mock / http / google-cloud，其余名称交给 segmentRecognizer 的同步引擎"""
+    if name == "mock":
+        return MockBackend()
+    if name == "http":
+        return HTTPBackend()
+    if name == "google-cloud":
+        return GoogleCloudBackend()
+    from segmentRecognizer import get_engine
+    return ExecutorBackend(get_engine(name))
+
+
+class AsyncRecognizer:
+    """
+    在一个后端上并发识别大量音频片段。
+    同时在途的请求数不超过 concurrency，同时切分的文件数不超过 files；每个请求单独超时，
+    超时和可重试的错误按指数退避重试，重试用完后该片段被跳过，不会让整个文件失败。
+    """
+
+    def __init__(self, backend, concurrency=DEFAULT_CONCURRENCY, retries=DEFAULT_RETRIES, timeout=DEFAULT_TIMEOUT,
+                 backoff=BACKOFF_SECONDS, files=DEFAULT_FILES):
+        self.backend = backend
+        self.concurrency = concurrency
+        self.files = files
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.retried = 0
+        self.failed = 0
+        self._slots = None
+        self._files = None
+
+    async def __aenter__(self):
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._files = asyncio.Semaphore(self.files)
+        await self.backend.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.backend.close()
+
+    async def recognize(self, pcm, sample_rate=SAMPLE_RATE, language="zh-CN"):
+        """识别一段 16 位 PCM，返回文本"""
+        async with self._slots:
+            for attempt in range(self.retries + 1):
+                try:
+                    return await asyncio.wait_for(self.backend.recognize(pcm, sample_rate, language), self.timeout)
+                except (RetryableError, asyncio.TimeoutError) as e:
+                    if attempt == self.retries:
+                        raise RecognitionError(f"重试 {self.retries} 次后仍然失败: {str(e) or '请求超时'}")
+                    self.retried += 1
+                    delay = self.backoff * 2 ** attempt
+                    await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+    async def _recognize_window(self, offset, samples, bounds, language):
+        pcm = (np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes()
+        try:
+            text = (await self.recognize(pcm, SAMPLE_RATE, language)).strip()
+        except RecognitionError as e:
+            self.failed += 1
+            print(f"识别第 {offset:.2f} 秒处的片段出错: {e}")
+            return None
+        if not text:
+            return None
+        return {"start": float(offset + bounds[0]), "end": float(offset + bounds[1]), "text": text}
+
+    async def recognize_file(self, media_path, language="zh-CN", min_window=MIN_WINDOW_SECONDS,
+                             max_window=MAX_WINDOW_SECONDS):
+        """
+        按静音切分整个文件并发识别，返回按时间排序的 {"start", "end", "text"} 片段。
+        任何 ffmpeg 能解码的格式都可以；同时在内存中的窗口数不超过并发上限的两倍。
+        """
+        pending = collections.deque()
+        segments = []
+
+        async def collect():
+            segment = await pending.popleft()
+            if segment is not None:
+                segments.append(segment)
+
+        # ffmpeg 管道是阻塞读取，放到单独的线程里，避免卡住事件循环里的其他请求
+        loop = asyncio.get_running_loop()
+        reader = ThreadPoolExecutor(max_workers=1)
+        chunks = iter_chunks(media_path, SAMPLE_RATE, min_window, max_window)
+        done = object()
+        try:
+            while True:
+                item = await loop.run_in_executor(reader, next, chunks, done)
+                if item is done:
+                    break
+                offset, samples = item
+                bounds = speech_bounds(samples)
+                if bounds is None:
+                    continue
+                pending.append(asyncio.ensure_future(self._recognize_window(offset, samples, bounds, language)))
+                if len(pending) >= self.concurrency * 2:
+                    await collect()
+            while pending:
+                await collect()
+        finally:
+            for task in pending:
+                task.cancel()
+            # 出错或被取消时关闭生成器以结束 ffmpeg；排在同一个线程里，等正在进行的读取返回后才执行
+            reader.submit(chunks.close)
+            reader.shutdown(wait=False)
+        return segments
+
+    async def _recognize_limited(self, media_path, language):
+        async with self._files:
+            return await self.recognize_file(media_path, language)
+
+    async def recognize_files(self, media_paths, language="zh-CN"):
+        """并发识别多个文件，同时切分的文件不超过 files 个，返回 {路径: 片段列表或异常}"""
+        results = await asyncio.gather(*(self._recognize_limited(p, language) for p in media_paths),
+                                       return_exceptions=True)
+        return dict(zip(media_paths, results))
+
+
+def recognize_files(media_paths, backend, language="zh-CN", concurrency=DEFAULT_CONCURRENCY, **kwargs):
+    """同步调用入口：在新的事件循环里并发识别多个文件"""
+    async def run():
+        async with AsyncRecognizer(backend, concurrency, **kwargs) as recognizer:
+            return await recognizer.recognize_files(list(media_paths), language)
+    return asyncio.run(run())
+
+
+def recognize_file(media_path, backend, language="zh-CN", concurrency=DEFAULT_CONCURRENCY, **kwargs):
+    """同步调用入口：识别单个文件"""
+    result = recognize_files([media_path], backend, language, concurrency, **kwargs)[media_path]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动本地模拟识别服务，供 HTTP 后端离线联调")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    parser.add_argument("--latency", type=float, default=0.05, help="每个请求的模拟延迟（秒）")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="返回 503 的比例，用于检验重试")
+    args = parser.parse_args()
+
+    async def serve():
+        server = MockServer(args.host, args.port, args.latency, args.fail_rate)
+        await server.start()
+        print(f"模拟识别服务已启动: {server.endpoint}")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
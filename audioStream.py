@@ -0,0 +1,97 @@
+'''
+Author: Diana Tang
+Date: 2026-10-18 09:12:40
+LastEditors: Diana Tang
+Description: 通过管道直接读取 ffmpeg 解码出的 PCM 音频，不落地临时 WAV 文件
+FilePath: /add-srt-compress-video/audioStream.py
+'''
+import os
+import tempfile
+import subprocess
+import numpy as np
+
+# Whisper 需要 16kHz 单声道音频
+SAMPLE_RATE = 16000
+# 每次从管道读取的字节数
+CHUNK_SIZE = 1 << 20
+
+
+def open_pcm_stream(media_path, sample_rate=SAMPLE_RATE, duration=None):
+    """启动 ffmpeg，把音频解码为 s16le 单声道 PCM 输出到 stdout，duration 为只解码开头的秒数"""
+    command = [
+        "ffmpeg",
+        "-nostdin",
+        "-loglevel", "error",
+        "-i", media_path,
+        "-vn",
+        "-ac", "1",
+        "-ar", str(sample_rate),
+        "-f", "s16le",
+        *(["-t", str(duration)] if duration else []),
+        "pipe:1"
+    ]
+    return subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def iter_pcm_chunks(process, chunk_size=CHUNK_SIZE):
+    """逐块读取 PCM 数据，保证每块都是完整的 int16 样本"""
+    remainder = b""
+    while True:
+        data = process.stdout.read(chunk_size)
+        if not data:
+            break
+        data = remainder + data
+        cut = len(data) - len(data) % 2
+        remainder = data[cut:]
+        if cut:
+            yield np.frombuffer(data[:cut], np.int16)
+
+
+def wait_pcm_stream(process, media_path):
+    """等待 ffmpeg 退出，失败时抛出带 stderr 的异常"""
+    stderr = process.stderr.read()
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg 解码音频失败: {media_path}: {stderr.decode(errors='ignore').strip()}")
+
+
+def load_audio(media_path, sample_rate=SAMPLE_RATE, use_mmap=False, duration=None):
+    """
+    把媒体文件的音轨解码为 float32 数组，可直接传给 model.transcribe。
+    use_mmap 为 True 时，样本写入一个已经 unlink 的匿名临时文件再做内存映射，
+    超长录音不会占用同等大小的常驻内存，进程退出后文件自动消失。
+    """
+    process = open_pcm_stream(media_path, sample_rate, duration)
+    try:
+        if use_mmap:
+            audio = _load_mmap(process)
+        else:
+            raw = bytearray()
+            while True:
+                data = process.stdout.read(CHUNK_SIZE)
+                if not data:
+                    break
+                raw += data
+            del raw[len(raw) - len(raw) % 2:]
+            audio = np.frombuffer(raw, np.int16).astype(np.float32) / 32768.0
+        wait_pcm_stream(process, media_path)
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    return audio
+
+
+def _load_mmap(process):
+    """把 PCM 流转换为 float32 后顺序写入临时文件，再映射成数组"""
+    fd, path = tempfile.mkstemp(suffix=".f32")
+    os.unlink(path)
+    with os.fdopen(fd, "w+b") as f:
+        samples = 0
+        for chunk in iter_pcm_chunks(process):
+            (chunk.astype(np.float32) / 32768.0).tofile(f)
+            samples += len(chunk)
+        f.flush()
+        if not samples:
+            return np.zeros(0, dtype=np.float32)
+        # np.memmap 会复制文件描述符，关闭 f 不影响映射
+        return np.memmap(f, dtype=np.float32, mode="c", shape=(samples,))
@@ -0,0 +1,242 @@
+'''
+Author: Diana Tang
+Date: 2026-10-18 13:52:47
+LastEditors: Diana Tang
+Description: 并发批量压缩视频，按 CPU 核数同时运行多个 ffmpeg 任务，参数与 Batch.sh 保持一致
+FilePath: /add-srt-compress-video/batchCompress.py
+'''
+import os
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from compressVideo import compress_video, get_scale, probe_duration
+from encoderSelect import resolve_encoder
+from batchManifest import BatchManifest, DEFAULT_MANIFEST
+from runReport import RunReport, maybe_stage, kill_running_ffmpeg
+from mediaProbe import plan_file, print_plan, remux, copy_as_is, SKIP, REMUX, AUDIO, ENCODE
+
+# 支持的视频格式（不区分大小写）
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov')
+
+
+def find_videos(input_dir):
+    """列出输入目录下所有视频文件"""
+    return sorted(
+        os.path.join(input_dir, f) for f in os.listdir(input_dir)
+        if f.lower().endswith(VIDEO_EXTENSIONS)
+    )
+
+
+def get_output_path(input_file, output_dir):
+    """输出文件统一为 mp4，文件名与输入相同"""
+    return os.path.join(output_dir, os.path.splitext(os.path.basename(input_file))[0] + ".mp4")
+
+
+def is_up_to_date(input_file, output_file):
+    """输出文件存在、非空且不早于输入文件时视为已是最新"""
+    try:
+        output_stat = os.stat(output_file)
+    except OSError:
+        return False
+    return output_stat.st_size > 0 and output_stat.st_mtime >= os.stat(input_file).st_mtime
+
+
+def default_parallelism(jobs=None, threads=None):
+    """
+    根据 CPU 核数决定并发任务数和每个任务的线程数。
+    x265 单个任务大约用满 8 个核后收益就很小了，所以默认每 8 个核跑一个任务。
+    """
+    cpus = os.cpu_count() or 1
+    jobs = jobs or max(1, cpus // 8)
+    threads = threads or max(1, cpus // jobs)
+    return jobs, threads
+
+
+class Progress:
+    """线程安全的进度统计"""
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.running = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            self.running += 1
+
+    def finish(self, ok):
+        with self.lock:
+            self.running -= 1
+            self.done += 1
+            if not ok:
+                self.failed += 1
+
+    def report(self):
+        with self.lock:
+            remaining = self.total - self.done - self.running
+            return f"已完成 {self.done}/{self.total}，进行中 {self.running}，剩余 {remaining}，失败 {self.failed}"
+
+
+def schedule_jobs(input_files, output_dir, manifest=None, settings=None):
+    """
+    生成待处理任务，跳过已是最新的输出，按时长从长到短排序。
+    传入 manifest 时以任务清单为准：输入内容和压缩参数都没变且输出仍在时才跳过。
+    """
+    jobs = []
+    skipped = 0
+    for input_file in input_files:
+        output_file = get_output_path(input_file, output_dir)
+        if manifest is not None:
+            up_to_date = not manifest.needs_run(input_file, "compress", settings)
+        else:
+            up_to_date = is_up_to_date(input_file, output_file)
+        if up_to_date:
+            skipped += 1
+            continue
+        # 时长读不到时用文件大小兜底排序
+        jobs.append((probe_duration(input_file), os.path.getsize(input_file), input_file, output_file))
+    # 最长的任务最先开始，避免最后只剩一个长任务在单独跑
+    jobs.sort(reverse=True)
+    return [(input_file, output_file) for _, _, input_file, output_file in jobs], skipped
+
+
+def batch_compress_videos(input_dir, output_dir, crf=23, preset="medium", scale="1080p", fps=30,
+                          audio_bitrate="128k", codec="libx265", jobs=None, threads=None, manifest=None,
+                          report=None, target_quality=None, metric="vmaf", fast_path=True, dry_run=False):
+    """
+    并发压缩目录下的所有视频，返回失败的文件列表。
+    传入 manifest 时每个文件完成后立即记录；传入 report 时记录每个文件的耗时和资源消耗。
+    传入 target_quality 时每个视频单独搜索满足目标画质的 CRF。
+    fast_path 为 True 时先用 ffprobe 探测每个文件并打印处理计划：已满足目标的跳过，只是容器或音频不合适的
+    用流拷贝重新封装或只重编码音频，其余才完整重编码；dry_run 为 True 时只打印计划不执行。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    jobs, threads = default_parallelism(jobs, threads)
+    codec = resolve_encoder(codec)
+    settings = {"output_dir": os.path.abspath(output_dir), "crf": crf, "preset": preset, "scale": scale, "fps": fps,
+                "audio_bitrate": audio_bitrate, "codec": codec}
+    if target_quality is not None:
+        settings.update(target_quality=target_quality, metric=metric)
+    if fast_path:
+        settings["fast_path"] = True
+    tasks, skipped = schedule_jobs(find_videos(input_dir), output_dir, manifest, settings)
+    print(f"共 {len(tasks)} 个待处理文件，跳过 {skipped} 个已是最新的文件")
+
+    plans = {}
+    if fast_path and tasks:
+        with ThreadPoolExecutor(max_workers=min(8, len(tasks))) as executor:
+            results = executor.map(lambda task: plan_file(task[0], scale, fps, audio_bitrate, codec), tasks)
+            plans = {input_file: result for (input_file, _), result in zip(tasks, results)}
+        print_plan([(input_file, *plans[input_file]) for input_file, _ in tasks])
+    if dry_run:
+        return []
+    print(f"并发任务数: {jobs}，每个任务线程数: {threads}，编码器: {codec}，输出分辨率: {get_scale(scale)}")
+
+    progress = Progress(len(tasks))
+    failed = []
+    # 正在写入的临时文件，Ctrl+C 时删除
+    active = set()
+
+    def run(input_file, output_file):
+        progress.start()
+        print(f"开始: {input_file}（{progress.report()}）")
+        # 先写到临时文件，完成后再改名，中途中断不会留下看起来已是最新的半成品
+        tmp_file = output_file[:-4] + ".part.mp4"
+        active.add(tmp_file)
+        started = time.monotonic()
+        media = report.duration(input_file) if report is not None else None
+        try:
+            action = plans.get(input_file, (ENCODE,))[0]
+            with maybe_stage(report, input_file, action if action != ENCODE else "compress", media):
+                if action == SKIP:
+                    copy_as_is(input_file, tmp_file)
+                elif action in (REMUX, AUDIO):
+                    remux(input_file, tmp_file, audio_bitrate if action == AUDIO else None, codec)
+                else:
+                    compress_video(input_file, tmp_file, crf, preset, scale, fps, audio_bitrate, codec,
+                                   threads=threads, quiet=True, target_quality=target_quality, metric=metric)
+            os.replace(tmp_file, output_file)
+        except Exception as e:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            if manifest is not None:
+                manifest.fail(input_file, "compress", settings, e)
+            progress.finish(False)
+            raise
+        finally:
+            active.discard(tmp_file)
+        if manifest is not None:
+            manifest.done(input_file, "compress", settings, [output_file])
+        progress.finish(True)
+        return time.monotonic() - started
+
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        futures = {executor.submit(run, i, o): i for i, o in tasks}
+        for future in as_completed(futures):
+            input_file = futures[future]
+            try:
+                elapsed = future.result()
+                print(f"完成: {input_file}，耗时 {elapsed:.1f} 秒（{progress.report()}）")
+            except Exception as e:
+                failed.append(input_file)
+                print(f"失败: {input_file}: {e}（{progress.report()}）")
+    except KeyboardInterrupt:
+        # 排队的文件不再开始，正在运行的 ffmpeg 直接结束，不等它把编码器里缓冲的帧编完
+        executor.shutdown(wait=False, cancel_futures=True)
+        kill_running_ffmpeg()
+        for tmp_file in list(active):
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+        raise
+    executor.shutdown()
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并发批量压缩视频")
+    parser.add_argument("input_dir", help="输入目录")
+    parser.add_argument("output_dir", help="输出目录")
+    parser.add_argument("crf", nargs="?", type=int, default=23, help="CRF值: 0-51，默认23（数值越小质量越好，文件越大）")
+    parser.add_argument("preset", nargs="?", default="medium", help="编码预设，默认 medium")
+    parser.add_argument("scale", nargs="?", default="1080p", help="分辨率预设 4k/2k/1080p/720p/480p，或直接指定如 1920:1080")
+    parser.add_argument("fps", nargs="?", type=int, default=30, help="帧率，默认30")
+    parser.add_argument("audio_bitrate", nargs="?", default="128k", help="音频比特率，默认128k")
+    parser.add_argument("--codec", default="auto", help="视频编码器，默认 auto 自动选择可用的最快 HEVC 编码器")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="同时运行的 ffmpeg 任务数，默认每 8 个核一个")
+    parser.add_argument("--threads", type=int, default=None, help="每个任务的线程数，默认平分所有核")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST, help="任务清单数据库路径，用于跳过已完成的视频和断点续跑")
+    parser.add_argument("--no-manifest", action="store_true", help="不使用任务清单，只按修改时间判断是否已是最新")
+    parser.add_argument("--report", default=None, help="把每个文件的耗时和资源统计写入该文件（.json 或 .csv）")
+    parser.add_argument("--target-quality", type=float, default=None,
+                        help="目标画质分数（如 VMAF 93 或 SSIM 0.97），指定后每个视频按样本片段自动搜索 CRF")
+    parser.add_argument("--metric", choices=["vmaf", "ssim"], default="vmaf", help="目标画质使用的指标")
+    parser.add_argument("--always-encode", action="store_true", help="不探测源文件，全部完整重编码")
+    parser.add_argument("--dry-run", action="store_true", help="只打印每个文件的处理计划，不执行")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.input_dir):
+        print(f"错误：输入目录 '{args.input_dir}' 不存在")
+        raise SystemExit(1)
+
+    report = RunReport() if args.report else None
+    failed = batch_compress_videos(args.input_dir, args.output_dir, args.crf, args.preset, args.scale, args.fps,
+                                   args.audio_bitrate, args.codec, args.jobs, args.threads,
+                                   None if args.no_manifest else BatchManifest(args.manifest), report,
+                                   args.target_quality, args.metric, not args.always_encode, args.dry_run)
+    if args.dry_run:
+        return
+    print("所有视频处理完成！")
+    print(f"压缩后的视频保存在: {args.output_dir}")
+    if report is not None:
+        report.print_summary()
+        print(f"运行报告已保存到 {report.write(args.report)}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+'''
+Author: Diana Tang
+Date: 2026-10-18 17:02:44
+LastEditors: Diana Tang
+Description: 所有批处理入口共用的 SQLite 任务清单，重新运行时只处理新增或变化的文件，崩溃后从中断处继续
+FilePath: /add-srt-compress-video/batchManifest.py
+'''
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_MANIFEST = os.environ.get(
+    "BATCH_MANIFEST",
+    os.path.join(os.path.expanduser("~"), ".cache", "add-srt-compress-video", "manifest.sqlite")
+)
+# 计算快速哈希时从文件头尾各读取的字节数
+HASH_SAMPLE_BYTES = 1 << 20
+# 命令行 should-run 判断可以跳过时的退出码；不用 1，Python 未捕获的异常也以 1 退出
+SKIP_EXIT_CODE = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    input TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    hash TEXT,
+    settings TEXT,
+    outputs TEXT,
+    status TEXT,
+    error TEXT,
+    updated REAL,
+    PRIMARY KEY (input, stage)
+)
+"""
+
+
+def quick_hash(path):
+    """
+    文件内容的快速哈希：文件大小 + 头尾各 1MB 的 SHA-256。
+    视频文件动辄几个 GB，完整哈希太慢；只改了修改时间而内容没变的文件靠它识别出来。
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(HASH_SAMPLE_BYTES))
+        if size > HASH_SAMPLE_BYTES * 2:
+            f.seek(-HASH_SAMPLE_BYTES, os.SEEK_END)
+            digest.update(f.read(HASH_SAMPLE_BYTES))
+    return digest.hexdigest()
+
+
+def encode_settings(settings):
+    """设置统一序列化为稳定的字符串，字符串原样保留（供 Batch.sh 使用）"""
+    if isinstance(settings, str):
+        return settings
+    return json.dumps(settings, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class BatchManifest:
+    """
+    任务清单，每个 (输入文件, 阶段) 一行，记录输入的大小、修改时间、哈希、使用的设置、输出文件和状态。
+    可以在多个线程和多个进程之间共用同一个数据库文件。
+    """
+
+    def __init__(self, path=DEFAULT_MANIFEST):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(_SCHEMA)
+
+    def _get(self, input_path, stage):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT size, mtime, hash, settings, outputs, status FROM jobs WHERE input = ? AND stage = ?",
+                (os.path.abspath(input_path), stage)
+            ).fetchone()
+
+    def _put(self, input_path, stage, settings, status, outputs=(), error=None, file_hash=None):
+        input_path = os.path.abspath(input_path)
+        stat = os.stat(input_path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (input, stage, size, mtime, hash, settings, outputs, status, error, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (input_path, stage, stat.st_size, stat.st_mtime, file_hash, encode_settings(settings),
+                 json.dumps([os.path.abspath(o) for o in outputs], ensure_ascii=False), status, error, time.time())
+            )
+
+    def needs_run(self, input_path, stage, settings):
+        """输入、设置或输出有任何变化，或上次没有成功完成时返回 True"""
+        row = self._get(input_path, stage)
+        if row is None:
+            return True
+        size, mtime, file_hash, old_settings, outputs, status = row
+        if status != "done" or old_settings != encode_settings(settings):
+            return True
+        stat = os.stat(input_path)
+        if (stat.st_size, stat.st_mtime) != (size, mtime):
+            # 只是修改时间变了而内容没变时，更新记录后仍然跳过
+            if stat.st_size != size or quick_hash(input_path) != file_hash:
+                return True
+            with self._lock:
+                self._conn.execute("UPDATE jobs SET mtime = ? WHERE input = ? AND stage = ?",
+                                   (stat.st_mtime, os.path.abspath(input_path), stage))
+        return not all(os.path.exists(o) for o in json.loads(outputs or "[]"))
+
+    def start(self, input_path, stage, settings):
+        """标记为进行中，崩溃后这一行保持 running，下次会重新处理"""
+        self._put(input_path, stage, settings, "running")
+
+    def done(self, input_path, stage, settings, outputs=()):
+        """标记为完成并记录输出文件"""
+        self._put(input_path, stage, settings, "done", outputs, file_hash=quick_hash(input_path))
+
+    def fail(self, input_path, stage, settings, error):
+        """标记为失败并记录错误信息"""
+        self._put(input_path, stage, settings, "failed", error=str(error))
+
+    def filter_pending(self, input_paths, stage, settings):
+        """过滤出需要处理的输入文件"""
+        pending = [p for p in input_paths if self.needs_run(p, stage, settings)]
+        skipped = len(input_paths) - len(pending)
+        if skipped:
+            print(f"跳过 {skipped} 个未变化且已完成的文件（{stage}）")
+        return pending
+
+    def summary(self):
+        """按阶段和状态统计"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT stage, status, COUNT(*) FROM jobs GROUP BY stage, status ORDER BY stage, status"
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def main(argv):
+    """
+    命令行接口，供 Batch.sh 等 shell 脚本使用：
+      should-run 输入 阶段 设置      需要处理时退出码为 0，可以跳过时为 3，其他值表示出错
+      start 输入 阶段 设置
+      done 输入 阶段 设置 [输出...]
+      fail 输入 阶段 设置 错误信息
+      status
+    """
+    if not argv:
+        print(main.__doc__)
+        return 2
+    manifest = BatchManifest()
+    command, args = argv[0], argv[1:]
+    if command == "should-run":
+        return 0 if manifest.needs_run(*args[:3]) else SKIP_EXIT_CODE
+    if command == "start":
+        manifest.start(*args[:3])
+    elif command == "done":
+        manifest.done(args[0], args[1], args[2], args[3:])
+    elif command == "fail":
+        manifest.fail(*args[:4])
+    elif command == "status":
+        for stage, status, count in manifest.summary():
+            print(f"{stage}\t{status}\t{count}")
+    else:
+        print(main.__doc__)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -5,67 +5,69 @@ LastEditors: Diana Tang
 Description: some description
 FilePath: /add-srt-compress-video/batchSrt.py
 '''
-import re
 import os
+from srtStream import iter_text_lines, punctuate_lines
+from batchManifest import BatchManifest
 
 def remove_srt_timestamps_and_sequence(input_srt):
     """
     Removes sequence numbers and timestamps from SRT content.
+    Accepts a string or any iterable of lines (e.g. an open file) and yields the remaining text lines.
     """
-    pattern = r'(\d+\s*\n|\d{2}:\d{2}:\d{2},\d{3}\s*-->.*\n)'
-    return re.sub(pattern, '', input_srt).strip()
+    if isinstance(input_srt, str):
+        input_srt = input_srt.splitlines()
+    return iter_text_lines(input_srt)
 
-def add_punctuation_to_text(cleaned_content):
+def add_punctuation_to_text(cleaned_lines):
     """
     Adds punctuation to each line of cleaned SRT content.
     Adds commas for all lines except the last, and a period for the last line.
     """
-    lines = [line.strip() for line in cleaned_content.split('\n') if line.strip()]
-    
-    for i in range(len(lines)):
-        if i < len(lines) - 1:
-            lines[i] += ','  # Add comma for all except the last line
-        else:
-            lines[i] += '.'  # Add period for the last line
-    
-    return '\n\n'.join(lines)
+    return punctuate_lines(cleaned_lines)
 
 def process_srt_file(input_file, output_file):
     """
     Processes an individual SRT file: removes timestamps/sequence and adds punctuation.
+    The file is streamed line by line, so memory use does not grow with its size.
     """
-    with open(input_file, 'r', encoding='utf-8') as file:
-        srt_content = file.read()
-
-    # Remove timestamps and sequence numbers
-    cleaned_content = remove_srt_timestamps_and_sequence(srt_content)
-    
-    # Add punctuation
-    final_content = add_punctuation_to_text(cleaned_content)
-
-    # Write the processed content to the output file
-    with open(output_file, 'w', encoding='utf-8') as file:
-        file.write(final_content)
+    with open(input_file, 'r', encoding='utf-8') as src, open(output_file, 'w', encoding='utf-8') as dst:
+        # Remove timestamps and sequence numbers, then add punctuation
+        for i, line in enumerate(add_punctuation_to_text(remove_srt_timestamps_and_sequence(src))):
+            if i:
+                dst.write('\n\n')
+            dst.write(line)
 
-def batch_process_srt_files(input_folder, output_folder):
+def batch_process_srt_files(input_folder, output_folder, manifest=None):
     """
     Processes all SRT files in a specified input folder and saves to the output folder.
+    Files already recorded as done in the batch manifest, and unchanged since, are skipped.
     """
     # Ensure the output folder exists
     os.makedirs(output_folder, exist_ok=True)
+    manifest = manifest or BatchManifest()
+    settings = {"output_folder": os.path.abspath(output_folder)}
     
     # Iterate over all files in the input folder
     for filename in os.listdir(input_folder):
         if filename.endswith('.srt'):  # Process only .srt files
             input_file = os.path.join(input_folder, filename)
             output_file = os.path.join(output_folder, filename)
+            if not manifest.needs_run(input_file, "batch_srt", settings):
+                print(f"Skipped (unchanged): {filename}")
+                continue
             
             # Process the file and save the result to the output folder
-            process_srt_file(input_file, output_file)
+            try:
+                process_srt_file(input_file, output_file)
+            except Exception as e:
+                manifest.fail(input_file, "batch_srt", settings, e)
+                raise
+            manifest.done(input_file, "batch_srt", settings, [output_file])
             print(f"Processed: {filename}")
 
-# Example usage
-input_folder = 'v1'  # Replace with the path to your input folder containing .srt files
-output_folder = 'vv'  # Replace with the path to your output folder where processed files will be saved
+if __name__ == "__main__":
+    # Example usage
+    input_folder = 'v1'  # Replace with the path to your input folder containing .srt files
+    output_folder = 'vv'  # Replace with the path to your output folder where processed files will be saved
 
-batch_process_srt_files(input_folder, output_folder)
+    batch_process_srt_files(input_folder, output_folder)
@@ -0,0 +1,269 @@
+'''
+Author: Diana Tang
+Date: 2026-10-18 18:21:05
+LastEditors: Diana Tang
+Description: 可复现的性能基准：本地生成固定的合成视频、字幕和中文识别结果，测量整条流水线各阶段，与保存的基线比较
+FilePath: /add-srt-compress-video/benchmark.py
+'''
+import os
+import sys
+import json
+import random
+import shutil
+import argparse
+import platform
+import subprocess
+from compressVideo import SCALE_PRESETS, compress_video
+from runReport import measure
+from srtStream import Cue, SRTWriter, segments_to_cues, write_cues
+
+DEFAULT_WORK_DIR = os.path.join(os.path.expanduser("~"), ".cache", "add-srt-compress-video", "bench")
+SRT_SIZES = [10, 1000, 100000, 1000000]
+QUICK_SRT_SIZES = [10, 1000, 10000]
+VIDEO_SECONDS = 10
+QUICK_VIDEO_SECONDS = 3
+# 耗时超过基线这个比例时视为性能回退
+DEFAULT_THRESHOLD = 0.2
+# 差值小于这个秒数时不算回退，极短的项目计时误差比较大
+MIN_DELTA_SECONDS = 0.05
+
+# 生成中文字幕用的词表，包含 SRTToMindmap 的主题词和标记词，让思维导图转换走到所有分支
+WORDS = [
+    "首先", "其次", "然后", "最后", "总之", "因此", "但是", "重点", "核心", "就是", "例如",
+    "浏览器", "渲染", "布局", "绘制", "性能", "优化", "webpack", "打包", "构建", "配置", "插件", "模块",
+    "Jenkins", "部署", "流水线", "我们", "今天", "这个", "一个", "可以", "需要", "大家", "看一下", "代码",
+    "项目", "文件", "时候", "问题", "方式", "直接", "同时", "比较", "简单", "的话",
+]
+PUNCTUATION = ["，", "。", "！", "？", ""]
+
+
+def make_segments(count, seed=0, cue_ms=2500):
+    """生成确定的中文识别结果片段，格式与 Whisper 的 segments 相同"""
+    rng = random.Random(seed)
+    segments = []
+    for i in range(count):
+        text = "".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12))) + rng.choice(PUNCTUATION)
+        segments.append({"start": i * cue_ms / 1000, "end": (i * cue_ms + cue_ms - 100) / 1000, "text": text})
+    return segments
+
+
+def make_srt(path, count, seed=0):
+    """生成包含 count 条中文字幕的 SRT 文件，内容只取决于 count 和 seed"""
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    rng = random.Random(seed)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f, SRTWriter(f) as writer:
+        for i in range(count):
+            text = "".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12))) + rng.choice(PUNCTUATION)
+            writer.write(Cue(None, i * 2500, i * 2500 + 2400, text))
+    os.replace(tmp_path, path)
+    return path
+
+
+def make_video(path, scale, seconds):
+    """用 testsrc2 画面和 sine 音频生成固定内容的测试视频"""
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    size = SCALE_PRESETS.get(scale, scale).replace(":", "x")
+    tmp_path = path[:-4] + ".part.mp4"
+    subprocess.run([
+        "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate=30:duration={seconds}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={seconds}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-b:a", "128k", "-shortest", "-fflags", "+bitexact", "-y", tmp_path
+    ], check=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+class StubModel:
+    """离线的假识别模型，固定返回预先生成的中文片段"""
+
+    def __init__(self, segments):
+        self.segments = segments
+
+    def transcribe(self, audio, **kwargs):
+        return {"segments": self.segments}
+
+
+class Bench:
+    """运行各项基准，每项重复多次取最快的一次"""
+
+    def __init__(self, work_dir, repeat=3):
+        self.work_dir = work_dir
+        self.repeat = repeat
+        self.results = {}
+
+    def path(self, *parts):
+        return os.path.join(self.work_dir, *parts)
+
+    def run(self, name, fn, *args, media_seconds=None, items=None):
+        best = None
+        for _ in range(self.repeat):
+            _, record = measure(name, name, media_seconds, fn, *args)
+            if best is None or record["wall_s"] < best["wall_s"]:
+                best = record
+        result = {key: best[key] for key in ("wall_s", "cpu_s", "peak_rss_mb", "child_peak_rss_mb",
+                                            "media_s", "realtime_factor")}
+        if items:
+            result["items_per_s"] = round(items / best["wall_s"], 1) if best["wall_s"] else None
+        self.results[name] = result
+        rtf = f"，实时倍率 {result['realtime_factor']:.2f}x" if result["realtime_factor"] else ""
+        print(f"{name}: {result['wall_s']:.3f} 秒{rtf}")
+        return result
+
+    def srt(self, sizes):
+        """字幕解析和清理：srtToSrt、batchSrt、srtAdd"""
+        from srtToSrt import remove_srt_timestamps_and_sequence
+        from batchSrt import process_srt_file
+        from srtAdd import add_punctuation_to_text
+        for count in sizes:
+            source = make_srt(self.path("srt", f"{count}.srt"), count)
+            out = self.path("out", f"{count}")
+            os.makedirs(out, exist_ok=True)
+            self.run(f"srtToSrt/{count}", remove_srt_timestamps_and_sequence, source,
+                     os.path.join(out, "text.srt"), items=count)
+            self.run(f"batchSrt/{count}", process_srt_file, source, os.path.join(out, "batch.srt"), items=count)
+            self.run(f"srtAdd/{count}", add_punctuation_to_text, source, os.path.join(out, "punct.srt"), items=count)
+
+    def mindmap(self, sizes):
+        """思维导图转换，每个文件单独转换，不经过任务清单"""
+        from srtToMd import SRTToMindmap, warm_jieba
+        warm_jieba()
+        converter = SRTToMindmap()
+        for count in sizes:
+            source = make_srt(self.path("srt", f"{count}.srt"), count)
+            # convert_file 把 .md 写在输入旁边，并从文件名取主题，所以复制一份到单独的目录并用带主题的文件名
+            target = self.path("mindmap", f"[1.1]--Chrome浏览器渲染-{count}.srt")
+            if not os.path.exists(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copyfile(source, target)
+            self.run(f"mindmap/{count}", converter.convert_file, target, items=count)
+
+    def transcribe(self, scales, seconds):
+        """提取音频 + 假模型识别 + 写字幕，识别本身不耗时，测的是解码和字幕写入"""
+        import main
+        model = StubModel(make_segments(int(seconds * 1000 / 2500)))
+
+        def run(video_path, subtitle_path):
+            _, _, audio = main.load_stage(video_path, None, stream=True)
+            main.generate_srt_file(subtitle_path, main.transcribe_stage(model, audio))
+
+        for scale in scales:
+            video = make_video(self.path("video", f"{scale}.mp4"), scale, seconds)
+            self.run(f"transcribe/{scale}", run, video, self.path("out", f"{scale}.srt"), media_seconds=seconds)
+
+    def burn(self, scales, seconds):
+        """main.burn_subtitles 烧录字幕（libx264）"""
+        import main
+        subtitle_path = self.path("srt", f"video-{seconds}.srt")
+        if not os.path.exists(subtitle_path):
+            write_cues(subtitle_path, segments_to_cues(make_segments(int(seconds * 1000 / 2500))))
+        for scale in scales:
+            video = make_video(self.path("video", f"{scale}.mp4"), scale, seconds)
+            self.run(f"burn/{scale}", main.burn_subtitles, video, subtitle_path,
+                     self.path("out", f"burn-{scale}.mp4"), media_seconds=seconds)
+
+    def compress(self, scales, seconds, source_scale, codec, preset):
+        """把同一个源视频压缩到每个分辨率预设"""
+        source = make_video(self.path("video", f"{source_scale}.mp4"), source_scale, seconds)
+        for scale in scales:
+            self.run(f"compress/{codec}/{scale}", compress_video, source, self.path("out", f"compress-{scale}.mp4"),
+                     23, preset, scale, 30, "128k", codec, None, None, True, media_seconds=seconds)
+
+
+def environment():
+    """记录运行环境，比较时环境不同会给出提示"""
+    try:
+        ffmpeg = subprocess.run(["ffmpeg", "-version"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                text=True).stdout.split("\n", 1)[0]
+    except OSError:
+        ffmpeg = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "ffmpeg": ffmpeg,
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """与基线比较，返回耗时超过阈值的项目 [(名称, 基线秒数, 当前秒数), ...]"""
+    if baseline.get("environment") != results.get("environment"):
+        print("提示：基线的运行环境与当前不同，比较结果仅供参考")
+    regressions = []
+    for name, result in results["results"].items():
+        base = baseline["results"].get(name)
+        if not base or not base["wall_s"]:
+            continue
+        ratio = result["wall_s"] / base["wall_s"]
+        significant = abs(result["wall_s"] - base["wall_s"]) >= MIN_DELTA_SECONDS
+        if significant and ratio > 1 + threshold:
+            mark = "回退"
+        elif significant and ratio < 1 - threshold:
+            mark = "提升"
+        else:
+            mark = "持平"
+        print(f"{name}: {base['wall_s']:.3f} -> {result['wall_s']:.3f} 秒（{ratio:.2f}x，{mark}）")
+        if mark == "回退":
+            regressions.append((name, base["wall_s"], result["wall_s"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用合成数据测量整条流水线的性能，并与基线比较")
+    parser.add_argument("--work-dir", default=DEFAULT_WORK_DIR, help="生成的测试数据和输出目录，测试数据会复用")
+    parser.add_argument("--suite", nargs="+", default=["srt", "mindmap", "transcribe", "burn", "compress"],
+                        choices=["srt", "mindmap", "transcribe", "burn", "compress"], help="要运行的基准")
+    parser.add_argument("--quick", action="store_true", help="只用小规模数据，快速检查")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数，取最快的一次")
+    parser.add_argument("--codec", default="libx264", help="压缩基准使用的编码器，固定编码器才能和基线比较")
+    parser.add_argument("--preset", default="veryfast", help="压缩基准使用的编码预设")
+    parser.add_argument("--output", default=None, help="结果文件，默认写到工作目录的 results.json")
+    parser.add_argument("--baseline", default=None, help="基线文件，默认为工作目录的 baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="耗时超过基线多少比例视为回退")
+    args = parser.parse_args()
+
+    srt_sizes = QUICK_SRT_SIZES if args.quick else SRT_SIZES
+    seconds = QUICK_VIDEO_SECONDS if args.quick else VIDEO_SECONDS
+    scales = ["480p", "720p"] if args.quick else list(SCALE_PRESETS)
+    source_scale = "720p" if args.quick else "4k"
+
+    bench = Bench(args.work_dir, args.repeat)
+    if "srt" in args.suite:
+        bench.srt(srt_sizes)
+    if "mindmap" in args.suite:
+        bench.mindmap(srt_sizes)
+    if "transcribe" in args.suite:
+        bench.transcribe(scales, seconds)
+    if "burn" in args.suite:
+        bench.burn(scales, seconds)
+    if "compress" in args.suite:
+        bench.compress(scales, seconds, source_scale, args.codec, args.preset)
+
+    results = {"environment": environment(), "quick": args.quick, "results": bench.results}
+    output = args.output or bench.path("results.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {output}")
+
+    baseline_path = args.baseline or bench.path("baseline.json")
+    if args.save_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"已保存为基线: {baseline_path}")
+    elif os.path.exists(baseline_path):
+        with open(baseline_path, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"共 {len(regressions)} 项性能回退")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
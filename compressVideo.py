@@ -0,0 +1,157 @@
+'''
+Author: Diana Tang
+Date: 2026-10-18 13:08:26
+LastEditors: Diana Tang
+Description: 一次编码完成烧录字幕和压缩，参数与 Batch.sh 保持一致
+FilePath: /add-srt-compress-video/compressVideo.py
+'''
+import os
+import argparse
+import subprocess
+from encoderSelect import resolve_encoder, input_args, filter_suffix, rate_control_args
+from runReport import RunReport, run_ffmpeg, maybe_stage
+
+# 分辨率预设，与 Batch.sh 中的 get_scale 相同
+SCALE_PRESETS = {
+    "4k": "3840:2160",
+    "2k": "2560:1440",
+    "1080p": "1920:1080",
+    "720p": "1280:720",
+    "480p": "854:480",
+}
+
+
+def get_scale(scale):
+    """把分辨率预设转换为 宽:高，其他值原样返回"""
+    return SCALE_PRESETS.get(scale, scale)
+
+
+def probe_duration(media_path):
+    """用 ffprobe 读取媒体时长（秒），读取失败时返回 0"""
+    command = [
+        "ffprobe",
+        "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        media_path
+    ]
+    try:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+        return float(result.stdout.decode().strip())
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        return 0.0
+
+
+def build_video_filter(scale="1080p", fps=30, subtitle_path=None, subtitle_offset=0):
+    """
+    组装单条滤镜链：subtitles -> scale -> fps。
+    字幕在原始分辨率上渲染后再一起缩放，整个过程只解码、编码一次。
+    只编码视频中间的一段时，subtitle_offset 为这一段的起始秒数，渲染字幕前先把时间戳还原到原视频的时间轴。
+    scale 或 fps 为 None 时保持原视频的分辨率或帧率（与 main.py 只烧录字幕时一致）。
+    """
+    filters = []
+    if subtitle_path and subtitle_offset:
+        filters.append(f"setpts=PTS+{subtitle_offset}/TB")
+        filters.append(f"subtitles='{subtitle_path}'")
+        filters.append("setpts=PTS-STARTPTS")
+    elif subtitle_path:
+        filters.append(f"subtitles='{subtitle_path}'")
+    if scale:
+        filters.append(f"scale={get_scale(scale)}")
+    if fps:
+        filters.append(f"fps={fps}")
+    return ",".join(filters) or "null"
+
+
+def thread_args(codec, threads):
+    """限制单个编码任务使用的线程数，x265 使用自己的线程池参数"""
+    if not threads or not codec.startswith("lib"):
+        return []
+    if codec == "libx265":
+        return ["-x265-params", f"pools={threads}"]
+    return ["-threads", str(threads)]
+
+
+def build_command(input_file, output_file, crf=23, preset="medium", scale="1080p", fps=30, audio_bitrate="128k",
+                  codec="libx265", subtitle_path=None, threads=None, quiet=False):
+    """生成 ffmpeg 命令，codec 为 auto 时自动选择可用的最快编码器"""
+    codec = resolve_encoder(codec)
+    command = ["ffmpeg", "-nostdin"]
+    if quiet:
+        command += ["-hide_banner", "-loglevel", "error", "-nostats"]
+    return command + [
+        *input_args(codec),
+        "-i", input_file,
+        "-vf", build_video_filter(scale, fps, subtitle_path) + filter_suffix(codec),
+        "-c:v", codec, *rate_control_args(codec, crf, preset),
+        *thread_args(codec, threads),
+        "-c:a", "aac", "-b:a", str(audio_bitrate),
+        "-movflags", "+faststart",
+        "-y",
+        output_file
+    ]
+
+
+def compress_video(input_file, output_file, crf=23, preset="medium", scale="1080p", fps=30, audio_bitrate="128k",
+                   codec="libx265", subtitle_path=None, threads=None, quiet=False, target_quality=None,
+                   metric="vmaf"):
+    """
+    压缩单个视频，传入 subtitle_path 时同时烧录字幕。
+    传入 target_quality 时忽略 crf，先用样本片段搜索出满足目标 VMAF/SSIM 的最大 CRF 再整段编码一次。
+    """
+    if target_quality is not None:
+        # qualitySearch 依赖本模块，放在函数里导入避免循环导入
+        from qualitySearch import find_crf
+        codec = resolve_encoder(codec)
+        crf = find_crf(input_file, target_quality, metric, preset, scale, fps, codec)
+        if not quiet:
+            print(f"目标 {metric} {target_quality}，选定 CRF: {crf}")
+    if not quiet:
+        print(f"正在处理: {input_file}")
+        print(f"输出到: {output_file}")
+        print(f"输出分辨率: {get_scale(scale)}")
+
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    command = build_command(input_file, output_file, crf, preset, scale, fps, audio_bitrate, codec, subtitle_path,
+                            threads, quiet)
+    run_ffmpeg(command)
+    return output_file
+
+
+def burn_and_compress(video_path, subtitle_path, output_path, crf=23, preset="medium", scale="1080p", fps=30,
+                      audio_bitrate="128k", codec="libx265", target_quality=None, metric="vmaf"):
+    """烧录字幕并压缩，参数顺序与 main.burn_subtitles 相同，可直接替换"""
+    return compress_video(video_path, output_path, crf, preset, scale, fps, audio_bitrate, codec, subtitle_path,
+                          target_quality=target_quality, metric=metric)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="一次编码完成烧录字幕和压缩视频")
+    parser.add_argument("input_file", help="输入视频")
+    parser.add_argument("output_file", help="输出视频")
+    parser.add_argument("crf", nargs="?", type=int, default=23, help="CRF值: 0-51，默认23（数值越小质量越好，文件越大）")
+    parser.add_argument("preset", nargs="?", default="medium", help="编码预设，默认 medium")
+    parser.add_argument("scale", nargs="?", default="1080p", help="分辨率预设 4k/2k/1080p/720p/480p，或直接指定如 1920:1080")
+    parser.add_argument("fps", nargs="?", type=int, default=30, help="帧率，默认30")
+    parser.add_argument("audio_bitrate", nargs="?", default="128k", help="音频比特率，默认128k")
+    parser.add_argument("--subtitles", default=None, help="要烧录的 SRT 字幕文件")
+    parser.add_argument("--codec", default="auto", help="视频编码器，默认 auto 自动选择可用的最快 HEVC 编码器")
+    parser.add_argument("--report", default=None, help="把耗时和资源统计写入该文件（.json 或 .csv）")
+    parser.add_argument("--target-quality", type=float, default=None,
+                        help="目标画质分数（如 VMAF 93 或 SSIM 0.97），指定后按样本片段自动搜索 CRF")
+    parser.add_argument("--metric", choices=["vmaf", "ssim"], default="vmaf", help="目标画质使用的指标")
+    args = parser.parse_args()
+
+    report = RunReport() if args.report else None
+    media = report.duration(args.input_file) if report is not None else None
+    with maybe_stage(report, args.input_file, "compress", media):
+        compress_video(args.input_file, args.output_file, args.crf, args.preset, args.scale, args.fps,
+                       args.audio_bitrate, args.codec, args.subtitles, target_quality=args.target_quality,
+                       metric=args.metric)
+    if report is not None:
+        report.print_summary()
+        report.write(args.report)
+
+
+if __name__ == "__main__":
+    main()
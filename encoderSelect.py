@@ -0,0 +1,183 @@
+'''
+Author: Diana Tang
+Date: 2026-10-18 14:40:13
+LastEditors: Diana Tang
+Description: 自动选择可用的硬件/软件编码器，并把 CRF/预设映射为各编码器对应的码率控制参数
+FilePath: /add-srt-compress-video/encoderSelect.py
+'''
+import os
+import json
+import shutil
+import tempfile
+import threading
+import subprocess
+from testffmpeg import check_ffmpeg
+
+# 按速度从快到慢排列的候选编码器
+CANDIDATES = {
+    "hevc": ["hevc_nvenc", "hevc_qsv", "hevc_vaapi", "libx265"],
+    "h264": ["h264_nvenc", "h264_qsv", "h264_vaapi", "libx264"],
+}
+# VAAPI 使用的渲染设备
+VAAPI_DEVICE = os.environ.get("VAAPI_DEVICE", "/dev/dri/renderD128")
+# 探测结果缓存文件
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "add-srt-compress-video", "encoders.json")
+# 保护缓存文件的读取-合并-写回
+_cache_lock = threading.Lock()
+
+# x264/x265 预设到 NVENC p1-p7 的映射
+NVENC_PRESETS = {
+    "ultrafast": "p1", "superfast": "p1", "veryfast": "p2", "faster": "p3", "fast": "p3",
+    "medium": "p4", "slow": "p5", "slower": "p6", "veryslow": "p7",
+}
+# QSV 没有 ultrafast/superfast
+QSV_PRESETS = {"ultrafast": "veryfast", "superfast": "veryfast"}
+
+_selected = {}
+
+
+def ffmpeg_version():
+    """ffmpeg 版本信息第一行，用来判断缓存是否失效"""
+    result = subprocess.run(["ffmpeg", "-version"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    return result.stdout.decode(errors="ignore").split("\n", 1)[0]
+
+
+def list_encoders():
+    """解析 ffmpeg -encoders，返回所有视频编码器名称"""
+    result = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"], stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL)
+    encoders = set()
+    for line in result.stdout.decode(errors="ignore").splitlines():
+        parts = line.split()
+        # 形如 " V....D libx265   libx265 H.265 / HEVC"
+        if len(parts) >= 2 and parts[0].startswith("V") and len(parts[0]) == 6:
+            encoders.add(parts[1])
+    return encoders
+
+
+def input_args(encoder):
+    """放在 -i 之前的硬件设备参数"""
+    if encoder.endswith("_vaapi"):
+        return ["-vaapi_device", VAAPI_DEVICE]
+    return []
+
+
+def filter_suffix(encoder):
+    """追加在滤镜链末尾的参数，VAAPI 需要把帧上传到显存"""
+    if encoder.endswith("_vaapi"):
+        return ",format=nv12,hwupload"
+    return ""
+
+
+def rate_control_args(encoder, crf=23, preset="medium"):
+    """把 CRF 和预设映射为各编码器的码率控制参数，NVENC 等硬件编码器会忽略 -crf"""
+    if encoder.endswith("_nvenc"):
+        return ["-preset", NVENC_PRESETS.get(preset, preset), "-rc", "vbr", "-cq", str(crf), "-b:v", "0"]
+    if encoder.endswith("_qsv"):
+        return ["-preset", QSV_PRESETS.get(preset, preset), "-global_quality", str(crf)]
+    if encoder.endswith("_vaapi"):
+        return ["-rc_mode", "CQP", "-qp", str(crf)]
+    return ["-preset", str(preset), "-crf", str(crf)]
+
+
+def test_encoder(encoder):
+    """用很小的测试画面实际编码几帧，确认驱动和硬件真的可用"""
+    command = [
+        "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+        *input_args(encoder),
+        "-f", "lavfi", "-i", "color=c=black:size=256x256:rate=10:duration=0.3",
+        "-vf", "format=yuv420p" + filter_suffix(encoder),
+        "-c:v", encoder,
+        "-frames:v", "3",
+        "-f", "null", "-"
+    ]
+    try:
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return result.returncode == 0
+
+
+def _load_cache():
+    try:
+        with open(CACHE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(key, value):
+    """
+    在锁内重新读取缓存、合并这一项再整体替换，同一进程中并发的写入不会互相覆盖；
+    临时文件名由 mkstemp 生成，不同线程不会写到同一个文件。
+    """
+    directory = os.path.dirname(CACHE_PATH)
+    os.makedirs(directory, exist_ok=True)
+    with _cache_lock:
+        cache = _load_cache()
+        cache[key] = value
+        fd, tmp_path = tempfile.mkstemp(prefix=".encoders-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(cache, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, CACHE_PATH)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+def probe_encoders(refresh=False):
+    """
+    探测所有候选编码器是否可用，结果按 ffmpeg 路径和版本缓存到磁盘，
+    换了 ffmpeg 或传入 refresh 时重新探测。
+    """
+    if not check_ffmpeg():
+        raise RuntimeError("未找到 ffmpeg")
+    key = f"{shutil.which('ffmpeg')}|{ffmpeg_version()}"
+    cache = _load_cache()
+    if not refresh and key in cache:
+        return cache[key]
+
+    available = list_encoders()
+    results = {}
+    for encoders in CANDIDATES.values():
+        for encoder in encoders:
+            results[encoder] = encoder in available and test_encoder(encoder)
+    _save_cache(key, results)
+    return results
+
+
+def select_encoder(codec="hevc", refresh=False):
+    """
+    选出指定编码格式下最快的可用编码器。这个格式一个都不可用时（如 ffmpeg 没有编译 libx265），
+    退回另一种格式中最快的可用编码器；所有候选都不可用时报错。
+    """
+    if codec in _selected and not refresh:
+        return _selected[codec]
+    results = probe_encoders(refresh)
+    # 先试指定的格式，再按 CANDIDATES 的顺序试其他格式
+    order = [codec] + [other for other in CANDIDATES if other != codec]
+    encoder = next((e for family in order for e in CANDIDATES[family] if results.get(e)), None)
+    if encoder is None:
+        raise RuntimeError(f"没有可用的视频编码器，已尝试: {', '.join(e for f in order for e in CANDIDATES[f])}")
+    if encoder not in CANDIDATES[codec]:
+        print(f"没有可用的 {codec} 编码器，改用 {encoder}")
+    _selected[codec] = encoder
+    print(f"使用编码器: {encoder}")
+    return encoder
+
+
+def resolve_encoder(codec):
+    """auto / auto-hevc / auto-h264 转换为实际编码器，其他值原样返回"""
+    if codec in ("auto", "auto-hevc"):
+        return select_encoder("hevc")
+    if codec == "auto-h264":
+        return select_encoder("h264")
+    return codec
+
+
+if __name__ == "__main__":
+    for name, ok in probe_encoders(refresh=True).items():
+        print(f"{name}: {'可用' if ok else '不可用'}")
+    print(f"HEVC: {select_encoder('hevc')}")
+    print(f"H.264: {select_encoder('h264')}")
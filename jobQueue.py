@@ -0,0 +1,584 @@
+'''
+Author: Diana Tang
+Date: 2026-10-18 23:46:20
+LastEditors: Diana Tang
+Description: 多节点任务队列：协调端把提取、识别、烧录和压缩拆成任务写入共享存储上的 SQLite，各节点的工作进程领取任务并以租约和心跳保活
+FilePath: /add-srt-compress-video/jobQueue.py
+'''
+import os
+import sys
+import glob
+import json
+import time
+import socket
+import signal
+import sqlite3
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from batchManifest import quick_hash
+from runReport import shield_children
+
+DEFAULT_QUEUE = os.environ.get(
+    "JOB_QUEUE",
+    os.path.join(os.path.expanduser("~"), ".cache", "add-srt-compress-video", "queue.sqlite")
+)
+# 租约时长（秒），工作进程每隔三分之一租约续一次，崩溃后最多这么久任务就会被其他节点重新领取
+LEASE_SECONDS = 60
+# 没有可领取的任务时的等待间隔（秒）
+IDLE_SECONDS = 2
+# 数据库暂时锁住或共享存储不可达时的重试间隔（秒）
+RETRY_SECONDS = 5
+# 每个任务最多尝试的次数，包括租约过期被收回的次数
+MAX_ATTEMPTS = 3
+# 同时有多种任务可领时，越靠后的阶段越先做，已开始的视频尽快完成，中间产物不会越积越多
+PRIORITIES = {"extract": 0, "compress": 0, "transcribe": 1, "burn": 2, "srt_to_md": 2}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    input TEXT NOT NULL,
+    source TEXT,
+    args TEXT NOT NULL,
+    depends_on INTEGER,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    worker TEXT,
+    lease_until REAL,
+    error TEXT,
+    outputs TEXT,
+    created REAL,
+    updated REAL,
+    UNIQUE (kind, input, source, args)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, priority, id);
+CREATE INDEX IF NOT EXISTS jobs_depends ON jobs (depends_on);
+"""
+
+
+class JobQueue:
+    """
+    保存在一个 SQLite 文件中的任务队列，所有节点通过共享存储（NFS 等）打开同一个文件。
+    网络文件系统上没有 WAL 需要的共享内存，默认使用回滚日志，靠文件锁保证领取任务的原子性。
+    租约使用各节点的本地时钟，节点之间需要用 NTP 同步时间。
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE, journal_mode="DELETE"):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        self._conn.executescript(_SCHEMA)
+
+    def submit(self, kind, input_path, args, depends_on=None, source=None, max_attempts=MAX_ATTEMPTS):
+        """
+        添加一个任务，返回任务编号。同样的任务（阶段、输入、输入内容和参数都相同）只会添加一次，
+        重复提交返回已有的编号，所以可以反复对同一个目录提交。
+        """
+        args = json.dumps(args, sort_keys=True, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (kind, input, source, args, depends_on, priority, max_attempts, created, "
+                "updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, input_path, source, args, depends_on, PRIORITIES.get(kind, 0), max_attempts, now, now)
+            )
+            return self._conn.execute(
+                "SELECT id FROM jobs WHERE kind = ? AND input = ? AND source IS ? AND args = ?",
+                (kind, input_path, source, args)
+            ).fetchone()[0]
+
+    def _reclaim(self, now):
+        """租约过期的任务放回队列，重试次数用完的标记为失败"""
+        expired = self._conn.execute(
+            "SELECT id, worker, attempts, max_attempts FROM jobs WHERE status = 'running' AND lease_until < ?", (now,)
+        ).fetchall()
+        for job_id, worker, attempts, max_attempts in expired:
+            print(f"任务 {job_id} 的租约已过期（{worker}），收回")
+            if attempts >= max_attempts:
+                self._set_failed(job_id, f"租约过期（{worker}），已尝试 {attempts} 次", now)
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', worker = NULL, lease_until = NULL, error = ?, updated = ? "
+                    "WHERE id = ?", (f"租约过期（{worker}）", now, job_id)
+                )
+
+    def _set_failed(self, job_id, error, now):
+        """标记为失败，依赖它的任务不会再有机会运行，一并标记为失败"""
+        self._conn.execute(
+            "UPDATE jobs SET status = 'failed', worker = NULL, lease_until = NULL, error = ?, updated = ? WHERE id = ?",
+            (error, now, job_id)
+        )
+        pending = [job_id]
+        while pending:
+            parent = pending.pop()
+            children = [row[0] for row in self._conn.execute(
+                "SELECT id FROM jobs WHERE depends_on = ? AND status = 'queued'", (parent,))]
+            self._conn.executemany(
+                "UPDATE jobs SET status = 'failed', error = ?, updated = ? WHERE id = ?",
+                [(f"依赖的任务 {parent} 失败", now, child) for child in children]
+            )
+            pending += children
+
+    def claim(self, worker, kinds=None, lease=LEASE_SECONDS):
+        """
+        领取一个依赖已完成的任务，返回 {"id", "kind", "input", "args", "attempts"}，没有可领取的任务时返回 None。
+        领取前先收回租约过期的任务，不需要单独的协调进程。
+        """
+        now = time.time()
+        kind_filter = ""
+        params = []
+        if kinds:
+            kind_filter = f" AND j.kind IN ({', '.join('?' * len(kinds))})"
+            params = list(kinds)
+        with self._lock:
+            # BEGIN IMMEDIATE 立即拿到写锁，两个节点不会领到同一个任务
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._reclaim(now)
+                row = self._conn.execute(
+                    "SELECT j.id, j.kind, j.input, j.args, j.attempts FROM jobs j "
+                    "LEFT JOIN jobs d ON d.id = j.depends_on "
+                    "WHERE j.status = 'queued' AND (j.depends_on IS NULL OR d.status = 'done')" + kind_filter +
+                    " ORDER BY j.priority DESC, j.id LIMIT 1", params
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1, "
+                        "updated = ? WHERE id = ?", (worker, now + lease, now, row[0])
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job_id, kind, input_path, args, attempts = row
+        return {"id": job_id, "kind": kind, "input": input_path, "args": json.loads(args), "attempts": attempts + 1}
+
+    def heartbeat(self, job_id, worker, lease=LEASE_SECONDS):
+        """续租，任务已经不属于该工作进程（租约过期后被收回）时返回 False"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (now + lease, now, job_id, worker)
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id, worker, outputs=()):
+        """标记为完成并记录输出文件，任务已被收回时返回 False"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'done', worker = NULL, lease_until = NULL, error = NULL, outputs = ?, "
+                "updated = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (json.dumps(list(outputs), ensure_ascii=False), time.time(), job_id, worker)
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id, worker, error):
+        """任务出错：还有重试次数时放回队列，否则标记为失败；任务已被收回时返回 False"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND worker = ? AND status = 'running'",
+                    (job_id, worker)
+                ).fetchone()
+                if row is not None:
+                    if row[0] >= row[1]:
+                        self._set_failed(job_id, str(error), now)
+                    else:
+                        self._conn.execute(
+                            "UPDATE jobs SET status = 'queued', worker = NULL, lease_until = NULL, error = ?, "
+                            "updated = ? WHERE id = ?", (str(error), now, job_id)
+                        )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row is not None
+
+    def retry_failed(self):
+        """把所有失败的任务重新放回队列，重试次数清零，返回数量"""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = 0, error = NULL, updated = ? WHERE status = 'failed'",
+                (time.time(),)
+            ).rowcount
+
+    def unfinished(self, kinds=None):
+        """还在排队或运行中的任务数"""
+        query = "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+        params = []
+        if kinds:
+            query += f" AND kind IN ({', '.join('?' * len(kinds))})"
+            params = list(kinds)
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()[0]
+
+    def summary(self):
+        """按阶段和状态统计"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT kind, status, COUNT(*) FROM jobs GROUP BY kind, status ORDER BY kind, status"
+            ).fetchall()
+
+    def failures(self, limit=20):
+        """最近失败的任务 [(编号, 阶段, 输入, 错误), ...]"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, kind, input, error FROM jobs WHERE status = 'failed' ORDER BY updated DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _part_path(path):
+    """
+    同目录下的临时输出文件，保留扩展名供 ffmpeg 判断格式，带上节点和进程避免互相覆盖。
+    先删除同一输出之前崩溃的工作进程留下的临时文件。
+    """
+    root, ext = os.path.splitext(path)
+    for stale in glob.glob(f"{glob.escape(root)}.part-*{glob.escape(ext)}"):
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+    return f"{root}.part-{socket.gethostname()}-{os.getpid()}{ext}"
+
+
+def _publish(tmp_path, path):
+    """输出完成后改名为正式文件名，中途崩溃只会留下临时文件"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+class Worker:
+    """
+    领取并执行任务的工作进程，一次执行一个任务，执行期间由后台线程按时续租。
+    kinds 限定只领取哪些阶段，例如 GPU 节点只做识别、其他节点只做提取和烧录。
+    threads 为识别和压缩使用的线程数，按本节点的核数设置。
+    """
+
+    def __init__(self, queue, name=None, kinds=None, lease=LEASE_SECONDS, threads=None, exit_when_idle=False):
+        self.queue = queue
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.kinds = kinds
+        self.lease = lease
+        self.threads = threads
+        self.exit_when_idle = exit_when_idle
+        self._stopped = threading.Event()
+        self._models = {}
+        self._converter = None
+        self._runner = None
+        self.stages = {
+            "extract": self.extract,
+            "transcribe": self.transcribe,
+            "burn": self.burn,
+            "compress": self.compress,
+            "srt_to_md": self.srt_to_md,
+        }
+
+    def stop(self):
+        """当前任务完成后退出"""
+        self._stopped.set()
+
+    def extract(self, video, audio):
+        from main import extract_audio
+        tmp_path = _part_path(audio)
+        os.makedirs(os.path.dirname(os.path.abspath(audio)), exist_ok=True)
+        extract_audio(video, tmp_path)
+        return [_publish(tmp_path, audio)]
+
+    def transcribe(self, audio, subtitle, model="turbo", language=None):
+        from main import load_model, generate_srt_file
+        # 模型在本进程中只加载一次，之后的识别任务直接复用
+        if model not in self._models:
+            self._models[model] = load_model(model, self.threads)
+        segments = self._models[model].transcribe(audio, language=language)["segments"]
+        tmp_path = _part_path(subtitle)
+        generate_srt_file(tmp_path, segments)
+        return [_publish(tmp_path, subtitle)]
+
+    def burn(self, video, subtitle, output, compress=None):
+        from main import burn_subtitles
+        from compressVideo import burn_and_compress
+        from encoderSelect import resolve_encoder
+        tmp_path = _part_path(output)
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        if compress is None:
+            burn_subtitles(video, subtitle, tmp_path)
+        else:
+            # auto 在执行任务的节点上解析，各节点使用自己可用的硬件编码器
+            settings = dict(compress, codec=resolve_encoder(compress.get("codec", "auto")))
+            burn_and_compress(video, subtitle, tmp_path, **settings)
+        return [_publish(tmp_path, output)]
+
+    def compress(self, input_file, output, codec="auto", **settings):
+        from compressVideo import compress_video
+        from encoderSelect import resolve_encoder
+        tmp_path = _part_path(output)
+        compress_video(input_file, tmp_path, codec=resolve_encoder(codec), threads=self.threads, quiet=True, **settings)
+        return [_publish(tmp_path, output)]
+
+    def srt_to_md(self, subtitle):
+        from srtToMd import SRTToMindmap
+        if self._converter is None:
+            self._converter = SRTToMindmap()
+        output = self._converter.convert_file(subtitle)
+        if output is None:
+            raise RuntimeError(f"转换失败: {subtitle}")
+        return [output]
+
+    def _run_stage(self, job):
+        """
+        在专用线程中执行阶段函数。这个线程屏蔽了 SIGINT，阶段中启动的 ffmpeg、ffprobe 和识别子进程都继承屏蔽，
+        Ctrl+C 只让工作进程停止领取新任务，当前任务照常完成；主线程仍然响应 Ctrl+C。
+        """
+        if self._runner is None:
+            self._runner = ThreadPoolExecutor(max_workers=1, initializer=shield_children)
+        return self._runner.submit(self.stages[job["kind"]], **job["args"]).result()
+
+    def _retry(self, action, *args):
+        """
+        执行一次队列操作。数据库暂时锁住或共享存储不可达（sqlite3.OperationalError）时隔一会儿重试，
+        最多重试一个租约的时长，仍然失败时抛出最后一次的异常。
+        """
+        deadline = time.monotonic() + self.lease
+        while True:
+            try:
+                return action(*args)
+            except sqlite3.OperationalError as e:
+                if time.monotonic() >= deadline:
+                    raise
+                print(f"[{self.name}] 访问队列失败，{RETRY_SECONDS} 秒后重试: {e}")
+                time.sleep(RETRY_SECONDS)
+
+    def _keep_alive(self, job, finished, lost):
+        """
+        每隔三分之一租约续一次。续租出错时缩短间隔重试，
+        只有任务确实已被收回，或者一直续不上直到租约真的过期，才认为丢失了任务。
+        """
+        deadline = time.monotonic() + self.lease
+        interval = self.lease / 3
+        while not finished.wait(interval):
+            sent = time.monotonic()
+            try:
+                owned = self.queue.heartbeat(job["id"], self.name, self.lease)
+            except sqlite3.OperationalError as e:
+                if time.monotonic() >= deadline:
+                    print(f"[{self.name}] 任务 {job['id']} 续租失败，租约已过期: {e}")
+                    lost.set()
+                    return
+                print(f"[{self.name}] 任务 {job['id']} 续租失败，稍后重试: {e}")
+                interval = min(self.lease / 3, RETRY_SECONDS)
+                continue
+            if not owned:
+                lost.set()
+                return
+            deadline = sent + self.lease
+            interval = self.lease / 3
+
+    def run_job(self, job):
+        """执行一个已领取的任务并记录结果，返回是否成功"""
+        print(f"[{self.name}] 开始任务 {job['id']} {job['kind']}: {job['input']}（第 {job['attempts']} 次）")
+        finished = threading.Event()
+        lost = threading.Event()
+        keeper = threading.Thread(target=self._keep_alive, args=(job, finished, lost), daemon=True)
+        keeper.start()
+        started = time.monotonic()
+        try:
+            outputs = self._run_stage(job)
+        except Exception as e:
+            finished.set()
+            keeper.join()
+            print(f"[{self.name}] 任务 {job['id']} 失败: {e}")
+            try:
+                self._retry(self.queue.fail, job["id"], self.name, e)
+            except sqlite3.OperationalError as db_error:
+                # 记录不了失败也没关系，租约过期后任务会被收回重试
+                print(f"[{self.name}] 无法记录任务 {job['id']} 的失败: {db_error}")
+            return False
+        finished.set()
+        keeper.join()
+        try:
+            # 心跳中断期间租约可能已过期并被其他节点领走，这时结果以对方为准
+            completed = not lost.is_set() and self._retry(self.queue.complete, job["id"], self.name, outputs)
+        except sqlite3.OperationalError as e:
+            print(f"[{self.name}] 无法记录任务 {job['id']} 的完成，租约过期后会被重新执行: {e}")
+            return False
+        if not completed:
+            print(f"[{self.name}] 任务 {job['id']} 的租约已被收回，丢弃本次结果")
+            return False
+        print(f"[{self.name}] 完成任务 {job['id']}，耗时 {time.monotonic() - started:.1f} 秒")
+        return True
+
+    def run(self):
+        """循环领取任务直到 stop()；exit_when_idle 时队列中没有排队或运行中的任务后退出"""
+        done = failed = 0
+        while not self._stopped.is_set():
+            try:
+                job = self.queue.claim(self.name, self.kinds, self.lease)
+                idle = job is None and self.exit_when_idle and not self.queue.unfinished(self.kinds)
+            except sqlite3.OperationalError as e:
+                # 数据库暂时锁住或共享存储不可达，工作进程不退出，稍后再领取
+                print(f"[{self.name}] 领取任务失败，{RETRY_SECONDS} 秒后重试: {e}")
+                self._stopped.wait(RETRY_SECONDS)
+                continue
+            if job is None:
+                if idle:
+                    break
+                self._stopped.wait(IDLE_SECONDS)
+                continue
+            if self.run_job(job):
+                done += 1
+            else:
+                failed += 1
+        if self._runner is not None:
+            self._runner.shutdown()
+            self._runner = None
+        print(f"[{self.name}] 退出，完成 {done} 个任务，失败 {failed} 个")
+        return done, failed
+
+
+def submit_videos(queue, videos_folder, output_folder, model="turbo", language=None, compress=None, mindmap=False,
+                  max_attempts=MAX_ATTEMPTS):
+    """
+    为目录中的每个视频提交 提取 -> 识别 -> 烧录（可选 -> 生成思维导图）一串任务，返回提交的视频数。
+    路径一律转换为绝对路径，各节点需要把共享存储挂载在相同的路径下。
+    任务按视频内容区分，视频被替换后重新提交会生成新的任务。
+    """
+    from main import VIDEO_EXTENSIONS, get_output_paths
+    videos = sorted(f for f in os.listdir(videos_folder) if f.endswith(VIDEO_EXTENSIONS))
+    for name in videos:
+        video = os.path.abspath(os.path.join(videos_folder, name))
+        audio, subtitle, output = (os.path.abspath(p) for p in get_output_paths(video, output_folder))
+        source = quick_hash(video)
+        extract_id = queue.submit("extract", video, {"video": video, "audio": audio}, source=source,
+                                  max_attempts=max_attempts)
+        transcribe_id = queue.submit("transcribe", video, {"audio": audio, "subtitle": subtitle, "model": model,
+                                                           "language": language},
+                                     extract_id, source, max_attempts)
+        queue.submit("burn", video, {"video": video, "subtitle": subtitle, "output": output, "compress": compress},
+                     transcribe_id, source, max_attempts)
+        if mindmap:
+            queue.submit("srt_to_md", video, {"subtitle": subtitle}, transcribe_id, source, max_attempts)
+    return len(videos)
+
+
+def submit_compress(queue, input_dir, output_dir, settings, max_attempts=MAX_ATTEMPTS):
+    """为目录中的每个视频提交一个压缩任务，返回提交的数量"""
+    from batchCompress import find_videos, get_output_path
+    videos = find_videos(input_dir)
+    for video in videos:
+        video = os.path.abspath(video)
+        output = os.path.abspath(get_output_path(video, output_dir))
+        queue.submit("compress", video, dict(settings, input_file=video, output=output), source=quick_hash(video),
+                     max_attempts=max_attempts)
+    return len(videos)
+
+
+def print_status(queue):
+    rows = queue.summary()
+    if not rows:
+        print("队列为空")
+    for kind, status, count in rows:
+        print(f"{kind:<12} {status:<8} {count}")
+    for job_id, kind, input_path, error in queue.failures():
+        print(f"失败 {job_id} {kind}: {input_path}: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多节点任务队列：提交任务、在各节点启动工作进程、查看进度")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE, help="队列数据库路径，多节点时放在共享存储上")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit = commands.add_parser("submit", help="为目录中的视频提交 提取 -> 识别 -> 烧录 任务")
+    submit.add_argument("videos_folder", help="输入视频文件夹")
+    submit.add_argument("output_folder", help="输出文件夹")
+    submit.add_argument("--model", default="turbo",
+                        help="识别模型，如 turbo 或 faster-whisper:small:int8（见 transcribeBackend.py）")
+    submit.add_argument("--language", default=None, help="识别语言，默认自动检测")
+    submit.add_argument("--mindmap", action="store_true", help="识别完成后同时生成思维导图 Markdown")
+    submit.add_argument("--compress-only", action="store_true", help="不生成字幕，只提交压缩任务")
+    submit.add_argument("--compress", action="store_true", help="烧录字幕的同时按下列参数压缩")
+    submit.add_argument("--crf", type=int, default=23, help="压缩时的 CRF 值")
+    submit.add_argument("--preset", default="medium", help="压缩时的编码预设")
+    submit.add_argument("--scale", default="1080p", help="压缩时的分辨率预设")
+    submit.add_argument("--fps", type=int, default=30, help="压缩时的帧率")
+    submit.add_argument("--audio-bitrate", default="128k", help="压缩时的音频比特率")
+    submit.add_argument("--codec", default="auto", help="压缩时的视频编码器，auto 在各节点上分别选择")
+    submit.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS, help="每个任务最多尝试的次数")
+
+    for name, help_text in (("worker", "在本节点上领取并执行任务"), ("local", "在本机启动多个工作进程，全部完成后退出")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--kinds", default=None, help="只领取这些阶段的任务，逗号分隔，如 transcribe")
+        command.add_argument("--lease", type=float, default=LEASE_SECONDS, help="租约时长（秒）")
+        command.add_argument("--threads", type=int, default=None, help="识别和压缩使用的线程数")
+    commands.choices["worker"].add_argument("--exit-when-idle", action="store_true", help="队列中没有未完成的任务时退出")
+    commands.choices["local"].add_argument("-n", "--workers", type=int, default=2, help="工作进程数")
+
+    commands.add_parser("status", help="查看各阶段的任务数和失败原因")
+    commands.add_parser("retry", help="把失败的任务重新放回队列")
+    args = parser.parse_args()
+
+    if args.command == "local":
+        # 每个工作进程是独立的 Python 进程，与在不同节点上运行完全相同
+        command = [sys.executable, os.path.abspath(__file__), "--queue", args.queue, "worker", "--exit-when-idle",
+                   "--lease", str(args.lease)]
+        if args.kinds:
+            command += ["--kinds", args.kinds]
+        if args.threads:
+            command += ["--threads", str(args.threads)]
+        workers = [subprocess.Popen(command) for _ in range(args.workers)]
+        # Ctrl+C 同时发给各工作进程，它们完成当前任务后退出，这里继续等待
+        signal.signal(signal.SIGINT, lambda signum, frame: print("正在停止，等待各工作进程完成当前任务"))
+        for worker in workers:
+            worker.wait()
+        args.command = "status"
+
+    queue = JobQueue(args.queue)
+    try:
+        if args.command == "submit":
+            settings = {"crf": args.crf, "preset": args.preset, "scale": args.scale, "fps": args.fps,
+                        "audio_bitrate": args.audio_bitrate, "codec": args.codec}
+            if args.compress_only:
+                count = submit_compress(queue, args.videos_folder, args.output_folder, settings, args.max_attempts)
+            else:
+                if args.model == "auto":
+                    parser.error("各节点硬件不同，队列模式需要指定具体的模型；可以先在识别节点上运行 transcribeBackend.py 校准")
+                count = submit_videos(queue, args.videos_folder, args.output_folder, args.model, args.language,
+                                      settings if args.compress else None, args.mindmap, args.max_attempts)
+            print(f"已为 {count} 个视频提交任务，重复的任务不会再次添加")
+        elif args.command == "worker":
+            worker = Worker(queue, kinds=args.kinds.split(",") if args.kinds else None, lease=args.lease,
+                            threads=args.threads, exit_when_idle=args.exit_when_idle)
+
+            # 收到停止信号后不再领取新任务，当前任务完成后退出；被强制结束时由租约过期收回
+            def stop(signum, frame):
+                print(f"[{worker.name}] 正在停止，等待当前任务完成")
+                worker.stop()
+            signal.signal(signal.SIGINT, stop)
+            signal.signal(signal.SIGTERM, stop)
+            worker.run()
+        elif args.command == "retry":
+            print(f"已重新排队 {queue.retry_failed()} 个任务")
+        else:
+            print_status(queue)
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()
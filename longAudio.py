@@ -0,0 +1,183 @@
+'''
+Author: Diana Tang
+Date: 2026-10-18 10:47:05
+LastEditors: Diana Tang
+Description: 长音频分块识别：能量 VAD 找静音切分点，多进程并行识别后按时间偏移拼接
+FilePath: /add-srt-compress-video/longAudio.py
+'''
+import os
+import signal
+import collections
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from audioStream import SAMPLE_RATE, open_pcm_stream, iter_pcm_chunks, wait_pcm_stream
+from runReport import sigint_handled
+
+# VAD 帧长（毫秒）和静音阈值（dBFS）
+FRAME_MS = 30
+SILENCE_DB = -40.0
+# 每块的最短和最长时长（秒），切分点在这个区间内的静音处
+MIN_CHUNK_SECONDS = 60
+MAX_CHUNK_SECONDS = 300
+# 整块有声帧比例低于该值时视为静音块，直接跳过
+MIN_SPEECH_RATIO = 0.02
+
+
+def frame_energy_db(samples, frame_size):
+    """按帧计算 RMS 能量（dBFS），整段向量化计算"""
+    count = len(samples) // frame_size
+    if not count:
+        return np.zeros(0, dtype=np.float32)
+    frames = samples[:count * frame_size].reshape(count, frame_size)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def find_split_point(samples, sample_rate=SAMPLE_RATE, min_chunk=MIN_CHUNK_SECONDS, max_chunk=MAX_CHUNK_SECONDS,
+                     silence_db=SILENCE_DB):
+    """
+    在 [min_chunk, max_chunk] 区间内寻找切分点（样本下标）。
+    优先选最长一段连续静音的中点；区间内没有静音时退而选能量最低的帧。
+    """
+    frame_size = sample_rate * FRAME_MS // 1000
+    lo = int(min_chunk * sample_rate)
+    hi = min(int(max_chunk * sample_rate), len(samples))
+    if hi <= lo:
+        return hi
+    energy = frame_energy_db(samples[lo:hi], frame_size)
+    if not len(energy):
+        return hi
+
+    silent = energy < silence_db
+    if silent.any():
+        # 用差分找出所有连续静音段的起止帧
+        edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        longest = np.argmax(ends - starts)
+        frame = (starts[longest] + ends[longest]) // 2
+    else:
+        frame = int(np.argmin(energy))
+    return int(lo + frame * frame_size)
+
+
+def speech_ratio(samples, sample_rate=SAMPLE_RATE, silence_db=SILENCE_DB):
+    """有声帧所占比例"""
+    energy = frame_energy_db(samples, sample_rate * FRAME_MS // 1000)
+    if not len(energy):
+        return 0.0
+    return float(np.mean(energy >= silence_db))
+
+
+def iter_chunks(source, sample_rate=SAMPLE_RATE, min_chunk=MIN_CHUNK_SECONDS, max_chunk=MAX_CHUNK_SECONDS,
+                silence_db=SILENCE_DB):
+    """
+    流式切分音频，逐块产出 (起始秒数, float32 样本)。
+    source 可以是媒体文件路径（通过 ffmpeg 管道边读边切），也可以是已经解码好的数组。
+    缓冲区最多只保留一块的数据，内存占用与输入总时长无关。
+    """
+    max_len = int(max_chunk * sample_rate)
+    if isinstance(source, np.ndarray):
+        blocks = (source[i:i + max_len] for i in range(0, len(source), max_len))
+        process = None
+    else:
+        process = open_pcm_stream(source, sample_rate)
+        blocks = (chunk.astype(np.float32) / 32768.0 for chunk in iter_pcm_chunks(process))
+
+    buffer = np.zeros(0, dtype=np.float32)
+    offset = 0
+    try:
+        for block in blocks:
+            buffer = np.concatenate((buffer, block))
+            while len(buffer) >= max_len:
+                split = find_split_point(buffer, sample_rate, min_chunk, max_chunk, silence_db)
+                yield offset / sample_rate, buffer[:split]
+                buffer = buffer[split:].copy()
+                offset += split
+        if len(buffer):
+            yield offset / sample_rate, buffer
+        if process is not None:
+            wait_pcm_stream(process, source)
+    finally:
+        if process is not None and process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+# 子进程中常驻的模型
+_worker_model = None
+
+
+def worker_layout(jobs=None, threads=None):
+    """识别进程数和每个进程的线程数，默认每 4 个核心一个进程，核心在进程之间平分"""
+    jobs = jobs or max(1, (os.cpu_count() or 2) // 4)
+    return jobs, threads or max(1, (os.cpu_count() or 2) // jobs)
+
+
+def _init_worker(model_name, threads, ignore_sigint=False):
+    """子进程初始化：按线程数加载一次模型；ignore_sigint 时忽略 Ctrl+C，由主进程决定何时停止"""
+    global _worker_model
+    if ignore_sigint:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from main import load_model
+    _worker_model = load_model(model_name, threads)
+
+
+def _transcribe_chunk(audio, language=None):
+    """在子进程中识别一块音频，只返回 start/end/text"""
+    result = _worker_model.transcribe(audio, language=language)
+    return [{"start": s["start"], "end": s["end"], "text": s["text"]} for s in result["segments"]]
+
+
+class ChunkedTranscriber:
+    """
+    长音频识别器，接口与 Whisper 模型的 transcribe 保持一致，可以直接替换 main.py 中的模型。
+    每个工作进程各自加载一份模型，同时在途的块数有上限，保证内存占用平稳。
+    """
+
+    def __init__(self, model_name="turbo", jobs=None, threads=None, min_chunk=MIN_CHUNK_SECONDS,
+                 max_chunk=MAX_CHUNK_SECONDS, silence_db=SILENCE_DB):
+        self.model_name = model_name
+        self.jobs, self.threads = worker_layout(jobs, threads)
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.silence_db = silence_db
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            context = multiprocessing.get_context("spawn")
+            self._pool = ProcessPoolExecutor(max_workers=self.jobs, mp_context=context, initializer=_init_worker,
+                                             initargs=(self.model_name, self.threads, sigint_handled()))
+        return self._pool
+
+    def transcribe(self, audio, language=None, **kwargs):
+        """分块识别并把各块的片段时间戳加上块的起始偏移后拼接"""
+        pool = self._get_pool()
+        pending = collections.deque()
+        segments = []
+
+        def collect():
+            offset, future = pending.popleft()
+            for segment in future.result():
+                segment["start"] += offset
+                segment["end"] += offset
+                segments.append(segment)
+
+        chunks = iter_chunks(audio, SAMPLE_RATE, self.min_chunk, self.max_chunk, self.silence_db)
+        for offset, samples in chunks:
+            if speech_ratio(samples, SAMPLE_RATE, self.silence_db) < MIN_SPEECH_RATIO:
+                continue
+            pending.append((offset, pool.submit(_transcribe_chunk, samples, language)))
+            # 在途块数达到上限时先收回最早的结果
+            if len(pending) >= self.jobs * 2:
+                collect()
+        while pending:
+            collect()
+        return {"segments": segments}
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -7,72 +7,55 @@ FilePath: /add-srt-compress-video/main-ffmpeg.py
 '''
 import os
 import cv2
-import whisper
 import moviepy.editor as mp
-import subprocess
+from audioStream import load_audio
+from srtStream import write_cues, segments_to_cues
+from runReport import RunReport, run_ffmpeg
+from transcribeServer import connect as connect_server
+from transcribeBackend import DEFAULT_BACKEND, DEFAULT_COMPUTE_TYPE, load_model, resolve_model
 
 # 设置文件路径
 video_path = "./videos/绪论1中文.mp4"
-audio_path = "./videos/1.1.wav"
 output_video_path = "./videos/绪论1有字幕.mp4"
 final_output_path="./videos/绪论1有字幕音频.mp4"
 subtitle_path = "./videos/subtitles.srt"
+# 各阶段的耗时和资源统计
+report_path = "./videos/run-report.json"
+report = RunReport()
+media = report.duration(video_path)
 
-# 提取视频中的音频并保存为 WAV 格式
-command = [
-    "ffmpeg",
-    "-i", video_path,          # 输入文件
-    "-ac", "1",                # 设置音频为单声道
-    "-ar", "16000",            # 设置采样率为 16kHz
-    "-y",                      # 如果文件已存在则覆盖
-    audio_path                  # 输出文件路径
-]
-subprocess.run(command)
+# 识别模型：SRT_MODEL=auto 时按实时率预算在本机校准后选择，SRT_BACKEND=faster-whisper 时在 CPU 上 int8 推理
+model_name = resolve_model(os.environ.get("SRT_MODEL", "turbo"), DEFAULT_BACKEND, DEFAULT_COMPUTE_TYPE,
+                           sample_path=video_path)
+
+# 常驻识别服务在运行时直接使用，否则加载模型
+with report.stage(video_path, "load_model"):
+    model = connect_server(model_name) or load_model(model_name)
 
-# 加载 Whisper 模型
-model = whisper.load_model("turbo")
+# 通过管道把音频直接解码为 16kHz 单声道数组，不再写临时 WAV 文件
+with report.stage(video_path, "extract", media):
+    audio = load_audio(video_path)
 
 # 使用 Whisper 进行语音识别
-result = model.transcribe(audio_path)
+with report.stage(video_path, "transcribe", media):
+    result = model.transcribe(audio)
 
 # 生成 SRT 字幕文件
 def generate_srt_file(subtitle_path, segments):
     os.makedirs(os.path.dirname(subtitle_path), exist_ok=True)
     if not segments:
         print("未识别到任何内容，字幕文件将为空。")
-    with open(subtitle_path, "w", encoding="utf-8") as f:
-        for i, segment in enumerate(segments):
-            start_time = segment["start"]
-            end_time = segment["end"]
-            text = segment["text"].strip()
-
-            if not text:
-                continue
-
-            # 格式化时间戳
-            start_hours, start_remainder = divmod(start_time, 3600)
-            start_minutes, start_seconds = divmod(start_remainder, 60)
-            start_milliseconds = int((start_seconds % 1) * 1000)
-            start_seconds = int(start_seconds)
-
-            end_hours, end_remainder = divmod(end_time, 3600)
-            end_minutes, end_seconds = divmod(end_remainder, 60)
-            end_milliseconds = int((end_seconds % 1) * 1000)
-            end_seconds = int(end_seconds)
-
-            f.write(f"{i + 1}\n")
-            f.write(f"{int(start_hours):02}:{int(start_minutes):02}:{int(start_seconds):02},{start_milliseconds:03} --> {int(end_hours):02}:{int(end_minutes):02}:{int(end_seconds):02},{end_milliseconds:03}\n")
-            f.write(f"{text}\n\n")
+    write_cues(subtitle_path, segments_to_cues(segments))
 
 # 调用生成 SRT 文件的函数
-generate_srt_file(subtitle_path, result["segments"])
+with report.stage(video_path, "srt", media):
+    generate_srt_file(subtitle_path, result["segments"])
 
 
 # 使用 ffmpeg 将原始音频和字幕叠加到最终输出视频中
 command = [
     "ffmpeg",
     "-i", video_path,      # 输入没有音频的视频
-    # "-i", audio_path,             # 输入原始音频
     "-vf", f"subtitles='{subtitle_path}'",  # 添加字幕
     "-c:v", "libx264",           # 使用 H.264 编码视频
     "-c:a", "aac",               # 使用 AAC 编码音频
@@ -82,6 +65,9 @@ command = [
     final_output_path              # 输出带有音频和字幕的视频
 ]
 
-subprocess.run(command)
+with report.stage(video_path, "burn", media):
+    run_ffmpeg(command, check=False)
 
 print(f"字幕已取得并保存为 {final_output_path}")
+report.print_summary()
+report.write(report_path)
@@ -7,30 +7,68 @@ FilePath: /add-srt-compress-video/main.py
 '''
 
 import os
-import subprocess
-import whisper
+import queue
+import signal
+import argparse
+import functools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from audioStream import load_audio
+from transcriptCache import TranscriptCache, DEFAULT_CACHE_DIR
+from longAudio import ChunkedTranscriber, worker_layout
+from compressVideo import burn_and_compress
+from encoderSelect import resolve_encoder
+from srtStream import write_cues, segments_to_cues
+from batchManifest import BatchManifest, DEFAULT_MANIFEST
+from runReport import RunReport, run_ffmpeg, measure, maybe_stage, sigint_handled, shield_children
+from transcribeServer import DEFAULT_SOCKET, connect as connect_server
+from reburn import reburn, subtitles_changed
+from srtIndex import SubtitleIndex, DEFAULT_INDEX
+import transcribeBackend
+from transcribeBackend import BACKENDS, DEFAULT_BACKEND, COMPUTE_TYPES, DEFAULT_COMPUTE_TYPE, DEFAULT_RTF, resolve_model
 
 # 设置文件夹路径
 videos_folder = "./videos"
 output_folder = "./videos-subtitles"
 
-# 创建输出文件夹
-os.makedirs(output_folder, exist_ok=True)
+# 支持的视频格式
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv')
+# 软字幕轨的语言标签使用 ISO 639-2 三字母代码，常见的两字母代码在这里转换
+LANGUAGE_CODES = {"zh": "chi", "en": "eng", "ja": "jpn", "ko": "kor", "fr": "fre", "de": "ger", "es": "spa",
+                  "ru": "rus", "pt": "por", "it": "ita"}
 
-# 获取 videos 文件夹下的所有视频文件
-video_files = [f for f in os.listdir(videos_folder) if f.endswith(('.mp4', '.avi', '.mkv'))]
 
-# 加载 Whisper 模型
-model = whisper.load_model("turbo")
+def load_model(model_name="turbo", threads=None):
+    """加载识别模型，model_name 可以带后端前缀，如 faster-whisper:small:int8（见 transcribeBackend.py）"""
+    return transcribeBackend.load_model(model_name, threads)
 
-# 处理每个视频文件
-for video_file in video_files:
-    video_path = os.path.join(videos_folder, video_file)
-    audio_path = os.path.join(output_folder, f"{os.path.splitext(video_file)[0]}.wav")
-    subtitle_path = os.path.join(output_folder, f"{os.path.splitext(video_file)[0]}.srt")
-    final_output_path = os.path.join(output_folder, f"{os.path.splitext(video_file)[0]}_with_subtitles.mp4")
 
-    # 提取视频中的音频并保存为 WAV 格式
+class LazyModel:
+    """第一次真正需要识别时才加载模型，全部命中缓存时不会加载"""
+
+    def __init__(self, model_name="turbo", threads=None):
+        self.model_name = model_name
+        self.threads = threads
+        self._model = None
+
+    def transcribe(self, audio, **kwargs):
+        if self._model is None:
+            self._model = load_model(self.model_name, self.threads)
+        return self._model.transcribe(audio, **kwargs)
+
+
+def get_output_paths(video_file, output_folder):
+    """根据视频文件名生成音频、字幕和最终输出视频的路径"""
+    name = os.path.splitext(os.path.basename(video_file))[0]
+    audio_path = os.path.join(output_folder, f"{name}.wav")
+    subtitle_path = os.path.join(output_folder, f"{name}.srt")
+    final_output_path = os.path.join(output_folder, f"{name}_with_subtitles.mp4")
+    return audio_path, subtitle_path, final_output_path
+
+
+def extract_audio(video_path, audio_path):
+    """提取视频中的音频并保存为 WAV 格式"""
     command = [
         "ffmpeg",
         "-i", video_path,
@@ -39,44 +77,20 @@ for video_file in video_files:
         "-y",
         audio_path
     ]
-    subprocess.run(command)
-
-    # 使用 Whisper 进行语音识别
-    result = model.transcribe(audio_path)
-
-    # 生成 SRT 字幕文件
-    def generate_srt_file(subtitle_path, segments):
-        os.makedirs(os.path.dirname(subtitle_path), exist_ok=True)
-        if not segments:
-            print("未识别到任何内容，字幕文件将为空。")
-        with open(subtitle_path, "w", encoding="utf-8") as f:
-            for i, segment in enumerate(segments):
-                start_time = segment["start"]
-                end_time = segment["end"]
-                text = segment["text"].strip()
-
-                if not text:
-                    continue
+    run_ffmpeg(command)
+    return audio_path
 
-                # 格式化时间戳
-                start_hours, start_remainder = divmod(start_time, 3600)
-                start_minutes, start_seconds = divmod(start_remainder, 60)
-                start_milliseconds = int((start_seconds % 1) * 1000)
-                start_seconds = int(start_seconds)
 
-                end_hours, end_remainder = divmod(end_time, 3600)
-                end_minutes, end_seconds = divmod(end_remainder, 60)
-                end_milliseconds = int((end_seconds % 1) * 1000)
-                end_seconds = int(end_seconds)
+def generate_srt_file(subtitle_path, segments):
+    """生成 SRT 字幕文件"""
+    os.makedirs(os.path.dirname(subtitle_path), exist_ok=True)
+    if not segments:
+        print("未识别到任何内容，字幕文件将为空。")
+    write_cues(subtitle_path, segments_to_cues(segments))
 
-                f.write(f"{i + 1}\n")
-                f.write(f"{int(start_hours):02}:{int(start_minutes):02}:{int(start_seconds):02},{start_milliseconds:03} --> {int(end_hours):02}:{int(end_minutes):02}:{int(end_seconds):02},{end_milliseconds:03}\n")
-                f.write(f"{text}\n\n")
 
-    # 调用生成 SRT 文件的函数
-    generate_srt_file(subtitle_path, result["segments"])
-
-    # 使用 ffmpeg 将原始音频和字幕叠加到最终输出视频中
+def burn_subtitles(video_path, subtitle_path, final_output_path):
+    """使用 ffmpeg 将原始音频和字幕叠加到最终输出视频中"""
     command = [
         "ffmpeg",
         "-i", video_path,
@@ -88,7 +102,433 @@ for video_file in video_files:
         "-y",
         final_output_path
     ]
+    run_ffmpeg(command)
+    return final_output_path
+
+
+def find_sidecar_subtitles(video_path):
+    """查找视频旁边的其他语言字幕，文件名形如 视频名.en.srt，返回 [(路径, 语言), ...]"""
+    folder = os.path.dirname(video_path) or "."
+    name = os.path.splitext(os.path.basename(video_path))[0]
+    tracks = []
+    for filename in sorted(os.listdir(folder)):
+        stem, ext = os.path.splitext(filename)
+        if ext.lower() == ".srt" and stem.startswith(name + ".") and "." not in stem[len(name) + 1:]:
+            tracks.append((os.path.join(folder, filename), stem[len(name) + 1:]))
+    return tracks
+
+
+def mux_subtitles(video_path, subtitle_path, final_output_path, language=None, sidecars=True):
+    """
+    把字幕作为软字幕轨封装进视频，音视频流直接拷贝不重新编码，几秒内完成。
+    mp4 使用 mov_text，其他容器使用 srt；sidecars 为 True 时把视频旁边的其他语言字幕一起作为额外的轨道。
+    参数顺序与 burn_subtitles 相同，可直接替换。
+    """
+    tracks = [(subtitle_path, language)]
+    if sidecars:
+        tracks += find_sidecar_subtitles(video_path)
+    command = ["ffmpeg", "-nostdin", "-i", video_path]
+    for path, _ in tracks:
+        command += ["-i", path]
+    command += ["-map", "0:v", "-map", "0:a?"]
+    for i in range(len(tracks)):
+        command += ["-map", f"{i + 1}:0"]
+    subtitle_codec = "mov_text" if final_output_path.lower().endswith((".mp4", ".m4v", ".mov")) else "srt"
+    command += ["-c", "copy", "-c:s", subtitle_codec]
+    for i, (_, track_language) in enumerate(tracks):
+        if track_language:
+            code = LANGUAGE_CODES.get(track_language.lower(), track_language)
+            command += [f"-metadata:s:s:{i}", f"language={code}"]
+    command += [
+        "-disposition:s:0", "default",
+        "-movflags", "+faststart",
+        "-y",
+        final_output_path
+    ]
+    run_ffmpeg(command)
+    return final_output_path
+
+
+def stream_audio(video_path, use_mmap=False):
+    """通过管道把音频直接解码到内存，不写临时 WAV 文件"""
+    return load_audio(video_path, use_mmap=use_mmap)
+
+
+def load_stage(video_path, audio_path, stream=False, use_mmap=False, cache=None, model_name="turbo", language=None,
+               decode_audio=True):
+    """
+    提取阶段：命中识别缓存时直接返回字幕片段，否则返回待识别的音频。
+    decode_audio 为 False 时直接把视频路径交给识别器，由识别器自己边读边解码（长音频分块模式）。
+    """
+    key = None
+    if cache is not None:
+        key = cache.key_for(video_path, model_name, language)
+        segments = cache.get(key)
+        if segments is not None:
+            return key, segments, None
+    if not decode_audio:
+        return key, None, video_path
+    if stream:
+        return key, None, stream_audio(video_path, use_mmap)
+    return key, None, extract_audio(video_path, audio_path)
+
+
+def transcribe_stage(model, audio, key=None, segments=None, cache=None, language=None):
+    """识别阶段：已缓存的片段直接返回，否则调用模型识别并写入缓存"""
+    if segments is None:
+        segments = model.transcribe(audio, language=language)["segments"]
+        if cache is not None:
+            cache.put(key, segments)
+    return segments
+
+
+def stage_settings(output_folder, model_name="turbo", language=None, burn=burn_subtitles):
+    """任务清单中识别阶段和烧录阶段各自使用的设置，任何一项变化都会让对应阶段重新执行"""
+    transcribe_settings = {"output_folder": os.path.abspath(output_folder), "model": model_name, "language": language}
+    if isinstance(burn, functools.partial):
+        burn_settings = {"burn": burn.func.__name__, **burn.keywords}
+    else:
+        burn_settings = {"burn": burn.__name__}
+    burn_settings["output_folder"] = transcribe_settings["output_folder"]
+    return transcribe_settings, burn_settings
+
+
+def _record_burn(manifest, video_path, settings, final_output_path, future):
+    """烧录完成后更新任务清单"""
+    if future.exception() is None:
+        manifest.done(video_path, "burn", settings, [final_output_path])
+    else:
+        manifest.fail(video_path, "burn", settings, future.exception())
+
+
+def _needs_burn(manifest, video_path, burn_settings, burn, subtitle_path, final_output_path):
+    """烧录设置或输入有变化时需要烧录；增量烧录时手工修改过的字幕也需要重新烧录"""
+    if manifest is None or manifest.needs_run(video_path, "burn", burn_settings):
+        return True
+    return getattr(burn, "func", burn) is reburn and subtitles_changed(subtitle_path, final_output_path)
+
+
+def _index_subtitles(index, subtitle_path):
+    """把字幕加入全文索引，内容没有变化时跳过；索引失败不影响视频的处理"""
+    if index is None:
+        return
+    try:
+        index.add_file(subtitle_path)
+    except Exception as e:
+        print(f"字幕索引失败: {subtitle_path}: {e}")
+
+
+def _submit(executor, report, video_path, name, fn, *args):
+    """提交阶段任务，传入 report 时在执行任务的进程或线程中测量，记录随结果一起返回"""
+    if report is None:
+        return executor.submit(fn, *args)
+    return executor.submit(measure, video_path, name, report.duration(video_path), fn, *args)
+
+
+def _result(report, future):
+    """取出 _submit 提交的任务结果，测量记录加入报告"""
+    result = future.result()
+    if report is None:
+        return result
+    result, record = result
+    report.add(record)
+    return result
+
+
+def _finish_burn(report, video_path, failed, pending, future):
+    """烧录完成时立即输出结果，不必等到所有视频都处理完；失败的视频加入 failed"""
+    pending.discard(future)
+    try:
+        print(f"字幕已取得并保存为 {_result(report, future)}")
+    except Exception as e:
+        print(f"处理失败: {video_path}: {e}")
+        failed.append(video_path)
+
+
+def process_video(model, video_path, output_folder, stream=False, use_mmap=False, cache=None,
+                  model_name="turbo", language=None, decode_audio=True, burn=burn_subtitles, manifest=None,
+                  report=None, index=None):
+    """
+    顺序处理单个视频：提取音频 -> 语音识别 -> 生成字幕 -> 烧录字幕。
+    传入 manifest 时已完成且输入和设置都没有变化的阶段会被跳过。
+    传入 report 时记录每个阶段的耗时和资源消耗。
+    传入 index 时把生成或修改过的字幕加入全文索引（见 srtIndex.py）。
+    """
+    audio_path, subtitle_path, final_output_path = get_output_paths(video_path, output_folder)
+    transcribe_settings, burn_settings = stage_settings(output_folder, model_name, language, burn)
+    media = report.duration(video_path) if report is not None else None
+
+    need_srt = manifest is None or manifest.needs_run(video_path, "transcribe", transcribe_settings)
+    if need_srt:
+        with maybe_stage(report, video_path, "extract", media):
+            key, segments, audio = load_stage(video_path, audio_path, stream, use_mmap, cache, model_name, language,
+                                              decode_audio)
+
+        # 使用 Whisper 进行语音识别
+        with maybe_stage(report, video_path, "transcribe", media):
+            segments = transcribe_stage(model, audio, key, segments, cache, language)
+            generate_srt_file(subtitle_path, segments)
+        if manifest is not None:
+            manifest.done(video_path, "transcribe", transcribe_settings, [subtitle_path])
+
+    # 字幕重新生成过时必须重新烧录
+    if need_srt or _needs_burn(manifest, video_path, burn_settings, burn, subtitle_path, final_output_path):
+        _index_subtitles(index, subtitle_path)
+        with maybe_stage(report, video_path, "burn", media):
+            burn(video_path, subtitle_path, final_output_path)
+        if manifest is not None:
+            manifest.done(video_path, "burn", burn_settings, [final_output_path])
+        print(f"字幕已取得并保存为 {final_output_path}")
+    else:
+        print(f"跳过未变化且已完成的视频: {video_path}")
+    return final_output_path
+
+
+def _ignore_sigint():
+    """进程池子进程忽略 Ctrl+C，它启动的 ffmpeg 也收不到，是否停止由主进程决定，进行中的提取和烧录照常完成"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    shield_children()
+
+
+def run_pipeline(model, video_paths, output_folder, jobs=None, queue_size=4, stream=False, use_mmap=False,
+                 cache=None, model_name="turbo", language=None, decode_audio=True, burn=burn_subtitles, manifest=None,
+                 report=None, index=None):
+    """
+    三段流水线处理多个视频。
+    提取音频和烧录字幕在进程池中并行执行，语音识别在当前进程中由已加载的模型串行执行，
+    各阶段之间用有界队列衔接，总耗时接近最慢的那一段而不是三段之和。
+    stream 为 True 时音频通过管道解码到内存，解码本身在 ffmpeg 子进程中完成，
+    所以改用线程读取管道，避免在进程之间拷贝整段音频。
+    传入 cache 时提取阶段会先查识别缓存，命中的视频跳过提取和识别，直接生成字幕并烧录。
+    burn 为烧录阶段执行的函数，需要能被子进程序列化。
+    传入 manifest 时每个阶段完成后立即记录，重新运行时只处理新增或变化的视频，中断后从未完成的阶段继续。
+    传入 report 时在各阶段实际运行的进程中测量耗时和资源消耗，汇总到 report。
+    传入 index 时字幕生成后、烧录之前在当前进程中加入全文索引。
+    video_paths 可以是不会结束的迭代器（见 watchFolder.py），每个视频烧录完成时立即输出结果。
+    调用方自己处理 Ctrl+C 时（见 watchFolder.py），子进程和它们启动的 ffmpeg 不响应 Ctrl+C，进行中的视频照常完成；
+    交互运行时 Ctrl+C 照常中止所有子进程。
+    """
+    jobs = jobs or max(1, (os.cpu_count() or 2) - 1)
+    os.makedirs(output_folder, exist_ok=True)
+    # 已提取但尚未识别的音频数量上限，避免提取阶段跑得太快堆满磁盘
+    audio_queue = queue.Queue(maxsize=queue_size)
+    # 已识别但尚未烧录完成的视频数量上限
+    burn_slots = threading.BoundedSemaphore(queue_size + jobs)
+    burn_futures = set()
+    failed = []
+    transcribe_settings, burn_settings = stage_settings(output_folder, model_name, language, burn)
+
+    # 使用 spawn 启动子进程，避免 fork 已加载模型的进程
+    context = multiprocessing.get_context("spawn")
+    shielded = sigint_handled()
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context,
+                             initializer=_ignore_sigint if shielded else None) as pool, \
+            ThreadPoolExecutor(max_workers=jobs, initializer=shield_children if shielded else None) as readers:
+
+        def produce():
+            try:
+                skipped = 0
+                for video_path in video_paths:
+                    audio_path, subtitle_path, final_output_path = get_output_paths(video_path, output_folder)
+                    need_srt = manifest is None or manifest.needs_run(video_path, "transcribe", transcribe_settings)
+                    if not need_srt and not _needs_burn(manifest, video_path, burn_settings, burn, subtitle_path,
+                                                        final_output_path):
+                        skipped += 1
+                        continue
+                    # 字幕已经生成过时 future 为 None，直接进入烧录阶段
+                    future = None
+                    if need_srt:
+                        executor = readers if stream else pool
+                        future = _submit(executor, report, video_path, "extract", load_stage, video_path,
+                                         audio_path, stream, use_mmap, cache, model_name, language, decode_audio)
+                    audio_queue.put((video_path, subtitle_path, final_output_path, future))
+                if skipped:
+                    print(f"跳过 {skipped} 个未变化且已完成的视频")
+            finally:
+                audio_queue.put(None)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+
+        while True:
+            item = audio_queue.get()
+            if item is None:
+                break
+            video_path, subtitle_path, final_output_path, future = item
+            if future is not None:
+                try:
+                    key, segments, audio = _result(report, future)
+                    media = report.duration(video_path) if report is not None else None
+                    with maybe_stage(report, video_path, "transcribe", media):
+                        segments = transcribe_stage(model, audio, key, segments, cache, language)
+                        generate_srt_file(subtitle_path, segments)
+                except Exception as e:
+                    print(f"处理失败: {video_path}: {e}")
+                    failed.append(video_path)
+                    if manifest is not None:
+                        manifest.fail(video_path, "transcribe", transcribe_settings, e)
+                    continue
+                if manifest is not None:
+                    manifest.done(video_path, "transcribe", transcribe_settings, [subtitle_path])
+
+            _index_subtitles(index, subtitle_path)
+            burn_slots.acquire()
+            burn_future = _submit(pool, report, video_path, "burn", burn, video_path, subtitle_path, final_output_path)
+            burn_futures.add(burn_future)
+            burn_future.add_done_callback(lambda _: burn_slots.release())
+            if manifest is not None:
+                burn_future.add_done_callback(functools.partial(_record_burn, manifest, video_path, burn_settings,
+                                                                final_output_path))
+            burn_future.add_done_callback(functools.partial(_finish_burn, report, video_path, failed, burn_futures))
+
+        producer.join()
+        wait(list(burn_futures))
+
+    return failed
+
+
+def build_parser(description="为视频自动生成并烧录字幕"):
+    """命令行参数，watchFolder.py 使用同一套参数"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("videos_folder", nargs="?", default=videos_folder, help="输入视频文件夹")
+    parser.add_argument("output_folder", nargs="?", default=output_folder, help="输出文件夹")
+    parser.add_argument("--model", default="turbo", help="Whisper 模型名称，auto 表示按 --rtf 校准后自动选择")
+    parser.add_argument("--backend", choices=list(BACKENDS), default=DEFAULT_BACKEND,
+                        help="识别后端：whisper 为原版 PyTorch，faster-whisper 为 CPU 上的 int8 量化推理")
+    parser.add_argument("--compute-type", choices=COMPUTE_TYPES, default=DEFAULT_COMPUTE_TYPE,
+                        help="faster-whisper 的计算精度")
+    parser.add_argument("--threads", type=int, default=None, help="识别使用的线程数，默认使用全部核心")
+    parser.add_argument("--rtf", type=float, default=DEFAULT_RTF,
+                        help="--model auto 时的实时率预算（识别耗时 / 音频时长）")
+    parser.add_argument("--calibration-audio", default=None,
+                        help="--model auto 时用于校准的音频或视频，默认取输入文件夹中的第一个视频")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="提取音频和烧录字幕的并行进程数")
+    parser.add_argument("--queue-size", type=int, default=4, help="阶段之间的队列长度")
+    parser.add_argument("--sequential", action="store_true", help="逐个顺序处理视频")
+    parser.add_argument("--stream", action="store_true", help="通过管道把音频直接送入 Whisper，不写临时 WAV 文件")
+    parser.add_argument("--mmap", action="store_true", help="配合 --stream 使用，超长录音的音频缓冲使用内存映射")
+    parser.add_argument("--language", default=None, help="识别语言，如 zh，默认自动检测")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="识别结果缓存目录")
+    parser.add_argument("--cache-size", type=int, default=512, help="识别结果缓存上限（MB）")
+    parser.add_argument("--no-cache", action="store_true", help="不使用识别结果缓存")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST, help="任务清单数据库路径，用于跳过已完成的视频和断点续跑")
+    parser.add_argument("--no-manifest", action="store_true", help="不使用任务清单，重新处理所有视频")
+    parser.add_argument("--index", nargs="?", const=DEFAULT_INDEX, default=None,
+                        help="把生成的字幕加入全文索引，可指定索引数据库路径（见 srtIndex.py）")
+    parser.add_argument("--report", default=None, help="把各阶段的耗时和资源统计写入该文件（.json 或 .csv）")
+    parser.add_argument("--subtitles", choices=["burn", "mux"], default="burn",
+                        help="burn 把字幕烧录进画面（需要重新编码）；mux 作为软字幕轨封装，音视频直接拷贝")
+    parser.add_argument("--compress", action="store_true", help="烧录字幕的同时按下列参数压缩，只编码一次")
+    parser.add_argument("--incremental", action="store_true",
+                        help="修改字幕后只重新编码有变化的片段，其余部分从上次的输出直接拷贝")
+    parser.add_argument("--crf", type=int, default=23, help="压缩时的 CRF 值")
+    parser.add_argument("--preset", default="medium", help="压缩时的编码预设")
+    parser.add_argument("--scale", default="1080p", help="压缩时的分辨率预设")
+    parser.add_argument("--fps", type=int, default=30, help="压缩时的帧率")
+    parser.add_argument("--audio-bitrate", default="128k", help="压缩时的音频比特率")
+    parser.add_argument("--codec", default="auto", help="压缩时的视频编码器，默认自动选择")
+    parser.add_argument("--target-quality", type=float, default=None,
+                        help="压缩时的目标画质分数（如 VMAF 93），指定后按样本片段自动搜索 CRF")
+    parser.add_argument("--metric", choices=["vmaf", "ssim"], default="vmaf", help="目标画质使用的指标")
+    parser.add_argument("--long-audio", action="store_true", help="长音频模式：按静音切块后多进程并行识别")
+    parser.add_argument("--chunk-workers", type=int, default=None, help="长音频模式下的识别进程数")
+    parser.add_argument("--chunk-threads", type=int, default=None, help="长音频模式下每个识别进程的线程数")
+    parser.add_argument("--max-chunk", type=int, default=300, help="长音频模式下每块的最长秒数")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="常驻识别服务的套接字路径，服务在运行时自动使用")
+    parser.add_argument("--no-server", action="store_true", help="不使用常驻识别服务，在本进程中加载模型")
+    return parser
+
+
+def parse_args(parser):
+    """解析并检查参数组合"""
+    args = parser.parse_args()
+    if args.subtitles == "mux" and args.compress:
+        parser.error("--subtitles mux 不重新编码视频，不能和 --compress 同时使用")
+    if args.incremental and (args.subtitles == "mux" or args.target_quality is not None):
+        parser.error("--incremental 需要固定的编码参数，不能和 --subtitles mux 或 --target-quality 同时使用")
+    return args
+
+
+def build_pipeline(args):
+    """
+    按命令行参数创建模型、识别缓存、任务清单、运行报告、字幕索引和烧录函数。
+    args.model 被替换为实际使用的模型（带后端前缀），之后作为识别缓存和任务清单中的模型名。
+    """
+    if args.long_audio:
+        # 多个工作进程同时识别，每个进程的实时率可以是预算的 jobs 倍
+        jobs, threads = worker_layout(args.chunk_workers, args.chunk_threads)
+        rtf = args.rtf * jobs
+    else:
+        jobs, threads, rtf = None, args.threads, args.rtf
+    sample = args.calibration_audio
+    if args.model == "auto" and sample is None:
+        sample = next((os.path.join(args.videos_folder, f) for f in sorted(os.listdir(args.videos_folder))
+                       if f.endswith(VIDEO_EXTENSIONS)), None)
+    args.model = resolve_model(args.model, args.backend, args.compute_type, rtf, sample, threads, args.language)
+    # 常驻识别服务在运行时直接使用，否则加载识别模型（延迟到第一次需要识别时）
+    if args.long_audio:
+        model = ChunkedTranscriber(args.model, jobs, threads, min_chunk=min(60, args.max_chunk),
+                                   max_chunk=args.max_chunk)
+    else:
+        model = ((None if args.no_server else connect_server(args.model, args.socket))
+                 or LazyModel(args.model, args.threads))
+    cache = None if args.no_cache else TranscriptCache(args.cache_dir, args.cache_size * 1024 * 1024)
+    manifest = None if args.no_manifest else BatchManifest(args.manifest)
+    report = RunReport() if args.report else None
+    index = SubtitleIndex(args.index) if args.index else None
+    burn = burn_subtitles
+    if args.subtitles == "mux":
+        burn = functools.partial(mux_subtitles, language=args.language)
+    elif args.incremental and args.compress:
+        burn = functools.partial(reburn, crf=args.crf, preset=args.preset, scale=args.scale, fps=args.fps,
+                                 audio_bitrate=args.audio_bitrate, codec=resolve_encoder(args.codec))
+    elif args.incremental:
+        burn = functools.partial(reburn)
+    elif args.compress:
+        burn = functools.partial(burn_and_compress, crf=args.crf, preset=args.preset, scale=args.scale,
+                                 fps=args.fps, audio_bitrate=args.audio_bitrate, codec=resolve_encoder(args.codec),
+                                 target_quality=args.target_quality, metric=args.metric)
+    return model, cache, manifest, report, index, burn
+
+
+def close_pipeline(args, model, report, index=None):
+    """关闭长音频识别进程和字幕索引，输出并保存运行报告"""
+    if args.long_audio:
+        model.close()
+    if index is not None:
+        index.close()
+    if report is not None:
+        report.print_summary()
+        print(f"运行报告已保存到 {report.write(args.report)}")
+
+
+def main():
+    args = parse_args(build_parser())
+
+    # 创建输出文件夹
+    os.makedirs(args.output_folder, exist_ok=True)
+
+    # 获取 videos 文件夹下的所有视频文件
+    video_files = [f for f in os.listdir(args.videos_folder) if f.endswith(VIDEO_EXTENSIONS)]
+    video_paths = [os.path.join(args.videos_folder, f) for f in video_files]
+
+    model, cache, manifest, report, index, burn = build_pipeline(args)
+    decode_audio = not args.long_audio
+
+    try:
+        if args.sequential:
+            for video_path in video_paths:
+                process_video(model, video_path, args.output_folder, args.stream, args.mmap, cache,
+                              args.model, args.language, decode_audio, burn, manifest, report, index)
+        else:
+            failed = run_pipeline(model, video_paths, args.output_folder, args.jobs, args.queue_size,
+                                  args.stream, args.mmap, cache, args.model, args.language, decode_audio, burn,
+                                  manifest, report, index)
+            if failed:
+                print(f"共 {len(failed)} 个视频处理失败")
+    finally:
+        close_pipeline(args, model, report, index)
 
-    subprocess.run(command)
 
-    print(f"字幕已取得并保存为 {final_output_path}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+'''
+Author: Diana Tang
+Date: 2026-10-18 20:12:37
+LastEditors: Diana Tang
+Description: 压缩前用 ffprobe 探测每个文件，已经足够小的文件跳过、只重新封装或只重编码音频，其余才完整重编码
+FilePath: /add-srt-compress-video/mediaProbe.py
+'''
+import os
+import json
+import shutil
+import struct
+import subprocess
+from compressVideo import get_scale
+from encoderSelect import resolve_encoder
+from runReport import run_ffmpeg
+
+# 处理方式：跳过（原样放到输出目录）、流拷贝重新封装、只重编码音频、完整重编码
+SKIP = "skip"
+REMUX = "remux"
+AUDIO = "audio"
+ENCODE = "encode"
+
+# 源视频码率不超过 宽 x 高 x 帧率 x 该值 时认为已经压缩得足够小
+MAX_BITS_PER_PIXEL = {"hevc": 0.08, "h264": 0.12}
+# 音频码率允许超出目标的比例
+AUDIO_BITRATE_TOLERANCE = 1.1
+MP4_EXTENSIONS = (".mp4", ".m4v")
+
+
+def probe(media_path):
+    """ffprobe 的 JSON 输出，包含 format 和所有 streams"""
+    command = [
+        "ffprobe", "-v", "error",
+        "-print_format", "json",
+        "-show_format", "-show_streams",
+        media_path
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    return json.loads(result.stdout.decode("utf-8", errors="ignore"))
+
+
+def is_faststart(media_path):
+    """读取 mp4 顶层 box，moov 在 mdat 之前即已是 faststart"""
+    try:
+        with open(media_path, "rb") as f:
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    return False
+                size, kind = struct.unpack(">I4s", header)
+                if kind == b"moov":
+                    return True
+                if kind == b"mdat":
+                    return False
+                if size == 1:
+                    size = struct.unpack(">Q", f.read(8))[0] - 8
+                elif size == 0:
+                    return False
+                f.seek(size - 8, os.SEEK_CUR)
+    except OSError:
+        return False
+
+
+def parse_bitrate(value):
+    """把 128k / 2M / 128000 转换为每秒比特数"""
+    value = str(value).strip().lower()
+    units = {"k": 1000, "m": 1000000}
+    if value and value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+def _frame_rate(stream):
+    num, _, den = str(stream.get("avg_frame_rate") or stream.get("r_frame_rate") or "0/1").partition("/")
+    try:
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def _bitrate(stream, info):
+    """流的码率，容器里没有写流码率时用整体码率估算"""
+    for value in (stream.get("bit_rate"), stream.get("tags", {}).get("BPS"), info.get("format", {}).get("bit_rate")):
+        if value and str(value).isdigit():
+            return int(value)
+    return None
+
+
+def codec_family(encoder):
+    """编码器对应的编码格式，如 libx265 / hevc_nvenc -> hevc"""
+    if "265" in encoder or "hevc" in encoder:
+        return "hevc"
+    if "264" in encoder or "h264" in encoder:
+        return "h264"
+    return encoder
+
+
+def plan_file(media_path, scale="1080p", fps=30, audio_bitrate="128k", codec="libx265", info=None):
+    """
+    决定单个文件的处理方式，返回 (处理方式, 原因)。
+    视频已是目标编码、分辨率和帧率不超过目标、码率不高时不重编码视频；
+    音频是 AAC 且码率不高时不重编码音频；最后再看容器是否已是 faststart 的 mp4。
+    """
+    try:
+        info = info or probe(media_path)
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        return ENCODE, "无法探测"
+    streams = info.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"
+                  and not s.get("disposition", {}).get("attached_pic")), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    if video is None:
+        return ENCODE, "没有视频流"
+
+    family = codec_family(resolve_encoder(codec))
+    width, height = int(video.get("width") or 0), int(video.get("height") or 0)
+    try:
+        target_w, target_h = (int(x) for x in get_scale(scale).split(":"))
+    except ValueError:
+        # 自定义的 scale 表达式（如 iw/2:-2）无法直接比较，按需要重编码处理
+        return ENCODE, f"无法解析分辨率 {scale}"
+    source_fps = _frame_rate(video)
+    bitrate = _bitrate(video, info)
+    if video.get("codec_name") != family:
+        return ENCODE, f"视频编码 {video.get('codec_name')}，目标 {family}"
+    # 竖屏视频按长边、短边分别比较
+    if max(width, height) > max(target_w, target_h) or min(width, height) > min(target_w, target_h):
+        return ENCODE, f"分辨率 {width}x{height} 超过 {target_w}x{target_h}"
+    if source_fps > fps + 0.01:
+        return ENCODE, f"帧率 {source_fps:.2f} 超过 {fps}"
+    limit = width * height * max(source_fps, 1) * MAX_BITS_PER_PIXEL.get(family, 0.1)
+    if bitrate is None or bitrate > limit:
+        rate = f"{bitrate / 1e6:.1f}M" if bitrate else "未知"
+        return ENCODE, f"视频码率 {rate} 高于 {limit / 1e6:.1f}M"
+
+    if audio is not None:
+        audio_rate = _bitrate(audio, info)
+        if audio.get("codec_name") != "aac":
+            return AUDIO, f"音频编码 {audio.get('codec_name')}"
+        if audio_rate and audio_rate > parse_bitrate(audio_bitrate) * AUDIO_BITRATE_TOLERANCE:
+            return AUDIO, f"音频码率 {audio_rate // 1000}k 高于 {audio_bitrate}"
+
+    if not media_path.lower().endswith(MP4_EXTENSIONS):
+        return REMUX, "容器不是 mp4"
+    if family == "hevc" and video.get("codec_tag_string") != "hvc1":
+        return REMUX, "HEVC 标签改为 hvc1 以兼容 Apple 播放器"
+    if not is_faststart(media_path):
+        return REMUX, "添加 faststart"
+    return SKIP, "已满足目标"
+
+
+def remux(input_file, output_file, audio_bitrate=None, codec="libx265"):
+    """流拷贝重新封装为 faststart 的 mp4；传入 audio_bitrate 时只把音频重编码为 AAC"""
+    command = ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-i", input_file,
+               "-map", "0:v:0", "-map", "0:a:0?", "-c:v", "copy"]
+    if codec_family(resolve_encoder(codec)) == "hevc":
+        command += ["-tag:v", "hvc1"]
+    command += ["-c:a", "aac", "-b:a", str(audio_bitrate)] if audio_bitrate else ["-c:a", "copy"]
+    command += ["-movflags", "+faststart", "-y", output_file]
+    run_ffmpeg(command)
+    return output_file
+
+
+def copy_as_is(input_file, output_file):
+    """已满足目标的文件直接放到输出目录，同一文件系统上用硬链接不占额外空间"""
+    if os.path.exists(output_file):
+        os.remove(output_file)
+    try:
+        os.link(input_file, output_file)
+    except OSError:
+        shutil.copy2(input_file, output_file)
+    return output_file
+
+
+def print_plan(plans):
+    """打印处理计划：[(输入文件, 处理方式, 原因), ...]"""
+    labels = {SKIP: "跳过", REMUX: "重新封装", AUDIO: "只编码音频", ENCODE: "完整编码"}
+    for input_file, action, reason in plans:
+        print(f"  {labels[action]:<6} {input_file}（{reason}）")
+    counts = {action: sum(1 for _, a, _ in plans if a == action) for action in labels}
+    print("计划: " + "，".join(f"{labels[a]} {n} 个" for a, n in counts.items() if n))
@@ -6,25 +6,17 @@ Description: some description
 FilePath: /add-srt-compress-video/mp3tosrt.py
 '''
 
-from google.cloud import speech_v1p1beta1 as speech
 import os
+from asyncRecognizer import get_backend, recognize_file
 
 # 设置 Google Cloud 的 JSON 凭证
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "path/to/your/credentials.json"
+os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS", "path/to/your/credentials.json")
 
-client = speech.SpeechClient()
+# 默认使用 Google Cloud 的异步客户端；SRT_ENGINE=mock 时用本地模拟服务离线调试
+ENGINE = os.environ.get("SRT_ENGINE", "google-cloud")
 
-# 配置音频文件信息
-audio = speech.RecognitionAudio(uri="./1-1chinese.mp3")
-config = speech.RecognitionConfig(
-    encoding=speech.RecognitionConfig.AudioEncoding.MP3,
-    language_code="en-US",
-    enable_word_time_offsets=True,
-)
+# 本地解码 mp3，按静音切成短窗口并发识别，不再需要先上传到 gs:// 再等待 long_running_recognize
+segments = recognize_file("./1-1chinese.mp3", get_backend(ENGINE), language="en-US")
 
-# 开始转录
-response = client.long_running_recognize(config=config, audio=audio)
-
-for result in response.results:
-    for word_info in result.alternatives[0].words:
-        print(f"Word: {word_info.word}, start: {word_info.start_time.total_seconds()}, end: {word_info.end_time.total_seconds()}")
+for segment in segments:
+    print(f"Text: {segment['text']}, start: {segment['start']:.2f}, end: {segment['end']:.2f}")
@@ -0,0 +1,197 @@
+'''
+Author: Diana Tang
+Date: 2026-10-18 19:36:12
+LastEditors: Diana Tang
+Description: 按目标画质为每个视频搜索 CRF：截取几段样本并行试编码，用 VMAF/SSIM 打分，二分查找满足目标的最大 CRF
+FilePath: /add-srt-compress-video/qualitySearch.py
+'''
+import os
+import re
+import json
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from compressVideo import build_video_filter, probe_duration
+from encoderSelect import resolve_encoder, input_args, filter_suffix, rate_control_args
+from batchManifest import quick_hash
+
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "add-srt-compress-video", "crf.json")
+# 保护缓存文件的读取-合并-写回，batchCompress 会在多个线程中同时查找
+_cache_lock = threading.Lock()
+# 样本数量和每段样本的秒数
+SAMPLE_COUNT = 3
+SAMPLE_SECONDS = 4
+# CRF 搜索范围
+MIN_CRF = 16
+MAX_CRF = 40
+# 默认目标分数
+DEFAULT_TARGETS = {"vmaf": 93.0, "ssim": 0.97}
+QUIET_ARGS = ["-hide_banner", "-loglevel", "error", "-nostats"]
+
+VMAF_RE = re.compile(r"VMAF score:\s*([\d.]+)")
+SSIM_RE = re.compile(r"All:\s*([\d.]+)")
+
+
+def has_filter(name):
+    """ffmpeg 是否带有某个滤镜，libvmaf 需要编译时启用"""
+    result = subprocess.run(["ffmpeg", "-hide_banner", "-filters"], stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL)
+    return any(line.split()[1:2] == [name] for line in result.stdout.decode(errors="ignore").splitlines())
+
+
+def sample_points(duration, count=SAMPLE_COUNT, length=SAMPLE_SECONDS):
+    """在视频中均匀取 count 段样本的起始秒数，避开片头片尾；视频太短时整段作为一个样本"""
+    if duration <= length * count:
+        return [0.0]
+    step = duration / (count + 1)
+    return [round(step * (i + 1) - length / 2, 3) for i in range(count)]
+
+
+def extract_reference(input_file, output_file, start, length, scale, fps):
+    """截取一段样本，缩放到目标分辨率和帧率后无损编码，作为试编码的输入和打分的参考"""
+    subprocess.run([
+        "ffmpeg", "-nostdin", *QUIET_ARGS, "-ss", f"{start:.3f}", "-t", str(length), "-i", input_file,
+        "-an", "-vf", build_video_filter(scale, fps), "-c:v", "libx264", "-preset", "ultrafast", "-qp", "0",
+        "-pix_fmt", "yuv420p", "-y", output_file
+    ], check=True)
+    return output_file
+
+
+def encode_sample(reference, output_file, crf, preset, codec):
+    """用候选 CRF 编码一段样本，编码参数与正式压缩相同"""
+    subprocess.run([
+        "ffmpeg", "-nostdin", *QUIET_ARGS, *input_args(codec), "-i", reference, "-an",
+        "-vf", "format=yuv420p" + filter_suffix(codec),
+        "-c:v", codec, *rate_control_args(codec, crf, preset), "-y", output_file
+    ], check=True)
+    return output_file
+
+
+def score(distorted, reference, metric="vmaf"):
+    """用 ffmpeg 的 libvmaf 或 ssim 滤镜给编码结果打分"""
+    # 两路按帧序号重新生成时间戳，不同容器的时间基舍入不同，按原时间戳配对的帧会错位
+    lavfi = "[0:v]setpts=N/FRAME_RATE/TB[dist];[1:v]setpts=N/FRAME_RATE/TB[ref];[dist][ref]" + \
+        ("libvmaf" if metric == "vmaf" else "ssim")
+    result = subprocess.run([
+        "ffmpeg", "-nostdin", "-hide_banner", "-nostats", "-i", distorted, "-i", reference,
+        "-lavfi", lavfi, "-f", "null", "-"
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    match = (VMAF_RE if metric == "vmaf" else SSIM_RE).search(result.stderr.decode(errors="ignore"))
+    if not match:
+        raise RuntimeError(f"无法从 ffmpeg 输出中读取 {metric} 分数")
+    return float(match.group(1))
+
+
+def _cache_key(input_file, codec, preset, scale, fps, metric, target):
+    settings = [quick_hash(input_file), codec, preset, scale, fps, metric, target]
+    return hashlib.sha256(json.dumps(settings).encode()).hexdigest()
+
+
+def _load_cache():
+    try:
+        with open(CACHE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(key, value):
+    """
+    在锁内重新读取缓存、合并这一项再整体替换，同一进程中并发的写入不会互相覆盖；
+    临时文件名由 mkstemp 生成，不同线程不会写到同一个文件。
+    """
+    directory = os.path.dirname(CACHE_PATH)
+    os.makedirs(directory, exist_ok=True)
+    with _cache_lock:
+        cache = _load_cache()
+        cache[key] = value
+        fd, tmp_path = tempfile.mkstemp(prefix=".crf-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(cache, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, CACHE_PATH)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+def find_crf(input_file, target=None, metric="vmaf", preset="medium", scale="1080p", fps=30, codec="libx265",
+             jobs=None, min_crf=MIN_CRF, max_crf=MAX_CRF, refresh=False):
+    """
+    二分查找平均分数仍不低于 target 的最大 CRF（即码率最低的 CRF），结果按源文件内容和参数缓存。
+    每一轮所有样本并行试编码、并行打分；画质随 CRF 单调下降，所以最多 log2(范围) 轮。
+    没有任何 CRF 能达到目标时返回 min_crf。
+    """
+    codec = resolve_encoder(codec)
+    target = DEFAULT_TARGETS[metric] if target is None else target
+    if metric == "vmaf" and not has_filter("libvmaf"):
+        raise RuntimeError("当前 ffmpeg 没有启用 libvmaf，请改用 ssim 作为画质指标")
+
+    key = _cache_key(input_file, codec, preset, scale, fps, metric, target)
+    cache = _load_cache()
+    if not refresh and key in cache:
+        return cache[key]["crf"]
+
+    jobs = jobs or os.cpu_count() or 1
+    points = sample_points(probe_duration(input_file))
+    work_dir = tempfile.mkdtemp(prefix=".crf-search-")
+    scores = {}
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            references = list(executor.map(
+                lambda item: extract_reference(input_file, os.path.join(work_dir, f"ref{item[0]}.mkv"), item[1],
+                                               SAMPLE_SECONDS, scale, fps),
+                enumerate(points)
+            ))
+
+            def evaluate(crf):
+                def one(item):
+                    index, reference = item
+                    encoded = encode_sample(reference, os.path.join(work_dir, f"crf{crf}-{index}.mp4"), crf, preset,
+                                            codec)
+                    return score(encoded, reference, metric)
+                values = list(executor.map(one, enumerate(references)))
+                scores[crf] = sum(values) / len(values)
+                print(f"CRF {crf}: {metric} {scores[crf]:.4f}")
+                return scores[crf]
+
+            lo, hi = min_crf, max_crf
+            best = min_crf
+            while lo <= hi:
+                crf = (lo + hi) // 2
+                if evaluate(crf) >= target:
+                    best = crf
+                    lo = crf + 1
+                else:
+                    hi = crf - 1
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    _save_cache(key, {"crf": best, "metric": metric, "target": target, "score": scores.get(best)})
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按目标画质搜索视频的 CRF")
+    parser.add_argument("input_file", help="输入视频")
+    parser.add_argument("--metric", choices=["vmaf", "ssim"], default="vmaf", help="画质指标")
+    parser.add_argument("--target", type=float, default=None, help="目标分数，默认 VMAF 93 / SSIM 0.97")
+    parser.add_argument("--preset", default="medium", help="编码预设")
+    parser.add_argument("--scale", default="1080p", help="分辨率预设")
+    parser.add_argument("--fps", type=int, default=30, help="帧率")
+    parser.add_argument("--codec", default="auto", help="视频编码器")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="并行试编码的任务数")
+    parser.add_argument("--refresh", action="store_true", help="忽略缓存重新搜索")
+    args = parser.parse_args()
+
+    crf = find_crf(args.input_file, args.target, args.metric, args.preset, args.scale, args.fps, args.codec,
+                   args.jobs, refresh=args.refresh)
+    print(f"选定 CRF: {crf}")
+
+
+if __name__ == "__main__":
+    main()
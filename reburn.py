@@ -0,0 +1,264 @@
+'''
+Author: Diana Tang
+Date: 2026-10-18 21:52:40
+LastEditors: Diana Tang
+Description: 增量重新烧录：对比新旧字幕，只重新编码字幕有变化的关键帧区间，其余部分从上次的输出直接拷贝拼接
+FilePath: /add-srt-compress-video/reburn.py
+'''
+import os
+import io
+import json
+import bisect
+import shutil
+import argparse
+import subprocess
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from compressVideo import build_video_filter, probe_duration
+from encoderSelect import resolve_encoder, input_args, filter_suffix, rate_control_args
+from segmentEncode import QUIET_ARGS, probe_keyframes, has_audio, build_segment_command, concat_segments
+from mediaProbe import probe
+from srtStream import parse, read_cues
+from runReport import run_ffmpeg, current_stage
+
+# 需要重新编码的时长超过该比例时直接整段重新烧录，拼接已经省不了多少时间
+MAX_PARTIAL_RATIO = 0.5
+# 记录上次烧录使用的字幕和编码参数，与输出视频放在一起
+STATE_SUFFIX = ".burn.json"
+
+
+def state_path(output_file):
+    return output_file + STATE_SUFFIX
+
+
+def load_state(output_file):
+    """上次烧录的状态 {"settings": ..., "srt": 字幕全文}，没有记录或输出已不存在时返回 None"""
+    if not os.path.exists(output_file):
+        return None
+    try:
+        with open(state_path(output_file), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_state(output_file, settings, subtitle_path):
+    with open(subtitle_path, "r", encoding="utf-8") as f:
+        state = {"settings": settings, "srt": f.read()}
+    tmp_path = f"{state_path(output_file)}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, state_path(output_file))
+
+
+def changed_ranges(old_cues, new_cues):
+    """
+    只在新旧某一边出现的字幕所覆盖的时间范围（秒），已合并重叠部分并排序。
+    改了文字、改了时间、新增和删除的字幕都会产生一段范围。
+    """
+    old = Counter((c.start, c.end, c.text) for c in old_cues)
+    new = Counter((c.start, c.end, c.text) for c in new_cues)
+    ranges = []
+    for start, end, _ in sorted((old - new) + (new - old)):
+        start, end = start / 1000, max(end, start + 1) / 1000
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], end)
+        else:
+            ranges.append([start, end])
+    return [tuple(r) for r in ranges]
+
+
+def align_to_keyframes(ranges, keyframes):
+    """
+    把每段范围向外扩展到关键帧：起点取不晚于它的关键帧，终点取晚于它的第一个关键帧，
+    终点之后没有关键帧时为 None，表示一直到结尾。扩展后重叠或相接的范围合并。
+    """
+    aligned = []
+    for start, end in ranges:
+        index = bisect.bisect_right(keyframes, start) - 1
+        start = keyframes[index] if index >= 0 else 0.0
+        index = bisect.bisect_right(keyframes, end)
+        end = keyframes[index] if index < len(keyframes) else None
+        if aligned and (aligned[-1][1] is None or start <= aligned[-1][1]):
+            previous_end = aligned[-1][1]
+            aligned[-1][1] = None if previous_end is None or end is None else max(previous_end, end)
+        else:
+            aligned.append([start, end])
+    return [tuple(r) for r in aligned]
+
+
+def plan_spans(aligned, duration):
+    """把整个视频分成交替的 ("copy" | "encode", start, end) 区间，end 为 None 表示到结尾"""
+    spans = []
+    position = 0.0
+    for start, end in aligned:
+        if start > position:
+            spans.append(("copy", position, start))
+        spans.append(("encode", start, end))
+        position = end
+        if end is None:
+            return spans
+    if duration is None or position < duration:
+        spans.append(("copy", position, None))
+    return spans
+
+
+def _timescale(media_path):
+    """视频轨的时间基分母，重新编码的段使用相同的时间基才能直接拼接"""
+    for stream in probe(media_path).get("streams", []):
+        if stream.get("codec_type") == "video":
+            num, _, den = str(stream.get("time_base", "")).partition("/")
+            if num == "1" and den.isdigit():
+                return int(den)
+    return None
+
+
+def full_burn(video_path, subtitle_path, output_file, settings):
+    """
+    整段烧录，编码参数与增量重新编码的段完全相同。
+    先编码到同目录下的临时文件再替换，中途失败不会留下半个输出；
+    开始前删除旧的状态记录，避免它和中断后的输出对不上。
+    """
+    codec = settings["codec"]
+    try:
+        os.remove(state_path(output_file))
+    except FileNotFoundError:
+        pass
+    # 与 save_state 一样按进程号命名临时文件，权限与直接写出的输出相同
+    root, ext = os.path.splitext(output_file)
+    tmp_output = f"{root}.{os.getpid()}.tmp{ext}"
+    command = [
+        "ffmpeg", "-nostdin", *input_args(codec), "-i", video_path,
+        "-vf", build_video_filter(settings["scale"], settings["fps"], subtitle_path) + filter_suffix(codec),
+        "-c:v", codec, *rate_control_args(codec, settings["crf"], settings["preset"]),
+        "-c:a", "aac", "-b:a", str(settings["audio_bitrate"]),
+        "-movflags", "+faststart", "-y", tmp_output
+    ]
+    try:
+        run_ffmpeg(command)
+        os.replace(tmp_output, output_file)
+    finally:
+        if os.path.exists(tmp_output):
+            os.remove(tmp_output)
+    return output_file
+
+
+def split_previous(previous_output, spans, work_dir):
+    """
+    用 segment 复用器把上次输出的视频轨在各区间的边界处直接拷贝切开，每个区间一个文件。
+    边界都是关键帧，切分按解码顺序在关键帧数据包处进行，B 帧不会跨到相邻的区间。
+    """
+    # 切点略早于关键帧时间，避免时间戳舍入后错过这个关键帧而切到下一个
+    times = ",".join(f"{max(0.0, start - 0.001):.6f}" for _, start, _ in spans[1:])
+    pattern = os.path.join(work_dir, "copy%05d.mp4")
+    command = ["ffmpeg", "-nostdin", *QUIET_ARGS, "-i", previous_output, "-map", "0:v:0", "-c", "copy",
+               "-f", "segment", "-segment_format", "mp4", "-reset_timestamps", "1"]
+    if times:
+        command += ["-segment_times", times]
+    run_ffmpeg(command + ["-y", pattern])
+    files = [pattern % i for i in range(len(spans))]
+    if not all(os.path.exists(path) for path in files) or os.path.exists(pattern % len(spans)):
+        raise RuntimeError(f"切分结果与计划的 {len(spans)} 个区间不一致: {previous_output}")
+    return files
+
+
+def reburn(video_path, subtitle_path, output_file, crf=23, preset="medium", scale=None, fps=None,
+           audio_bitrate="192k", codec="libx264", jobs=None):
+    """
+    用新的字幕重新烧录 output_file。
+    和上次烧录的字幕对比，只把有变化的字幕所在的关键帧区间按相同参数重新编码，
+    其余区间和音轨从上次的输出直接拷贝拼接。默认参数与 main.py 的 burn_subtitles 相同。
+    没有上次的记录、编码参数变了或变化范围太大时整段烧录。每次烧录后记录本次使用的字幕。
+    """
+    codec = resolve_encoder(codec)
+    settings = {"crf": crf, "preset": preset, "scale": scale, "fps": fps, "audio_bitrate": audio_bitrate,
+                "codec": codec}
+    state = load_state(output_file)
+    if state is None or state.get("settings") != settings:
+        print(f"整段烧录: {output_file}")
+        full_burn(video_path, subtitle_path, output_file, settings)
+        save_state(output_file, settings, subtitle_path)
+        return output_file
+
+    ranges = changed_ranges(parse(io.StringIO(state["srt"])), read_cues(subtitle_path))
+    if not ranges:
+        print(f"字幕没有变化，跳过: {output_file}")
+        return output_file
+
+    try:
+        duration = probe_duration(output_file) or None
+        keyframes = probe_keyframes(output_file)
+        timescale = _timescale(output_file)
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        print(f"读取上次的输出失败，整段烧录: {output_file}")
+        full_burn(video_path, subtitle_path, output_file, settings)
+        save_state(output_file, settings, subtitle_path)
+        return output_file
+    spans = plan_spans(align_to_keyframes(ranges, keyframes), duration)
+    encoded = sum(((end if end is not None else duration or 0) - start) for kind, start, end in spans
+                  if kind == "encode")
+    if not duration or encoded > duration * MAX_PARTIAL_RATIO:
+        print(f"变化范围过大，整段烧录: {output_file}")
+        full_burn(video_path, subtitle_path, output_file, settings)
+        save_state(output_file, settings, subtitle_path)
+        return output_file
+
+    print(f"{len(ranges)} 处字幕有变化，重新编码 {encoded:.1f} 秒 / 共 {duration:.1f} 秒: {output_file}")
+    work_dir = tempfile.mkdtemp(prefix=".reburn-", dir=os.path.dirname(output_file) or ".")
+    try:
+        segment_files = [os.path.join(work_dir, f"{i:05d}.mp4") if kind == "encode" else None
+                         for i, (kind, _, _) in enumerate(spans)]
+        jobs = jobs or os.cpu_count() or 1
+        threads = max(1, (os.cpu_count() or 1) // jobs)
+        stage = current_stage()
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                executor.submit(run_ffmpeg, build_segment_command(video_path, segment, start, end, crf, preset, scale,
+                                                                  fps, codec, subtitle_path, threads, timescale),
+                                True, stage)
+                for (kind, start, end), segment in zip(spans, segment_files) if kind == "encode"
+            ]
+            for future in futures:
+                future.result()
+        copies = split_previous(output_file, spans, work_dir)
+        segment_files = [copy if segment is None else segment for copy, segment in zip(copies, segment_files)]
+        tmp_output = os.path.join(work_dir, "output" + os.path.splitext(output_file)[1])
+        # 音轨不受字幕影响，整条沿用上次的输出
+        concat_segments(segment_files, tmp_output, output_file if has_audio(output_file) else None, work_dir)
+        os.replace(tmp_output, output_file)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    save_state(output_file, settings, subtitle_path)
+    return output_file
+
+
+def subtitles_changed(subtitle_path, output_file):
+    """字幕和上次烧录进 output_file 的是否不同，没有记录时视为不同"""
+    state = load_state(output_file)
+    if state is None:
+        return True
+    with open(subtitle_path, "r", encoding="utf-8") as f:
+        return f.read() != state["srt"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="修改字幕后只重新编码有变化的片段")
+    parser.add_argument("video_path", help="原始视频（未烧录字幕）")
+    parser.add_argument("subtitle_path", help="修改后的 SRT 字幕")
+    parser.add_argument("output_file", help="上次烧录的输出视频，会被原地更新")
+    parser.add_argument("--crf", type=int, default=23, help="CRF 值，必须与上次烧录相同")
+    parser.add_argument("--preset", default="medium", help="编码预设")
+    parser.add_argument("--scale", default=None, help="分辨率预设，默认保持原分辨率")
+    parser.add_argument("--fps", type=int, default=None, help="帧率，默认保持原帧率")
+    parser.add_argument("--audio-bitrate", default="192k", help="整段烧录时的音频比特率")
+    parser.add_argument("--codec", default="libx264", help="视频编码器")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="并行编码的区间数")
+    args = parser.parse_args()
+
+    reburn(args.video_path, args.subtitle_path, args.output_file, args.crf, args.preset, args.scale, args.fps,
+           args.audio_bitrate, args.codec, args.jobs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+'''
+Author: Diana Tang
+Date: 2026-10-18 17:40:18
+LastEditors: Diana Tang
+Description: 各处理阶段的耗时和资源统计，解析 ffmpeg -progress 输出，生成 JSON/CSV 运行报告
+FilePath: /add-srt-compress-video/runReport.py
+'''
+import os
+import csv
+import sys
+import json
+import time
+import signal
+import threading
+import contextlib
+import contextvars
+import subprocess
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# ru_maxrss 的单位：macOS 上是字节，Linux 上是 KB
+MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+# 当前线程正在测量的阶段，run_ffmpeg 把子进程的资源消耗记到这个阶段上
+_current_stage = contextvars.ContextVar("current_stage", default=None)
+# run_ffmpeg 启动的、仍在运行的 ffmpeg
+_running = set()
+_running_lock = threading.Lock()
+
+# 报告中每条记录的字段，CSV 按这个顺序输出
+FIELDS = [
+    "file", "stage", "ok", "wall_s", "cpu_s", "child_cpu_s", "peak_rss_mb", "child_peak_rss_mb",
+    "read_bytes", "write_bytes", "media_s", "realtime_factor",
+    "ffmpeg_frames", "ffmpeg_fps", "ffmpeg_speed", "ffmpeg_out_s", "ffmpeg_size",
+]
+
+
+def _rusage():
+    """返回当前进程的 (CPU 秒数, 峰值 RSS 字节数)，不支持的平台返回 (0, 0)"""
+    if resource is None:
+        return 0.0, 0
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime, usage.ru_maxrss * MAXRSS_UNIT
+
+
+def _proc_io(pid="self"):
+    """读取 /proc/<pid>/io 中实际读写的字节数，不支持的平台返回 (0, 0)"""
+    try:
+        with open(f"/proc/{pid}/io") as f:
+            values = dict(line.split(":", 1) for line in f)
+        return int(values["rchar"]), int(values["wchar"])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+
+def parse_progress(lines):
+    """
+    解析 ffmpeg -progress 输出，每个 progress= 结尾的块产出一次 {键: 值}。
+    out_time_us 是输出的时间位置（微秒），speed 形如 "2.5x"。
+    """
+    block = {}
+    for line in lines:
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            continue
+        block[key] = value.strip()
+        if key == "progress":
+            yield block
+            block = {}
+
+
+class Stage:
+    """
+    测量一个处理阶段：墙钟时间、CPU 时间、峰值内存、读写字节数和实时倍率。
+    当前进程的数据取自整个进程，多个线程同时测量时会互相重叠；
+    通过 run_ffmpeg 启动的 ffmpeg 子进程则单独精确统计后累加进来。
+    """
+
+    def __init__(self, file, name, media_seconds=None):
+        self.file = file
+        self.name = name
+        self.media_seconds = media_seconds
+        self.record = None
+        self._lock = threading.Lock()
+        self._child_cpu = 0.0
+        self._child_rss = 0
+        self._child_read = 0
+        self._child_write = 0
+        self._progress = {}
+
+    def add_child(self, cpu, rss, read_bytes, write_bytes, progress):
+        """累加一个已结束的 ffmpeg 子进程的统计"""
+        with self._lock:
+            self._child_cpu += cpu
+            self._child_rss = max(self._child_rss, rss)
+            self._child_read += read_bytes
+            self._child_write += write_bytes
+            if progress:
+                out_time = int(progress.get("out_time_us") or 0) / 1e6
+                self._progress["ffmpeg_out_s"] = max(self._progress.get("ffmpeg_out_s", 0), out_time)
+                self._progress["ffmpeg_frames"] = self._progress.get("ffmpeg_frames", 0) + int(progress.get("frame") or 0)
+                self._progress["ffmpeg_size"] = self._progress.get("ffmpeg_size", 0) + int(progress.get("total_size") or 0)
+                for key, field in (("fps", "ffmpeg_fps"), ("speed", "ffmpeg_speed")):
+                    try:
+                        self._progress[field] = float(progress.get(key, "").rstrip("x"))
+                    except ValueError:
+                        pass
+
+    def __enter__(self):
+        self._token = _current_stage.set(self)
+        self._start = time.perf_counter()
+        self._cpu, _ = _rusage()
+        self._io = _proc_io()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_stage.reset(self._token)
+        wall = time.perf_counter() - self._start
+        cpu, rss = _rusage()
+        read_bytes, write_bytes = _proc_io()
+        with self._lock:
+            media = self.media_seconds or self._progress.get("ffmpeg_out_s")
+            self.record = {
+                "file": self.file,
+                "stage": self.name,
+                "ok": exc_type is None,
+                "wall_s": round(wall, 3),
+                "cpu_s": round(cpu - self._cpu + self._child_cpu, 3),
+                "child_cpu_s": round(self._child_cpu, 3),
+                "peak_rss_mb": round(rss / 1048576, 1),
+                "child_peak_rss_mb": round(self._child_rss / 1048576, 1),
+                "read_bytes": read_bytes - self._io[0] + self._child_read,
+                "write_bytes": write_bytes - self._io[1] + self._child_write,
+                "media_s": round(media, 3) if media else None,
+                "realtime_factor": round(media / wall, 3) if media and wall > 0 else None,
+                **self._progress,
+            }
+        return False
+
+
+def current_stage():
+    """当前线程正在测量的阶段，没有时返回 None"""
+    return _current_stage.get()
+
+
+def sigint_handled():
+    """当前进程是否自己接管了 Ctrl+C（忽略或换成了自己的处理函数），这时由它决定何时停止子进程"""
+    return signal.getsignal(signal.SIGINT) not in (signal.default_int_handler, signal.SIG_DFL)
+
+
+def shield_children():
+    """
+    在当前线程屏蔽 SIGINT，之后从这个线程启动的 ffmpeg 等子进程会继承屏蔽，终端的 Ctrl+C 打断不了它们。
+    子进程仍在同一个进程组里，整组被结束时一起退出。
+    只在自己决定何时停止的进程或线程里调用，交互运行的命令行工具中 Ctrl+C 照常中止 ffmpeg。
+    """
+    if hasattr(signal, "pthread_sigmask"):
+        signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGINT})
+
+
+def run_ffmpeg(command, check=True, stage=None):
+    """
+    运行 ffmpeg 命令。没有正在测量的阶段时等同于 subprocess.run；
+    否则加上 -progress 把进度写到标准输出并逐块解析，结束后用 wait4 取得这个子进程自己的 CPU 时间和峰值内存。
+    在其他线程中运行时需要显式传入 stage。调用方被中断时会结束 ffmpeg，
+    其他线程中的调用可以用 kill_running_ffmpeg 结束。
+    """
+    stage = stage or current_stage()
+    measured = stage is not None and hasattr(os, "wait4")
+    if measured:
+        command = [command[0], "-progress", "pipe:1", *command[1:]]
+    process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE if measured else None,
+                               text=True)
+    with _running_lock:
+        _running.add(process)
+    try:
+        if measured:
+            progress = {}
+            io = (0, 0)
+            for block in parse_progress(process.stdout):
+                progress = block
+                # 子进程退出后 /proc 中就读不到了，所以每个进度块都记录一次
+                io = max(io, _proc_io(process.pid))
+            process.stdout.close()
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            stage.add_child(usage.ru_utime + usage.ru_stime, usage.ru_maxrss * MAXRSS_UNIT, io[0], io[1], progress)
+        else:
+            process.wait()
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        with _running_lock:
+            _running.discard(process)
+    if check and process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    return subprocess.CompletedProcess(command, process.returncode)
+
+
+def kill_running_ffmpeg():
+    """
+    结束本进程中由 run_ffmpeg 启动、仍在运行的所有 ffmpeg。
+    ffmpeg 收到 Ctrl+C 后会先把编码器里缓冲的帧编完再退出，慢速预设下要等很久；
+    线程池里的调用收不到主线程的 KeyboardInterrupt，主线程被中断时用它让这些线程立即返回。
+    """
+    with _running_lock:
+        processes = list(_running)
+    for process in processes:
+        # 不用 Popen.kill：它会先 poll，可能抢在所属线程的 wait4 之前回收子进程
+        try:
+            os.kill(process.pid, signal.SIGKILL if hasattr(signal, "SIGKILL") else signal.SIGTERM)
+        except OSError:
+            pass
+
+
+def measure(file, name, media_seconds, fn, *args, **kwargs):
+    """
+    在测量中调用 fn，返回 (结果, 记录)。
+    用于提交到进程池的任务：子进程里测量，记录随结果一起返回给父进程。
+    """
+    stage = Stage(file, name, media_seconds)
+    with stage:
+        result = fn(*args, **kwargs)
+    return result, stage.record
+
+
+class RunReport:
+    """一次运行的所有阶段记录，线程安全，可以输出为 JSON 或 CSV"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.records = []
+        self._durations = {}
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    def duration(self, media_path):
+        """媒体时长（秒），每个文件只探测一次"""
+        # compressVideo 也从这里导入 run_ffmpeg，放在函数里导入避免循环导入
+        from compressVideo import probe_duration
+        with self._lock:
+            if media_path in self._durations:
+                return self._durations[media_path]
+        seconds = probe_duration(media_path) or None
+        with self._lock:
+            self._durations[media_path] = seconds
+        return seconds
+
+    @contextlib.contextmanager
+    def stage(self, file, name, media_seconds=None):
+        """测量当前进程中运行的一个阶段，结束后（包括出错时）记入报告"""
+        stage = Stage(file, name, media_seconds)
+        try:
+            with stage:
+                yield stage
+        finally:
+            self.add(stage.record)
+
+    def add(self, record):
+        if record is not None:
+            with self._lock:
+                self.records.append(record)
+
+    def summary(self):
+        """按阶段汇总，实时倍率为媒体总时长除以该阶段的总耗时"""
+        with self._lock:
+            records = list(self.records)
+        stages = {}
+        for record in records:
+            total = stages.setdefault(record["stage"], {
+                "stage": record["stage"], "files": 0, "failed": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                "peak_rss_mb": 0.0, "read_bytes": 0, "write_bytes": 0, "media_s": 0.0,
+            })
+            total["files"] += 1
+            total["failed"] += not record["ok"]
+            for key in ("wall_s", "cpu_s", "read_bytes", "write_bytes"):
+                total[key] += record[key]
+            total["media_s"] += record["media_s"] or 0
+            total["peak_rss_mb"] = max(total["peak_rss_mb"], record["peak_rss_mb"], record["child_peak_rss_mb"])
+        for total in stages.values():
+            total["wall_s"] = round(total["wall_s"], 3)
+            total["cpu_s"] = round(total["cpu_s"], 3)
+            total["media_s"] = round(total["media_s"], 3)
+            total["realtime_factor"] = round(total["media_s"] / total["wall_s"], 3) if total["wall_s"] else None
+        return list(stages.values())
+
+    def write(self, path):
+        """按扩展名写出 .json 或 .csv 报告，CSV 的汇总行 file 列为 *"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        summary = self.summary()
+        with self._lock:
+            records = list(self.records)
+        if path.lower().endswith(".csv"):
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=FIELDS + ["files", "failed"], extrasaction="ignore")
+                writer.writeheader()
+                writer.writerows(records)
+                writer.writerows({"file": "*", **total} for total in summary)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "started": self.started,
+                    "wall_s": round(time.perf_counter() - self._start, 3),
+                    "stages": summary,
+                    "files": records,
+                }, f, ensure_ascii=False, indent=2)
+        return path
+
+    def print_summary(self):
+        """在终端打印各阶段汇总"""
+        for total in self.summary():
+            rtf = f"{total['realtime_factor']:.2f}x" if total["realtime_factor"] else "-"
+            print(f"{total['stage']}: {total['files']} 个文件，耗时 {total['wall_s']:.1f} 秒，"
+                  f"CPU {total['cpu_s']:.1f} 秒，峰值内存 {total['peak_rss_mb']:.0f} MB，实时倍率 {rtf}")
+
+
+def maybe_stage(report, file, name, media_seconds=None):
+    """report 为 None 时不做任何测量"""
+    if report is None:
+        return contextlib.nullcontext()
+    return report.stage(file, name, media_seconds)
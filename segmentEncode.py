@@ -0,0 +1,178 @@
+'''
+Author: Diana Tang
+Date: 2026-10-18 15:21:09
+LastEditors: Diana Tang
+Description: 长视频分段并行编码：按关键帧切成多段同时编码，再用 concat 分离器无损拼接
+FilePath: /add-srt-compress-video/segmentEncode.py
+'''
+import os
+import bisect
+import shutil
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from compressVideo import build_video_filter, thread_args, probe_duration, compress_video, get_scale
+from encoderSelect import resolve_encoder, input_args, filter_suffix, rate_control_args
+from runReport import RunReport, run_ffmpeg, current_stage, maybe_stage
+
+# 每段的最短时长（秒），太短的段拼接开销大于并行收益
+MIN_SEGMENT_SECONDS = 30
+QUIET_ARGS = ["-hide_banner", "-loglevel", "error", "-nostats"]
+
+
+def probe_keyframes(media_path):
+    """读取视频轨所有关键帧的时间（秒），只读数据包不解码"""
+    command = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=print_section=0",
+        media_path
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    keyframes = []
+    for line in result.stdout.decode().splitlines():
+        parts = line.split(",")
+        if len(parts) >= 2 and "K" in parts[1] and parts[0] not in ("", "N/A"):
+            keyframes.append(float(parts[0]))
+    return sorted(keyframes)
+
+
+def has_audio(media_path):
+    """是否包含音轨"""
+    command = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "a",
+        "-show_entries", "stream=index",
+        "-of", "csv=print_section=0",
+        media_path
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    return bool(result.stdout.strip())
+
+
+def plan_segments(keyframes, duration, count, min_length=MIN_SEGMENT_SECONDS):
+    """
+    把视频均分为 count 段，每个切点对齐到最近的关键帧。
+    返回 [(start, end), ...]，最后一段的 end 为 None 表示到结尾。
+    """
+    cuts = [0.0]
+    if keyframes and duration > 0:
+        for i in range(1, count):
+            target = duration * i / count
+            index = bisect.bisect_left(keyframes, target)
+            nearby = keyframes[max(0, index - 1):index + 1]
+            cut = min(nearby, key=lambda k: abs(k - target))
+            if cut - cuts[-1] >= min_length and duration - cut >= min_length:
+                cuts.append(cut)
+    return [(start, end) for start, end in zip(cuts, cuts[1:] + [None])]
+
+
+def build_segment_command(input_file, output_file, start, end=None, crf=23, preset="medium", scale="1080p", fps=30,
+                          codec="libx265", subtitle_path=None, threads=None, timescale=None):
+    """只编码 [start, end) 这一段视频，不含音频；timescale 指定 mp4 视频轨的时间基，拼接时需要和其他段一致"""
+    command = ["ffmpeg", "-nostdin", *QUIET_ARGS, *input_args(codec), "-ss", f"{start:.6f}"]
+    if end is not None:
+        command += ["-to", f"{end:.6f}"]
+    return command + [
+        "-i", input_file,
+        "-an",
+        "-vf", build_video_filter(scale, fps, subtitle_path, start) + filter_suffix(codec),
+        "-c:v", codec, *rate_control_args(codec, crf, preset),
+        *thread_args(codec, threads),
+        *(["-video_track_timescale", str(timescale)] if timescale else []),
+        "-y",
+        output_file
+    ]
+
+
+def concat_segments(segment_files, output_file, audio_file=None, work_dir="."):
+    """用 concat 分离器直接拷贝拼接各段，不重新编码，可选同时封装音轨"""
+    list_path = os.path.join(work_dir, "segments.txt")
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in segment_files:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    command = ["ffmpeg", "-nostdin", *QUIET_ARGS, "-f", "concat", "-safe", "0", "-i", list_path]
+    if audio_file:
+        command += ["-i", audio_file, "-map", "0:v:0", "-map", "1:a:0"]
+    command += ["-c", "copy", "-movflags", "+faststart", "-y", output_file]
+    run_ffmpeg(command)
+    return output_file
+
+
+def encode_segmented(input_file, output_file, crf=23, preset="medium", scale="1080p", fps=30, audio_bitrate="128k",
+                     codec="libx265", subtitle_path=None, jobs=None, min_length=MIN_SEGMENT_SECONDS):
+    """
+    分段并行压缩单个长视频。
+    每段是一个独立的 ffmpeg 进程，编码参数完全相同；音频单独编码一次，避免每段 AAC 起始处的空隙。
+    视频太短或找不到关键帧时退回普通的整段压缩。
+    """
+    jobs = jobs or os.cpu_count() or 1
+    codec = resolve_encoder(codec)
+    duration = probe_duration(input_file)
+    segments = plan_segments(probe_keyframes(input_file), duration, jobs, min_length) if duration else [(0.0, None)]
+    if len(segments) < 2:
+        return compress_video(input_file, output_file, crf, preset, scale, fps, audio_bitrate, codec, subtitle_path)
+
+    threads = max(1, (os.cpu_count() or 1) // jobs)
+    print(f"正在处理: {input_file}")
+    print(f"输出到: {output_file}")
+    print(f"输出分辨率: {get_scale(scale)}，分为 {len(segments)} 段并行编码")
+
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix=".segments-", dir=os.path.dirname(output_file) or ".")
+    try:
+        segment_files = [os.path.join(work_dir, f"{i:05d}.mp4") for i in range(len(segments))]
+        audio_file = os.path.join(work_dir, "audio.m4a") if has_audio(input_file) else None
+        # 各段在线程池中运行，把当前测量的阶段显式传过去
+        stage = current_stage()
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = []
+            if audio_file:
+                futures.append(executor.submit(run_ffmpeg, [
+                    "ffmpeg", "-nostdin", *QUIET_ARGS, "-i", input_file, "-vn",
+                    "-c:a", "aac", "-b:a", str(audio_bitrate), "-y", audio_file
+                ], True, stage))
+            for (start, end), path in zip(segments, segment_files):
+                command = build_segment_command(input_file, path, start, end, crf, preset, scale, fps, codec,
+                                                subtitle_path, threads)
+                futures.append(executor.submit(run_ffmpeg, command, True, stage))
+            for future in futures:
+                future.result()
+        return concat_segments(segment_files, output_file, audio_file, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分段并行压缩单个长视频")
+    parser.add_argument("input_file", help="输入视频")
+    parser.add_argument("output_file", help="输出视频")
+    parser.add_argument("crf", nargs="?", type=int, default=23, help="CRF值: 0-51，默认23（数值越小质量越好，文件越大）")
+    parser.add_argument("preset", nargs="?", default="medium", help="编码预设，默认 medium")
+    parser.add_argument("scale", nargs="?", default="1080p", help="分辨率预设 4k/2k/1080p/720p/480p，或直接指定如 1920:1080")
+    parser.add_argument("fps", nargs="?", type=int, default=30, help="帧率，默认30")
+    parser.add_argument("audio_bitrate", nargs="?", default="128k", help="音频比特率，默认128k")
+    parser.add_argument("--subtitles", default=None, help="要烧录的 SRT 字幕文件")
+    parser.add_argument("--codec", default="auto", help="视频编码器，默认 auto 自动选择可用的最快 HEVC 编码器")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="并行编码的段数，默认等于 CPU 核数")
+    parser.add_argument("--min-segment", type=int, default=MIN_SEGMENT_SECONDS, help="每段的最短秒数")
+    parser.add_argument("--report", default=None, help="把耗时和资源统计写入该文件（.json 或 .csv）")
+    args = parser.parse_args()
+
+    report = RunReport() if args.report else None
+    media = report.duration(args.input_file) if report is not None else None
+    with maybe_stage(report, args.input_file, "compress", media):
+        encode_segmented(args.input_file, args.output_file, args.crf, args.preset, args.scale, args.fps,
+                         args.audio_bitrate, args.codec, args.subtitles, args.jobs, args.min_segment)
+    if report is not None:
+        report.print_summary()
+        report.write(args.report)
+
+
+if __name__ == "__main__":
+    main()
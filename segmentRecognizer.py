@@ -0,0 +1,186 @@
+'''
+Author: Diana Tang
+Date: 2026-10-18 11:36:52
+LastEditors: Diana Tang
+Description: 分段语音识别：按静音切出有限长度的窗口逐段识别，每条字幕使用真实的起止时间
+FilePath: /add-srt-compress-video/segmentRecognizer.py
+'''
+import os
+import json
+import threading
+import numpy as np
+import speech_recognition as sr
+from audioStream import SAMPLE_RATE
+from longAudio import FRAME_MS, SILENCE_DB, MIN_SPEECH_RATIO, frame_energy_db, find_split_point
+
+# 每个识别窗口的最短和最长时长（秒）
+MIN_WINDOW_SECONDS = 5
+MAX_WINDOW_SECONDS = 15
+# vosk 离线模型目录
+VOSK_MODEL_PATH = os.environ.get("VOSK_MODEL_PATH", "model")
+
+
+class VoskEngine:
+    """基于 vosk 的离线识别引擎，模型只加载一次"""
+
+    def __init__(self, model_path=VOSK_MODEL_PATH):
+        self.model_path = model_path
+        self._model = None
+        self._lock = threading.Lock()
+
+    def __call__(self, recognizer, audio, language):
+        import vosk
+        # asyncRecognizer 会在多个线程里同时调用，模型只加载一次，多个 KaldiRecognizer 可以共用
+        with self._lock:
+            if self._model is None:
+                self._model = vosk.Model(self.model_path)
+        rec = vosk.KaldiRecognizer(self._model, audio.sample_rate)
+        rec.AcceptWaveform(audio.get_raw_data(convert_width=2))
+        return json.loads(rec.FinalResult()).get("text", "")
+
+
+class SphinxEngine:
+    """基于 pocketsphinx 的离线识别引擎"""
+
+    def __call__(self, recognizer, audio, language):
+        return recognizer.recognize_sphinx(audio, language=language)
+
+
+class GoogleEngine:
+    """原来使用的 Google 在线识别"""
+
+    def __call__(self, recognizer, audio, language):
+        return recognizer.recognize_google(audio, language=language)
+
+
+class StubEngine:
+    """本地桩引擎，不做真正识别，按顺序返回预设文本，供测试和离线调试使用"""
+
+    def __init__(self, texts=None):
+        self.texts = list(texts) if texts else None
+        self.calls = 0
+
+    def __call__(self, recognizer, audio, language):
+        self.calls += 1
+        if self.texts is None:
+            return f"第{self.calls}段"
+        return self.texts[(self.calls - 1) % len(self.texts)]
+
+
+ENGINES = {
+    "vosk": VoskEngine,
+    "sphinx": SphinxEngine,
+    "google": GoogleEngine,
+    "stub": StubEngine,
+}
+
+
+def get_engine(name):
+    """按名称创建识别引擎"""
+    try:
+        return ENGINES[name]()
+    except KeyError:
+        raise ValueError(f"未知的识别引擎: {name}，可选: {', '.join(ENGINES)}")
+
+
+def iter_windows(audio_path, min_window=MIN_WINDOW_SECONDS, max_window=MAX_WINDOW_SECONDS):
+    """
+    逐个读取识别窗口，产出 (起始秒数, AudioData)。
+    每次最多读取 max_window 秒，在 [min_window, max_window] 内的静音处切开，
+    切点之后的部分留到下一个窗口，内存中最多只有一个窗口的数据。
+    """
+    with sr.AudioFile(audio_path) as source:
+        rate = source.SAMPLE_RATE
+        max_frames = int(max_window * rate)
+        carry = b""
+        offset = 0.0
+        eof = False
+        while True:
+            # 直接从底层流按帧数读取，recognizer.record 会丢掉每次末尾不足一个 CHUNK 的数据
+            need = max_frames - len(carry) // 2
+            data = b""
+            if not eof:
+                data = sr.AudioData(source.stream.read(need), rate, source.SAMPLE_WIDTH).get_raw_data(convert_width=2)
+                # 读到的帧数不足说明已经到文件末尾
+                eof = len(data) // 2 < need
+            raw = carry + data
+            if not raw:
+                break
+            samples = np.frombuffer(raw, np.int16)
+            if eof:
+                split = len(samples)
+            else:
+                split = find_split_point(samples.astype(np.float32) / 32768.0, rate, min_window, max_window)
+            yield offset, sr.AudioData(raw[:split * 2], rate, 2)
+            carry = raw[split * 2:]
+            # 偏移按实际消耗的帧数累计，字幕时间不会随文件变长而漂移
+            offset += split / rate
+            if eof and not carry:
+                break
+
+
+def speech_bounds(samples, sample_rate=SAMPLE_RATE, silence_db=SILENCE_DB):
+    """返回窗口内有声部分的起止秒数，samples 为 float32 样本，整段静音时返回 None"""
+    frame_size = sample_rate * FRAME_MS // 1000
+    voiced = np.flatnonzero(frame_energy_db(samples, frame_size) >= silence_db)
+    if len(voiced) < max(1, MIN_SPEECH_RATIO * len(samples) / frame_size):
+        return None
+    return voiced[0] * FRAME_MS / 1000, (voiced[-1] + 1) * FRAME_MS / 1000
+
+
+def recognize_segments(audio_path, engine=None, language="zh-CN", min_window=MIN_WINDOW_SECONDS,
+                       max_window=MAX_WINDOW_SECONDS):
+    """
+    逐窗口识别音频，产出 {"start", "end", "text"} 片段，格式与 Whisper 的 segments 一致。
+    单个窗口识别失败只会跳过该窗口，不会让整个文件失败。
+    """
+    engine = engine or VoskEngine()
+    recognizer = sr.Recognizer()
+    for offset, audio in iter_windows(audio_path, min_window, max_window):
+        samples = np.frombuffer(audio.get_raw_data(convert_width=2), np.int16).astype(np.float32) / 32768.0
+        bounds = speech_bounds(samples, audio.sample_rate)
+        if bounds is None:
+            continue
+        try:
+            text = engine(recognizer, audio, language)
+        except sr.UnknownValueError:
+            continue
+        except sr.RequestError as e:
+            print(f"识别第 {offset:.2f} 秒处的片段出错: {e}")
+            continue
+        text = text.strip()
+        if text:
+            yield {"start": offset + bounds[0], "end": offset + bounds[1], "text": text}
+
+
+def check(duration=60, rate=16000, period=4, burst=1):
+    """
+    自检：生成每 period 秒一段 burst 秒正弦音的 WAV，用 StubEngine 识别，
+    确认所有帧都被读到，并且每条字幕的起止时间都落在对应音段的边界上。
+    """
+    import wave
+    import tempfile
+    t = np.arange(duration * rate) / rate
+    signal = np.where((t % period >= 1) & (t % period < 1 + burst), 0.5 * np.sin(2 * np.pi * 440 * t), 0)
+    with tempfile.NamedTemporaryFile(suffix=".wav") as f:
+        with wave.open(f.name, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(rate)
+            w.writeframes((signal * 32767).astype(np.int16).tobytes())
+        frames = sum(len(audio.get_raw_data()) // 2 for _, audio in iter_windows(f.name))
+        assert frames == duration * rate, f"读到 {frames} 帧，应为 {duration * rate} 帧"
+        segments = list(recognize_segments(f.name, StubEngine()))
+    tolerance = 2 * FRAME_MS / 1000
+    for segment in segments:
+        assert abs((segment["start"] - 1) / period - round((segment["start"] - 1) / period)) * period <= tolerance, \
+            f"起始时间 {segment['start']:.3f} 没有对齐音段"
+        assert abs((segment["end"] - 1 - burst) / period - round((segment["end"] - 1 - burst) / period)) * period \
+            <= tolerance, f"结束时间 {segment['end']:.3f} 没有对齐音段"
+    last = (duration - 1 - burst) // period * period + 1 + burst
+    assert abs(segments[-1]["end"] - last) <= tolerance, f"最后一条字幕结束于 {segments[-1]['end']:.3f}，应为 {last}"
+    print(f"自检通过：{frames} 帧，{len(segments)} 条字幕")
+
+
+if __name__ == "__main__":
+    check()
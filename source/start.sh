@@ -16,7 +16,7 @@ compress_video() {
     
     # 使用硬件加速的编码器（NVENC）
     ffmpeg -i "$input_file" \
-        -c:v hevc_nvenc -preset $preset -crf $crf \
+        -c:v hevc_nvenc -preset $preset -rc vbr -cq $crf -b:v 0 \
         -vf "scale=$scale,fps=$fps" \
         -c:a aac -b:a $audio_bitrate \
         -movflags +faststart \
@@ -0,0 +1,319 @@
+'''
+Author: Diana Tang
+Date: 2026-10-18 22:31:15
+LastEditors: Diana Tang
+Description: 字幕全文检索：jieba 分词后建立 词 -> (文件, 字幕起始毫秒) 的倒排索引，增量添加文件，按相关度返回带时间戳的结果
+FilePath: /add-srt-compress-video/srtIndex.py
+'''
+import os
+import re
+import math
+import heapq
+import sqlite3
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import jieba
+from srtStream import read_cues, format_timestamp
+from batchManifest import quick_hash
+from srtToMd import warm_jieba
+
+DEFAULT_INDEX = os.environ.get(
+    "SRT_INDEX",
+    os.path.join(os.path.expanduser("~"), ".cache", "add-srt-compress-video", "index.sqlite")
+)
+# BM25 参数
+K1 = 1.2
+B = 0.75
+# 出现太频繁、对检索没有帮助的词
+STOPWORDS = frozenset("的 了 是 在 我 你 他 她 它 我们 你们 他们 这 那 这个 那个 就 也 都 和 与 及 而 吗 呢 吧 啊 呀 哦 嗯 "
+                      "一个 一下 有 没有 不 很 还 又 要 会 能 可以 对 把 被 给 让 the a an of to and or is are in on "
+                      "for it this that".split())
+WORD_RE = re.compile(r"\w")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    hash TEXT
+);
+CREATE TABLE IF NOT EXISTS cues (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL,
+    start_ms INTEGER NOT NULL,
+    end_ms INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cues_file ON cues (file_id);
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    term TEXT NOT NULL UNIQUE,
+    df INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term_id INTEGER NOT NULL,
+    cue_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term_id, cue_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS stats (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def tokenize(text):
+    """搜索引擎模式分词，长词同时产出其中的短词，转小写，去掉标点和停用词"""
+    return [token for token in (t.strip().lower() for t in jieba.cut_for_search(text))
+            if token and WORD_RE.search(token) and token not in STOPWORDS]
+
+
+def tokenize_file(srt_path):
+    """读取并分词一个 SRT 文件，返回 [(起始毫秒, 结束毫秒, 文字, 词频), ...]，可以在子进程中运行"""
+    cues = []
+    for cue in read_cues(srt_path):
+        text = cue.text.replace("\n", " ")
+        cues.append((cue.start, cue.end, text, Counter(tokenize(text))))
+    return cues
+
+
+class SubtitleIndex:
+    """
+    字幕的倒排索引，保存在一个 SQLite 文件中。
+    每条字幕是一个检索单元，postings 表按 (词, 字幕) 聚簇存放，查询一个词只需一次范围扫描。
+    字幕原文也存一份，用于显示结果，以及文件变化后删除旧的倒排项。
+    """
+
+    def __init__(self, path=DEFAULT_INDEX):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        # 词 -> 编号的内存缓存，索引大量文件时不必每个词都查一次表
+        self._ids = {}
+        warm_jieba()
+
+    def _stat(self, key):
+        row = self._conn.execute("SELECT value FROM stats WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _add_stat(self, key, delta):
+        self._conn.execute(
+            "INSERT INTO stats (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = value + ?",
+            (key, delta, delta)
+        )
+
+    def _term_ids(self, terms):
+        """词对应的编号，新词在这里分配编号"""
+        for term in terms:
+            if term not in self._ids:
+                row = self._conn.execute("SELECT id FROM terms WHERE term = ?", (term,)).fetchone()
+                if row is None:
+                    row = (self._conn.execute("INSERT INTO terms (term, df) VALUES (?, 0)", (term,)).lastrowid,)
+                self._ids[term] = row[0]
+        return self._ids
+
+    def _remove(self, file_id):
+        """删除一个文件的所有字幕和倒排项，文档频率和总长度同步扣减"""
+        rows = self._conn.execute("SELECT id, length, text FROM cues WHERE file_id = ?", (file_id,)).fetchall()
+        df = Counter()
+        for cue_id, _, text in rows:
+            for term in set(tokenize(text)):
+                df[term] += 1
+                self._conn.execute(
+                    "DELETE FROM postings WHERE term_id = (SELECT id FROM terms WHERE term = ?) AND cue_id = ?",
+                    (term, cue_id)
+                )
+        for term, count in df.items():
+            self._conn.execute("UPDATE terms SET df = df - ? WHERE term = ?", (count, term))
+        self._conn.execute("DELETE FROM cues WHERE file_id = ?", (file_id,))
+        self._add_stat("cues", -len(rows))
+        self._add_stat("length", -sum(length for _, length, _ in rows))
+
+    def _indexed_hash(self, path):
+        with self._lock:
+            row = self._conn.execute("SELECT hash FROM files WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else None
+
+    def add_file(self, srt_path, cues=None):
+        """
+        索引一个 SRT 文件；内容没有变化时跳过并返回 False，变化时先删除旧内容再重新索引。
+        cues 为 tokenize_file 的结果，已经在别处分好词时传入。
+        """
+        path = os.path.abspath(srt_path)
+        digest = quick_hash(path)
+        if self._indexed_hash(path) == digest:
+            return False
+        if cues is None:
+            cues = tokenize_file(path)
+        with self._lock:
+            try:
+                self._add(path, digest, cues)
+            except BaseException:
+                # 事务已回滚，本次分配的词编号不再有效
+                self._ids.clear()
+                raise
+        return True
+
+    def _add(self, path, digest, cues):
+        with self._conn:
+            row = self._conn.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+            if row is not None:
+                file_id = row[0]
+                self._remove(file_id)
+                self._conn.execute("UPDATE files SET hash = ? WHERE id = ?", (digest, file_id))
+            else:
+                file_id = self._conn.execute("INSERT INTO files (path, hash) VALUES (?, ?)",
+                                             (path, digest)).lastrowid
+            total = 0
+            df = Counter()
+            for start, end, text, tokens in cues:
+                length = sum(tokens.values())
+                cue_id = self._conn.execute(
+                    "INSERT INTO cues (file_id, start_ms, end_ms, length, text) VALUES (?, ?, ?, ?, ?)",
+                    (file_id, start, end, length, text)
+                ).lastrowid
+                ids = self._term_ids(tokens)
+                self._conn.executemany("INSERT INTO postings (term_id, cue_id, tf) VALUES (?, ?, ?)",
+                                       [(ids[term], cue_id, tf) for term, tf in tokens.items()])
+                df.update(tokens.keys())
+                total += length
+            self._conn.executemany("UPDATE terms SET df = df + ? WHERE term = ?",
+                                   [(n, term) for term, n in df.items()])
+            self._add_stat("cues", len(cues))
+            self._add_stat("length", total)
+
+    def remove_file(self, srt_path):
+        """从索引中删除一个文件"""
+        path = os.path.abspath(srt_path)
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+            if row is None:
+                return False
+            self._remove(row[0])
+            self._conn.execute("DELETE FROM files WHERE id = ?", (row[0],))
+        return True
+
+    def index_directory(self, directory, prune=True, jobs=None):
+        """
+        递归索引目录中的所有 SRT，只处理新增或变化的文件；prune 时删除已经不存在的文件。
+        分词是主要开销，jobs 大于 1 时在进程池中分词，写入仍在当前进程中进行。
+        """
+        paths = []
+        for root, _, files in os.walk(directory):
+            paths += [os.path.abspath(os.path.join(root, name)) for name in sorted(files)
+                      if name.lower().endswith(".srt")]
+        pending = [path for path in paths if self._indexed_hash(path) != quick_hash(path)]
+        skipped = len(paths) - len(pending)
+        jobs = jobs or os.cpu_count() or 1
+        if jobs <= 1 or len(pending) <= 1:
+            added = sum(self.add_file(path) for path in pending)
+        else:
+            with ProcessPoolExecutor(max_workers=jobs, initializer=warm_jieba) as pool:
+                added = sum(self.add_file(path, cues)
+                            for path, cues in zip(pending, pool.map(tokenize_file, pending, chunksize=4)))
+        removed = 0
+        if prune:
+            prefix = os.path.join(os.path.abspath(directory), "")
+            with self._lock:
+                paths = [p for (p,) in self._conn.execute("SELECT path FROM files") if p.startswith(prefix)]
+            removed = sum(self.remove_file(p) for p in paths if not os.path.exists(p))
+        return added, skipped, removed
+
+    def search(self, query, limit=10):
+        """
+        按 BM25 相关度返回前 limit 条字幕：
+        [{"score", "path", "start_ms", "end_ms", "text"}, ...]。
+        同一条字幕中出现完整查询文字的额外加分。
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            total = self._stat("cues")
+            if not total:
+                return []
+            average = self._stat("length") / total or 1
+            scores = Counter()
+            for term in terms:
+                row = self._conn.execute("SELECT id, df FROM terms WHERE term = ?", (term,)).fetchone()
+                if row is None or row[1] <= 0:
+                    continue
+                idf = math.log(1 + (total - row[1] + 0.5) / (row[1] + 0.5))
+                for cue_id, tf, length in self._conn.execute(
+                        "SELECT p.cue_id, p.tf, c.length FROM postings p JOIN cues c ON c.id = p.cue_id "
+                        "WHERE p.term_id = ?", (row[0],)):
+                    scores[cue_id] += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / average))
+            # 多取一些候选，再对包含完整查询文字的字幕加分后重新排序
+            candidates = heapq.nlargest(limit * 4, scores.items(), key=lambda item: item[1])
+            phrase = query.strip().lower()
+            hits = []
+            for cue_id, score in candidates:
+                path, start_ms, end_ms, text = self._conn.execute(
+                    "SELECT f.path, c.start_ms, c.end_ms, c.text FROM cues c JOIN files f ON f.id = c.file_id "
+                    "WHERE c.id = ?", (cue_id,)
+                ).fetchone()
+                if phrase and phrase in text.lower():
+                    score *= 1.5
+                hits.append({"score": score, "path": path, "start_ms": start_ms, "end_ms": end_ms, "text": text})
+        hits.sort(key=lambda hit: hit["score"], reverse=True)
+        return hits[:limit]
+
+    def summary(self):
+        """索引中的文件数、字幕数和词数"""
+        with self._lock:
+            files = self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            terms = self._conn.execute("SELECT COUNT(*) FROM terms WHERE df > 0").fetchone()[0]
+            return {"files": files, "cues": self._stat("cues"), "terms": terms}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="字幕全文检索：建立索引并按相关度查询，结果带视频时间戳")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help="索引数据库路径")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="增量索引目录或 SRT 文件")
+    add.add_argument("paths", nargs="+", help="SRT 文件或目录（递归查找 .srt）")
+    add.add_argument("--no-prune", action="store_true", help="不删除已经不存在的文件")
+    add.add_argument("-j", "--jobs", type=int, default=None, help="分词的并行进程数，默认等于 CPU 核数")
+    search = commands.add_parser("search", help="查询")
+    search.add_argument("query", help="查询文字")
+    search.add_argument("-n", "--limit", type=int, default=10, help="返回的结果数")
+    remove = commands.add_parser("remove", help="从索引中删除 SRT 文件")
+    remove.add_argument("paths", nargs="+", help="SRT 文件")
+    commands.add_parser("status", help="查看索引规模")
+    args = parser.parse_args()
+
+    index = SubtitleIndex(args.index)
+    try:
+        if args.command == "add":
+            for path in args.paths:
+                if os.path.isdir(path):
+                    added, skipped, removed = index.index_directory(path, not args.no_prune, args.jobs)
+                    print(f"{path}: 新索引 {added} 个，未变化 {skipped} 个，删除 {removed} 个")
+                else:
+                    print(f"{path}: {'已索引' if index.add_file(path) else '未变化'}")
+        elif args.command == "search":
+            for hit in index.search(args.query, args.limit):
+                print(f"{hit['score']:6.2f}  {hit['path']}  {format_timestamp(hit['start_ms'])}"
+                      f"（{hit['start_ms']} ms）  {hit['text']}")
+        elif args.command == "remove":
+            for path in args.paths:
+                print(f"{path}: {'已删除' if index.remove_file(path) else '不在索引中'}")
+        else:
+            summary = index.summary()
+            print(f"{summary['files']} 个文件，{summary['cues']} 条字幕，{summary['terms']} 个词")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
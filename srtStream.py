@@ -0,0 +1,202 @@
+'''
+Author: Diana Tang
+Date: 2026-10-18 16:05:32
+LastEditors: Diana Tang
+Description: 流式 SRT 解析和写入，所有脚本共用，超大字幕文件也只占用常量内存
+FilePath: /add-srt-compress-video/srtStream.py
+'''
+import re
+
+# 时间轴行，兼容毫秒前用 . 分隔的写法
+TIMING_RE = re.compile(
+    r'^\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})'
+)
+
+
+class Cue:
+    """一条字幕，起止时间为整数毫秒"""
+    __slots__ = ("index", "start", "end", "text")
+
+    def __init__(self, index, start, end, text):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.text = text
+
+    def __eq__(self, other):
+        if not isinstance(other, Cue):
+            return NotImplemented
+        return (self.start, self.end, self.text) == (other.start, other.end, other.text)
+
+    def __repr__(self):
+        return f"Cue({self.index}, {format_timestamp(self.start)}, {format_timestamp(self.end)}, {self.text!r})"
+
+
+def seconds_to_ms(seconds):
+    """秒转换为整数毫秒"""
+    return int(round(seconds * 1000))
+
+
+def format_timestamp(ms):
+    """整数毫秒格式化为 HH:MM:SS,mmm"""
+    hours, ms = divmod(int(ms), 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02}:{minutes:02}:{seconds:02},{ms:03}"
+
+
+def parse_timing(line):
+    """解析时间轴行，返回 (start_ms, end_ms)，不是时间轴行时返回 None"""
+    if "-->" not in line:
+        return None
+    match = TIMING_RE.match(line)
+    if not match:
+        return None
+    h1, m1, s1, f1, h2, m2, s2, f2 = match.groups()
+    start = ((int(h1) * 60 + int(m1)) * 60 + int(s1)) * 1000 + int(f1.ljust(3, "0"))
+    end = ((int(h2) * 60 + int(m2)) * 60 + int(s2)) * 1000 + int(f2.ljust(3, "0"))
+    return start, end
+
+
+def _iter_lines(lines):
+    """统一去掉行尾换行符和文件开头的 BOM"""
+    first = True
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if first:
+            line = line.lstrip("\ufeff")
+            first = False
+        yield line
+
+
+def parse(lines):
+    """
+    从文件对象或任意行迭代器中逐条产出 Cue。
+    序号行只有在下一行是时间轴时才被当作序号，所以内容只有数字的字幕行会被保留。
+    """
+    index = None
+    pending_index = None
+    timing = None
+    text = []
+    for line in _iter_lines(lines):
+        if pending_index is not None:
+            # 上一行是纯数字，看这一行是不是时间轴来决定它是序号还是字幕内容
+            candidate = parse_timing(line)
+            if candidate is not None:
+                if timing is not None:
+                    yield Cue(index, timing[0], timing[1], "\n".join(text))
+                index, timing, text = int(pending_index), candidate, []
+                pending_index = None
+                continue
+            if timing is not None:
+                text.append(pending_index)
+            pending_index = None
+
+        stripped = line.strip()
+        candidate = parse_timing(line)
+        if candidate is not None:
+            if timing is not None:
+                yield Cue(index, timing[0], timing[1], "\n".join(text))
+            index, timing, text = None, candidate, []
+        elif stripped.isdigit():
+            pending_index = stripped
+        elif not stripped:
+            if timing is not None:
+                yield Cue(index, timing[0], timing[1], "\n".join(text))
+                index, timing, text = None, None, []
+        elif timing is not None:
+            text.append(stripped)
+
+    if pending_index is not None and timing is not None:
+        text.append(pending_index)
+    if timing is not None:
+        yield Cue(index, timing[0], timing[1], "\n".join(text))
+
+
+def read_cues(path, encoding="utf-8"):
+    """逐条读取 SRT 文件中的字幕"""
+    with open(path, "r", encoding=encoding) as f:
+        yield from parse(f)
+
+
+def iter_text_lines(lines):
+    """
+    逐行产出去掉序号和时间轴后的文字内容（已去除首尾空白，跳过空行）。
+    与 parse 使用同样的规则，但不要求输入一定是完整的 SRT，纯文本也可以直接通过。
+    """
+    pending = None
+    for line in _iter_lines(lines):
+        is_timing = parse_timing(line) is not None
+        if pending is not None:
+            if not is_timing:
+                yield pending
+            pending = None
+        if is_timing:
+            continue
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if stripped.isdigit():
+            pending = stripped
+        else:
+            yield stripped
+    if pending is not None:
+        yield pending
+
+
+def punctuate_lines(lines):
+    """除最后一行加句号外，其余每行末尾加逗号"""
+    previous = None
+    for line in lines:
+        if previous is not None:
+            yield previous + ','
+        previous = line
+    if previous is not None:
+        yield previous + '.'
+
+
+def segments_to_cues(segments):
+    """把 Whisper 风格的 {"start", "end", "text"} 片段（秒）转换为 Cue，跳过空文本"""
+    for segment in segments:
+        text = segment["text"].strip()
+        if text:
+            yield Cue(None, seconds_to_ms(segment["start"]), seconds_to_ms(segment["end"]), text)
+
+
+class SRTWriter:
+    """带缓冲的 SRT 写入器，序号自动从 1 开始连续编号"""
+
+    def __init__(self, f, buffer_size=1 << 16):
+        self.f = f
+        self.buffer_size = buffer_size
+        self.count = 0
+        self._buffer = []
+        self._buffered = 0
+
+    def write(self, cue):
+        self.count += 1
+        block = f"{self.count}\n{format_timestamp(cue.start)} --> {format_timestamp(cue.end)}\n{cue.text}\n\n"
+        self._buffer.append(block)
+        self._buffered += len(block)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self.f.write("".join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+
+def write_cues(path, cues, encoding="utf-8"):
+    """把字幕逐条写入 SRT 文件，返回写入的条数"""
+    with open(path, "w", encoding=encoding) as f, SRTWriter(f) as writer:
+        for cue in cues:
+            writer.write(cue)
+    return writer.count
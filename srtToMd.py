@@ -3,9 +3,90 @@ import jieba
 import os
 from collections import defaultdict
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from srtStream import iter_text_lines
+from batchManifest import BatchManifest
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 jieba.setLogLevel(logging.INFO)
 
+# jieba 前缀词典缓存目录，放在固定位置以便多个进程、多次运行共用同一份预构建缓存
+JIEBA_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "add-srt-compress-video", "jieba")
+
+
+def warm_jieba():
+    """预先加载 jieba 词典，第一次运行时构建缓存，之后直接从缓存加载"""
+    if jieba.dt.initialized:
+        return
+    os.makedirs(JIEBA_CACHE_DIR, exist_ok=True)
+    jieba.dt.tmp_dir = JIEBA_CACHE_DIR
+    jieba.initialize()
+
+
+# 子进程中使用的转换器
+_worker_converter = None
+
+
+def _init_worker(converter):
+    """子进程初始化：预热 jieba，保存转换器实例"""
+    global _worker_converter
+    warm_jieba()
+    _worker_converter = converter
+
+
+def _convert_in_worker(file_path):
+    return _worker_converter.convert_file(file_path)
+
+
+class KeywordMatcher:
+    """
+    多关键词匹配器，构建一次后每个句子只需扫描一遍。
+    安装了 pyahocorasick 时使用 Aho-Corasick 自动机，否则退回预编译的正则多选分支。
+    """
+
+    def __init__(self, keywords):
+        # keywords: {关键词: 标签集合}，长关键词命中时它包含的短关键词也必然命中，标签一并带上
+        words = sorted(set(keywords), key=len, reverse=True)
+        self.labels = {w: set().union(*(keywords[k] for k in words if k in w)) for w in words}
+        self._automaton = None
+        self._regex = None
+        if not words:
+            return
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for word in words:
+                self._automaton.add_word(word, word)
+            self._automaton.make_automaton()
+        else:
+            pattern = '|'.join(map(re.escape, words))
+            self._regex = re.compile(pattern)
+            # 零宽前瞻可以在每个位置都尝试匹配，找出互相重叠的关键词
+            self._overlapping = re.compile(f'(?=({pattern}))')
+
+    def search(self, text):
+        """是否包含任意一个关键词"""
+        if self._automaton is not None:
+            return next(self._automaton.iter(text), None) is not None
+        return self._regex is not None and self._regex.search(text) is not None
+
+    def find(self, text):
+        """返回文本中命中的所有关键词对应的标签"""
+        if self._automaton is not None:
+            hits = (word for _, word in self._automaton.iter(text))
+        elif self._regex is not None:
+            hits = (m.group(1) for m in self._overlapping.finditer(text))
+        else:
+            return set()
+        labels = set()
+        for word in hits:
+            labels |= self.labels[word]
+        return labels
+
+
 class SRTToMindmap:
     def __init__(self):
         # 扩充主题相关词汇
@@ -35,30 +116,43 @@ class SRTToMindmap:
             '解释词': ['就是', '也就是说', '换句话说', '即', '例如']
         }
 
+        # 按词表缓存构建好的匹配器
+        self._matchers = {}
+
+    def _get_matcher(self, key, table):
+        """为 {标签: [关键词]} 形式的词表构建匹配器，同一个 key 只构建一次"""
+        matcher = self._matchers.get(key)
+        if matcher is None:
+            keywords = defaultdict(set)
+            for label, words in table.items():
+                for word in words:
+                    keywords[word].add(label)
+            matcher = self._matchers[key] = KeywordMatcher(keywords)
+        return matcher
+
     def convert_file(self, file_path):
-        """转换单个SRT文件"""
+        """转换单个SRT文件，成功时返回输出路径"""
         try:
             # 从文件名中提取主题
             filename = os.path.basename(file_path)
             main_topic = self._extract_topic_from_filename(filename)
             print(f"\n主题: {main_topic}")
             
-            # 读取并清理内容
+            # 边读取边清理内容，同时提取主题相关内容
             with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            sentences = self._clean_content(content)
-            
-            # 提取主题相关内容
-            topics = self._extract_topics(sentences, main_topic)
+                topics = self._extract_topics(self._clean_content(f), main_topic)
             
             # 生成markdown
             markdown = self._generate_markdown(topics, main_topic)
             
-            # 保存文件
+            # 保存文件，先写临时文件再原子替换，中断时不会留下写了一半的文件
             output_path = os.path.splitext(file_path)[0] + '.md'
-            with open(output_path, 'w', encoding='utf-8') as f:
+            tmp_path = f"{output_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
                 f.write(markdown)
+            os.replace(tmp_path, output_path)
             print(f"已保存到: {output_path}")
+            return output_path
             
         except Exception as e:
             print(f"处理文件出错: {e}")
@@ -73,27 +167,26 @@ class SRTToMindmap:
         return name.strip()
 
     def _clean_content(self, content):
-        """清理内容"""
-        # 按行分割
-        lines = content.split('\n')
-        valid_lines = []
-        
-        for line in lines:
-            line = line.strip()
-            
-            # 跳过无效行
-            if not line or line.isdigit() or '-->' in line:
-                continue
+        """清理内容，content 可以是字符串或逐行迭代的文件对象，逐句产出"""
+        if isinstance(content, str):
+            content = content.split('\n')
+        pending = None
+
+        # 跳过序号、时间轴和空行
+        for line in iter_text_lines(content):
             # 跳过纯英文行
             if re.match(r'^[a-zA-Z\s,\.]+$', line):
                 continue
-                
-            valid_lines.append(line)
-        
-        # 合并并分句
-        text = ' '.join(valid_lines)
-        sentences = re.split(r'[。！？]', text)
-        return [s.strip() for s in sentences if len(s.strip()) > 5]
+
+            # 合并并分句，最后一段可能还没结束，留到下一行继续拼接
+            pending = line if pending is None else pending + ' ' + line
+            *sentences, pending = re.split(r'[。！？]', pending)
+            for s in sentences:
+                if len(s.strip()) > 5:
+                    yield s.strip()
+
+        if pending is not None and len(pending.strip()) > 5:
+            yield pending.strip()
 
     def _extract_topics(self, sentences, main_topic):
         """提取主题相关内容"""
@@ -101,38 +194,38 @@ class SRTToMindmap:
         current_section = "概述"
         
         # 获取主题相关词汇
-        topic_keywords = []
-        for topic, keywords in self.topic_words.items():
-            if any(word in main_topic for word in keywords):
-                topic_keywords.extend(keywords)
-        
-        # 如果没有找到相关词汇，使用文件名中的关键词
-        if not topic_keywords:
-            topic_keywords = [word for word in jieba.lcut(main_topic) if len(word) > 1]
+        matched_topics = self._get_matcher('topics', self.topic_words).find(main_topic)
+        topic_keywords = {topic: keywords for topic, keywords in self.topic_words.items() if topic in matched_topics}
+        if topic_keywords:
+            relevance = self._get_matcher(('relevance', tuple(topic_keywords)), topic_keywords)
+        else:
+            # 如果没有找到相关词汇，使用文件名中的关键词（只有这里需要分词）
+            words = [word for word in jieba.lcut(main_topic) if len(word) > 1]
+            relevance = KeywordMatcher({word: {main_topic} for word in words})
+
+        markers = self._get_matcher('markers', self.important_words)
         
+        # 既相关又被当作章节标题的句子，在没有找到任何子主题时作为兜底内容
+        fallback = []
+
         for sentence in sentences:
-            # 分词
-            words = jieba.lcut(sentence)
-            
             # 检查是否包含主题相关词汇
-            is_relevant = any(keyword in sentence for keyword in topic_keywords)
+            is_relevant = relevance.search(sentence)
             
-            # 检查是否是章节标题
-            is_section = False
-            for category, markers in self.important_words.items():
-                if any(marker in sentence for marker in markers):
-                    if len(sentence) > 10:  # 避免太短的句子作为标题
-                        current_section = sentence
-                        is_section = True
-                        break
+            # 检查是否是章节标题，避免太短的句子作为标题
+            is_section = len(sentence) > 10 and markers.search(sentence)
+            if is_section:
+                current_section = sentence
             
             # 如果是相关内容且不是章节标题，添加为子主题
             if is_relevant and not is_section:
                 topics[current_section].append(sentence)
+            elif is_relevant:
+                fallback.append(sentence)
         
         # 如果没有找到任何内容，添加所有主题相关的句子
         if not topics:
-            topics["主要内容"] = [s for s in sentences if any(keyword in s for keyword in topic_keywords)]
+            topics["主要内容"] = fallback
             
         return topics
 
@@ -156,13 +249,42 @@ class SRTToMindmap:
         
         return ''.join(lines)
 
-    def convert_directory(self, directory_path):
-        """处理目录下的所有SRT文件"""
-        for filename in os.listdir(directory_path):
-            if filename.endswith('.srt'):
-                file_path = os.path.join(directory_path, filename)
-                print(f"\n处理文件: {filename}")
-                self.convert_file(file_path)
+    def convert_directory(self, directory_path, jobs=None, manifest=None):
+        """
+        处理目录下的所有SRT文件。
+        jobs 大于 1 时使用进程池并行转换，每个子进程只预热一次 jieba；
+        父进程先加载好词典，fork 出的子进程直接继承，spawn 的子进程从预构建的缓存加载。
+        任务清单中已完成且内容和词表都没有变化的文件会被跳过，每个文件完成后立即记录。
+        """
+        manifest = manifest or BatchManifest()
+        settings = {"topic_words": self.topic_words, "important_words": self.important_words}
+        file_paths = manifest.filter_pending([
+            os.path.join(directory_path, filename)
+            for filename in os.listdir(directory_path) if filename.endswith('.srt')
+        ], "srt_to_md", settings)
+        jobs = min(jobs or os.cpu_count() or 1, len(file_paths))
+        if jobs <= 1:
+            for file_path in file_paths:
+                print(f"\n处理文件: {os.path.basename(file_path)}")
+                self._record(manifest, settings, file_path, self.convert_file(file_path))
+            return
+
+        # 大文件先处理，避免最后只剩一个大文件在单独跑
+        file_paths.sort(key=os.path.getsize, reverse=True)
+        warm_jieba()
+        succeeded = 0
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(self,)) as pool:
+            for file_path, result in zip(file_paths, pool.map(_convert_in_worker, file_paths, chunksize=8)):
+                self._record(manifest, settings, file_path, result)
+                succeeded += bool(result)
+        print(f"\n共处理 {len(file_paths)} 个文件，成功 {succeeded} 个")
+
+    def _record(self, manifest, settings, file_path, output_path):
+        """把单个文件的转换结果写入任务清单"""
+        if output_path:
+            manifest.done(file_path, "srt_to_md", settings, [output_path])
+        else:
+            manifest.fail(file_path, "srt_to_md", settings, "转换失败")
 
 if __name__ == "__main__":
     # 获取当前脚本所在目录
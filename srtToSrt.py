@@ -5,25 +5,23 @@ LastEditors: Diana Tang
 Description: some description
 FilePath: /add-srt-compress-video/srtToSrt.py
 '''
-import re
+from srtStream import parse
 
 def remove_srt_timestamps_and_sequence(input_file, output_file):
-    # Open the input SRT file
-    with open(input_file, 'r', encoding='utf-8') as file:
-        srt_content = file.read()
-    
-    # Regular expression to match the sequence numbers and timestamps
-    pattern = r'(\d+\s*\n|\d{2}:\d{2}:\d{2},\d{3}\s*-->.*\n)'
-    
-    # Remove the matched sequences (numbers and timestamps)
-    cleaned_content = re.sub(pattern, '', srt_content)
-    
-    # Write the cleaned content to the output file
-    with open(output_file, 'w', encoding='utf-8') as file:
-        file.write(cleaned_content.strip())
+    # Stream cues from the input SRT file and write only their text, one block per cue
+    with open(input_file, 'r', encoding='utf-8') as src, open(output_file, 'w', encoding='utf-8') as dst:
+        first = True
+        for cue in parse(src):
+            if not cue.text:
+                continue
+            if not first:
+                dst.write('\n\n')
+            dst.write(cue.text)
+            first = False
 
-# Example usage
-input_file = './videos/[3.1]--前端工程化Linux预备知识.srt'  # Replace with the path to your input SRT file
-output_file = './output.srt'  # Replace with the path for the output file
+if __name__ == "__main__":
+    # Example usage
+    input_file = './videos/[3.1]--前端工程化Linux预备知识.srt'  # Replace with the path to your input SRT file
+    output_file = './output.srt'  # Replace with the path for the output file
 
-remove_srt_timestamps_and_sequence(input_file, output_file)
+    remove_srt_timestamps_and_sequence(input_file, output_file)
@@ -7,6 +7,7 @@ FilePath: /add-srt-compress-video/testffmpeg.py
 '''
 
 import subprocess
+import shutil
 
 def check_ffmpeg():
     try:
@@ -14,18 +15,19 @@ def check_ffmpeg():
         result = subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         if result.returncode == 0:
             print("FFmpeg is installed and available.")
+            return True
         else:
             print("FFmpeg is not installed or not in the system path.")
     except FileNotFoundError:
         print("FFmpeg is not installed or not found in the system path.")
+    return False
 
-check_ffmpeg()
-import shutil
-
-ffmpeg_path = shutil.which("ffmpeg")
+if __name__ == "__main__":
+    check_ffmpeg()
 
-if ffmpeg_path:
-    print(f"FFmpeg path: {ffmpeg_path}")
-else:
-    print("FFmpeg is not installed or not in the system path.")
+    ffmpeg_path = shutil.which("ffmpeg")
 
+    if ffmpeg_path:
+        print(f"FFmpeg path: {ffmpeg_path}")
+    else:
+        print("FFmpeg is not installed or not in the system path.")
@@ -0,0 +1,235 @@
+'''
+Author: Diana Tang
+Date: 2026-10-18 23:08:52
+LastEditors: Diana Tang
+Description: 可替换的语音识别后端：原版 Whisper（PyTorch fp32）或 int8 量化的 faster-whisper（CPU），并按实时率预算自动选择模型档位
+FilePath: /add-srt-compress-video/transcribeBackend.py
+'''
+import os
+import json
+import time
+import tempfile
+import threading
+import platform
+import argparse
+from importlib import metadata
+from audioStream import SAMPLE_RATE, load_audio
+
+DEFAULT_BACKEND = os.environ.get("SRT_BACKEND", "whisper")
+# faster-whisper 在 CPU 上的计算精度，int8 量化比 fp32 快数倍、内存减半，识别质量几乎不变
+DEFAULT_COMPUTE_TYPE = os.environ.get("SRT_COMPUTE_TYPE", "int8")
+COMPUTE_TYPES = ("int8", "int8_float32", "int16", "float32")
+# 自动选择时可选的模型档位，按精度从低到高排列，在 CPU 上也是从快到慢
+TIERS = ("tiny", "base", "small", "medium", "turbo", "large-v3")
+# 实时率预算：识别耗时 / 音频时长，0.5 表示识别速度是播放速度的两倍
+DEFAULT_RTF = 0.5
+# 校准时识别的音频长度（秒），正好是 Whisper 的一个窗口
+CALIBRATION_SECONDS = 30
+# 校准结果缓存文件
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "add-srt-compress-video", "calibration.json")
+# 保护缓存文件的读取-合并-写回
+_cache_lock = threading.Lock()
+
+
+class WhisperBackend:
+    """openai-whisper，PyTorch 推理，有 GPU 时自动使用 GPU"""
+
+    package = "openai-whisper"
+
+    def __init__(self, model_name="turbo", threads=None, compute_type=None):
+        import whisper
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        self.model_name = model_name
+        self._model = whisper.load_model(model_name)
+
+    def transcribe(self, audio, language=None, **kwargs):
+        return self._model.transcribe(audio, language=language, **kwargs)
+
+
+class FasterWhisperBackend:
+    """
+    faster-whisper（CTranslate2），在 CPU 上用 int8 量化权重推理。
+    threads 为推理线程数，默认使用全部核心；长音频模式下由每个工作进程分摊。
+    """
+
+    package = "faster-whisper"
+
+    def __init__(self, model_name="turbo", threads=None, compute_type=DEFAULT_COMPUTE_TYPE, beam_size=5):
+        from faster_whisper import WhisperModel
+        self.model_name = model_name
+        self.beam_size = beam_size
+        self._model = WhisperModel(model_name, device="cpu", compute_type=compute_type or DEFAULT_COMPUTE_TYPE,
+                                   cpu_threads=threads or os.cpu_count() or 0)
+
+    def transcribe(self, audio, language=None, **kwargs):
+        """返回与 openai-whisper 相同结构的结果，片段是 {"id", "start", "end", "text"} 字典"""
+        segments, info = self._model.transcribe(audio, language=language, beam_size=self.beam_size)
+        return {
+            "segments": [{"id": s.id, "start": s.start, "end": s.end, "text": s.text} for s in segments],
+            "language": info.language,
+        }
+
+
+BACKENDS = {
+    "whisper": WhisperBackend,
+    "faster-whisper": FasterWhisperBackend,
+}
+
+
+def model_spec(backend, model_name, compute_type=DEFAULT_COMPUTE_TYPE):
+    """
+    把后端、模型和精度合成一个字符串，用作识别缓存和任务清单中的模型名。
+    原版 Whisper 仍然只用模型名，已有的缓存继续有效。
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的识别后端: {backend}，可选: {', '.join(BACKENDS)}")
+    if backend == "whisper":
+        return model_name
+    return f"{backend}:{model_name}:{compute_type or DEFAULT_COMPUTE_TYPE}"
+
+
+def parse_model_spec(spec):
+    """model_spec 的逆操作，返回 (后端, 模型名, 精度)，不带后端前缀的视为原版 Whisper"""
+    backend, sep, rest = spec.partition(":")
+    if not sep or backend not in BACKENDS:
+        return "whisper", spec, None
+    model_name, sep, compute_type = rest.rpartition(":")
+    if not sep or compute_type not in COMPUTE_TYPES:
+        return backend, rest, DEFAULT_COMPUTE_TYPE
+    return backend, model_name, compute_type
+
+
+def load_model(spec="turbo", threads=None):
+    """按 model_spec 加载识别模型，返回的对象提供与 Whisper 模型相同的 transcribe"""
+    backend, model_name, compute_type = parse_model_spec(spec)
+    return BACKENDS[backend](model_name, threads, compute_type)
+
+
+def _cpu_name():
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def _package_version(backend):
+    try:
+        return metadata.version(BACKENDS[backend].package)
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _cache_key(backend, compute_type, threads):
+    """同一台机器、同样的后端、精度和线程数，测得的实时率可以复用"""
+    return f"{backend}|{compute_type}|{threads or os.cpu_count()}|{_cpu_name()}|{_package_version(backend)}"
+
+
+def _load_cache():
+    try:
+        with open(CACHE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(key, value):
+    """
+    在锁内重新读取缓存、合并这一项再整体替换，同一进程中并发的校准不会互相覆盖；
+    临时文件名由 mkstemp 生成，不同线程不会写到同一个文件。
+    """
+    directory = os.path.dirname(CACHE_PATH)
+    os.makedirs(directory, exist_ok=True)
+    with _cache_lock:
+        cache = _load_cache()
+        cache[key] = value
+        fd, tmp_path = tempfile.mkstemp(prefix=".calibration-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(cache, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, CACHE_PATH)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+def measure_rtf(model, audio, language=None):
+    """识别一段音频，返回实时率：识别耗时 / 音频时长"""
+    start = time.perf_counter()
+    model.transcribe(audio, language=language)
+    return (time.perf_counter() - start) / (len(audio) / SAMPLE_RATE)
+
+
+def calibrate(sample_path=None, backend=DEFAULT_BACKEND, compute_type=DEFAULT_COMPUTE_TYPE, rtf=DEFAULT_RTF,
+              threads=None, language=None, tiers=TIERS, refresh=False):
+    """
+    从快到慢逐个试识别 sample_path 开头的一段音频，选出实时率不超过 rtf 的最精确档位，返回它的 model_spec。
+    测量结果按后端、精度、线程数、CPU 型号和库版本缓存到磁盘，同一台机器之后换了预算也不用重新测量；
+    只有缓存中没有的档位才需要 sample_path。
+    遇到第一个超出预算的档位就停止，更慢的档位不会下载或加载。
+    """
+    key = _cache_key(backend, compute_type, threads)
+    results = {} if refresh else _load_cache().get(key, {})
+    audio = None
+    chosen = None
+    for tier in tiers:
+        if tier not in results:
+            if audio is None:
+                if sample_path is None:
+                    raise ValueError("没有已缓存的校准结果，需要一段音频用于校准")
+                audio = load_audio(sample_path, duration=CALIBRATION_SECONDS)
+                if len(audio) < SAMPLE_RATE:
+                    raise ValueError(f"校准音频太短: {sample_path}")
+            print(f"正在校准 {model_spec(backend, tier, compute_type)}")
+            model = load_model(model_spec(backend, tier, compute_type), threads)
+            # 先识别一小段预热，避免把首次推理的初始化开销算进实时率
+            measure_rtf(model, audio[:SAMPLE_RATE], language)
+            results[tier] = round(measure_rtf(model, audio, language), 4)
+            del model
+            _save_cache(key, results)
+        if results[tier] > rtf:
+            break
+        chosen = tier
+    if chosen is None:
+        chosen = tiers[0]
+        print(f"所有档位都达不到实时率 {rtf}，使用最快的 {chosen}")
+    spec = model_spec(backend, chosen, compute_type)
+    print(f"按实时率 {rtf} 选择模型: {spec}（实测 {results[chosen]:.3f}）")
+    return spec
+
+
+def resolve_model(model_name, backend=DEFAULT_BACKEND, compute_type=DEFAULT_COMPUTE_TYPE, rtf=DEFAULT_RTF,
+                  sample_path=None, threads=None, language=None):
+    """auto 通过校准选出模型档位，其他值直接合成 model_spec；已经是 model_spec 的原样返回"""
+    if model_name == "auto":
+        return calibrate(sample_path, backend, compute_type, rtf, threads, language)
+    if ":" in model_name:
+        return model_name
+    return model_spec(backend, model_name, compute_type)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量各模型档位的实时率，选出满足预算的模型")
+    parser.add_argument("sample", help="用于校准的音频或视频")
+    parser.add_argument("--backend", choices=list(BACKENDS), default=DEFAULT_BACKEND, help="识别后端")
+    parser.add_argument("--compute-type", choices=COMPUTE_TYPES, default=DEFAULT_COMPUTE_TYPE,
+                        help="faster-whisper 的计算精度")
+    parser.add_argument("--rtf", type=float, default=DEFAULT_RTF, help="实时率预算")
+    parser.add_argument("--threads", type=int, default=None, help="推理线程数")
+    parser.add_argument("--language", default=None, help="识别语言")
+    parser.add_argument("--refresh", action="store_true", help="忽略缓存重新测量")
+    args = parser.parse_args()
+
+    calibrate(args.sample, args.backend, args.compute_type, args.rtf, args.threads, args.language,
+              refresh=args.refresh)
+    for tier, value in _load_cache().get(_cache_key(args.backend, args.compute_type, args.threads), {}).items():
+        print(f"{tier}: 实时率 {value:.3f}")
+
+
+if __name__ == "__main__":
+    main()
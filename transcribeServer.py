@@ -0,0 +1,263 @@
+'''
+Author: Diana Tang
+Date: 2026-10-18 18:58:40
+LastEditors: Diana Tang
+Description: 常驻的本地识别服务：模型只加载一次，通过 Unix 套接字接收音频路径或 PCM 数据，返回字幕片段
+FilePath: /add-srt-compress-video/transcribeServer.py
+'''
+import os
+import json
+import queue
+import socket
+import struct
+import hashlib
+import argparse
+import threading
+import socketserver
+from concurrent.futures import Future
+import numpy as np
+from audioStream import load_audio
+
+DEFAULT_SOCKET = os.environ.get(
+    "TRANSCRIBE_SOCKET",
+    os.path.join(os.path.expanduser("~"), ".cache", "add-srt-compress-video", "transcribe.sock")
+)
+# 模型线程一次最多取出的请求数
+MAX_BATCH = 8
+_HEADER = struct.Struct("<I")
+
+
+def send_message(sock, header, payload=b""):
+    """发送一条消息：4 字节长度 + JSON 头，头中的 payload_bytes 指明后面跟随的二进制数据长度"""
+    header = dict(header, payload_bytes=len(payload))
+    data = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data)
+    if payload:
+        sock.sendall(payload)
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("连接已关闭")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_message(sock):
+    """接收一条消息，返回 (头, 二进制数据)"""
+    (length,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    header = json.loads(_recv_exact(sock, length).decode("utf-8"))
+    payload = _recv_exact(sock, header.get("payload_bytes", 0))
+    return header, payload
+
+
+class TranscribeServer:
+    """
+    模型常驻内存的识别服务。
+    每个连接在自己的线程中解码音频，解码可以并行；识别由唯一的模型线程串行执行，
+    它每次取出所有正在排队的请求一起处理，同一段音频、同样参数的请求只识别一次。
+    Whisper 的 transcribe 一次只能处理一段音频，所以批处理的收益来自合并重复请求和模型线程不空等。
+    """
+
+    def __init__(self, model_name="turbo", socket_path=DEFAULT_SOCKET, max_batch=MAX_BATCH, threads=None):
+        self.model_name = model_name
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.threads = threads
+        self._models = {}
+        self._requests = queue.Queue()
+        self._server = None
+
+    def get_model(self, model_name):
+        """按名称加载模型，名称可以带后端前缀（见 transcribeBackend.py），加载过的一直保留"""
+        model = self._models.get(model_name)
+        if model is None:
+            from main import load_model
+            print(f"正在加载模型: {model_name}")
+            model = self._models[model_name] = load_model(model_name, self.threads)
+        return model
+
+    def submit(self, key, model_name, audio, language=None):
+        """把识别请求交给模型线程，返回 Future"""
+        future = Future()
+        self._requests.put((key, model_name, audio, language, future))
+        return future
+
+    def _run_model(self):
+        while True:
+            batch = [self._requests.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._requests.get_nowait())
+                except queue.Empty:
+                    break
+            # 相同的请求合并成一次识别
+            groups = {}
+            for key, model_name, audio, language, future in batch:
+                groups.setdefault((key, model_name, language), (audio, []))[1].append(future)
+            for (_, model_name, language), (audio, futures) in groups.items():
+                try:
+                    result = self.get_model(model_name).transcribe(audio, language=language)
+                    segments = [{"start": float(s["start"]), "end": float(s["end"]), "text": s["text"]}
+                                for s in result["segments"]]
+                except Exception as e:
+                    for future in futures:
+                        future.set_exception(e)
+                    continue
+                for future in futures:
+                    future.set_result(segments)
+
+    def handle(self, header, payload):
+        """处理一条请求，返回响应头"""
+        command = header.get("cmd", "transcribe")
+        if command == "ping":
+            return {"ok": True, "pid": os.getpid(), "model": self.model_name, "loaded": list(self._models)}
+        if command == "stop":
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
+            return {"ok": True}
+        if command != "transcribe":
+            return {"ok": False, "error": f"未知命令: {command}"}
+
+        model_name = header.get("model") or self.model_name
+        if "path" in header:
+            path = header["path"]
+            stat = os.stat(path)
+            key = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime}"
+            audio = load_audio(path)
+        else:
+            key = hashlib.sha1(payload).hexdigest()
+            audio = np.frombuffer(payload, dtype=np.float32)
+        segments = self.submit(key, model_name, audio, header.get("language")).result()
+        return {"ok": True, "segments": segments}
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            if ping(self.socket_path):
+                raise RuntimeError(f"识别服务已在运行: {self.socket_path}")
+            os.remove(self.socket_path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.socket_path)), exist_ok=True)
+        # 启动时先加载默认模型，之后的请求不再有加载延迟
+        self.get_model(self.model_name)
+        threading.Thread(target=self._run_model, daemon=True).start()
+
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                while True:
+                    try:
+                        header, payload = recv_message(self.request)
+                    except (ConnectionError, struct.error):
+                        return
+                    try:
+                        response = server.handle(header, payload)
+                    except Exception as e:
+                        response = {"ok": False, "error": str(e)}
+                    send_message(self.request, response)
+
+        class Server(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+
+        self._server = Server(self.socket_path, Handler)
+        print(f"识别服务已启动: {self.socket_path}（模型 {self.model_name}）")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+
+class TranscribeClient:
+    """识别服务的客户端，接口与 Whisper 模型的 transcribe 相同，可以直接替换 main.py 中的模型"""
+
+    def __init__(self, model_name="turbo", socket_path=DEFAULT_SOCKET):
+        self.model_name = model_name
+        self.socket_path = socket_path
+        self._local = threading.local()
+
+    def _request(self, header, payload=b""):
+        # 每个线程保持一条连接，连续识别多个文件时不用反复建立连接
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        try:
+            send_message(sock, header, payload)
+            response, _ = recv_message(sock)
+        except OSError:
+            self._local.sock = None
+            sock.close()
+            raise
+        if not response.get("ok"):
+            raise RuntimeError(f"识别服务出错: {response.get('error')}")
+        return response
+
+    def transcribe(self, audio, language=None, **kwargs):
+        """audio 可以是媒体文件路径（由服务端解码）或 16kHz 单声道 float32 数组"""
+        header = {"cmd": "transcribe", "model": self.model_name, "language": language}
+        if isinstance(audio, str):
+            return {"segments": self._request(dict(header, path=os.path.abspath(audio)))["segments"]}
+        samples = np.ascontiguousarray(audio, dtype=np.float32)
+        return {"segments": self._request(header, samples.tobytes())["segments"]}
+
+
+def ping(socket_path=DEFAULT_SOCKET, timeout=1.0):
+    """服务正在运行时返回它的状态，否则返回 None"""
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            send_message(sock, {"cmd": "ping"})
+            response, _ = recv_message(sock)
+            return response
+    except (OSError, ValueError):
+        return None
+
+
+def connect(model_name="turbo", socket_path=DEFAULT_SOCKET):
+    """服务正在运行时返回客户端，否则返回 None，调用方自己加载模型"""
+    if ping(socket_path) is None:
+        return None
+    print(f"使用常驻识别服务: {socket_path}")
+    return TranscribeClient(model_name, socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="常驻的本地识别服务，模型只加载一次")
+    parser.add_argument("--model", default="turbo",
+                        help="启动时预加载的模型，如 turbo 或 faster-whisper:small:int8")
+    parser.add_argument("--threads", type=int, default=None, help="识别使用的线程数")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix 套接字路径")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="模型线程一次最多处理的请求数")
+    parser.add_argument("--stop", action="store_true", help="停止正在运行的服务")
+    parser.add_argument("--status", action="store_true", help="查看服务状态")
+    args = parser.parse_args()
+
+    if args.status or args.stop:
+        status = ping(args.socket)
+        if status is None:
+            print("识别服务未运行")
+            raise SystemExit(1)
+        if args.stop:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(args.socket)
+                send_message(sock, {"cmd": "stop"})
+                recv_message(sock)
+            print("识别服务已停止")
+        else:
+            print(f"识别服务运行中: pid {status['pid']}，已加载模型 {', '.join(status['loaded'])}")
+        return
+
+    TranscribeServer(args.model, args.socket, args.max_batch, args.threads).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+'''
+Author: Diana Tang
+Date: 2026-10-18 10:03:18
+LastEditors: Diana Tang
+Description: 按音频内容寻址的语音识别结果缓存，重复运行时跳过已经识别过的视频
+FilePath: /add-srt-compress-video/transcriptCache.py
+'''
+import os
+import zlib
+import struct
+import hashlib
+import subprocess
+
+# 默认缓存目录和容量上限
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "add-srt-compress-video", "transcripts")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# 缓存文件格式：魔数 + 片段数，每个片段为 起止时间(毫秒) + 文本长度 + UTF-8 文本，整体 zlib 压缩
+_MAGIC = b"SEG1"
+_HEADER = struct.Struct("<4sI")
+_SEGMENT = struct.Struct("<IIH")
+
+
+def audio_fingerprint(media_path):
+    """
+    计算媒体文件中第一条音轨的 SHA-256。
+    使用 -c copy 只做解封装，直接对压缩后的音频数据包求哈希，不需要解码，
+    所以即使重新封装了容器或改了视频轨，只要音频不变就能命中缓存。
+    """
+    command = [
+        "ffmpeg",
+        "-nostdin",
+        "-loglevel", "error",
+        "-i", media_path,
+        "-map", "0:a:0",
+        "-c", "copy",
+        "-f", "hash",
+        "-hash", "sha256",
+        "-"
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    return result.stdout.decode().strip().split("=", 1)[-1]
+
+
+def encode_segments(segments):
+    """把 Whisper 片段编码为紧凑的二进制格式，只保留 start/end/text"""
+    parts = [_HEADER.pack(_MAGIC, len(segments))]
+    for segment in segments:
+        text = segment["text"].encode("utf-8")[:0xFFFF]
+        parts.append(_SEGMENT.pack(round(segment["start"] * 1000), round(segment["end"] * 1000), len(text)))
+        parts.append(text)
+    return zlib.compress(b"".join(parts))
+
+
+def decode_segments(data):
+    """还原为 generate_srt_file 可直接使用的片段列表"""
+    data = zlib.decompress(data)
+    magic, count = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError("无效的缓存文件")
+    offset = _HEADER.size
+    segments = []
+    for _ in range(count):
+        start, end, length = _SEGMENT.unpack_from(data, offset)
+        offset += _SEGMENT.size
+        text = data[offset:offset + length].decode("utf-8", errors="ignore")
+        offset += length
+        segments.append({"start": start / 1000, "end": end / 1000, "text": text})
+    return segments
+
+
+class TranscriptCache:
+    """
+    以文件为单位的识别结果缓存。
+    键由音频哈希、模型名和语言组成；命中时刷新文件修改时间，
+    总大小超过上限时按修改时间淘汰最久未使用的条目（LRU）。
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(fingerprint, model_name, language=None):
+        """组合缓存键"""
+        raw = f"{fingerprint}|{model_name}|{language or 'auto'}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def key_for(self, media_path, model_name, language=None):
+        """计算媒体文件对应的缓存键"""
+        return self.make_key(audio_fingerprint(media_path), model_name, language)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.seg")
+
+    def get(self, key):
+        """读取缓存，未命中返回 None"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                segments = decode_segments(f.read())
+        except (OSError, ValueError, zlib.error, struct.error):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return segments
+
+    def put(self, key, segments):
+        """写入缓存，先写临时文件再原子替换，避免并发读到半个文件"""
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(encode_segments(segments))
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """总大小超过上限时删除最久未使用的条目"""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".seg"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
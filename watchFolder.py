@@ -0,0 +1,243 @@
+'''
+Author: Diana Tang
+Date: 2026-10-18 21:24:06
+LastEditors: Diana Tang
+Description: 常驻的监视目录服务：新视频上传完成后立即送入提取、识别、生成字幕、烧录和压缩流水线
+FilePath: /add-srt-compress-video/watchFolder.py
+'''
+import os
+import sys
+import time
+import errno
+import select
+import signal
+import struct
+import ctypes
+import ctypes.util
+import threading
+from main import VIDEO_EXTENSIONS, build_parser, parse_args, build_pipeline, close_pipeline, run_pipeline
+
+# 文件大小和修改时间保持不变多少秒后认为上传完成
+SETTLE_SECONDS = 3.0
+# 轮询模式下检查目录的间隔（秒）
+POLL_SECONDS = 2.0
+# 上传工具常用的临时文件名，等它们改名为正式文件名后再处理
+TEMP_SUFFIXES = (".part", ".partial", ".tmp", ".crdownload", ".download", ".filepart")
+
+# <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+
+
+class Inotify:
+    """通过 ctypes 调用 Linux inotify，不需要第三方库；其他系统上构造时抛出 OSError"""
+
+    def __init__(self, folder, mask=IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE):
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify 只在 Linux 上可用")
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"无法监视目录: {folder}")
+
+    def read(self, timeout):
+        """等待最多 timeout 秒，返回 [(事件掩码, 文件名), ...]"""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            events.append((mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """
+    监视一个目录，逐个产出已经上传完成的视频路径，迭代直到调用 stop()。
+    启动时检查一次目录中已有的文件，之后只处理 inotify 报告的变化，不再整目录重新扫描；
+    没有 inotify 时（非 Linux、或网络文件系统上指定 poll=True）退回定期轮询。
+    改名到目录中的文件（上传工具写完临时文件后改名）立即就绪；
+    其余文件在大小和修改时间保持 settle 秒不变后才就绪。
+    同一个文件内容不变时只产出一次。
+    """
+
+    def __init__(self, folder, extensions=VIDEO_EXTENSIONS, settle=SETTLE_SECONDS, poll=False,
+                 poll_interval=POLL_SECONDS):
+        self.folder = folder
+        self.extensions = extensions
+        self.settle = settle
+        self.poll = poll
+        self.poll_interval = poll_interval
+        self._stopped = threading.Event()
+        # 等待稳定的文件: 路径 -> (大小, 修改时间, 最近一次变化的时间)
+        self._pending = {}
+        # 已产出的文件: 路径 -> (大小, 修改时间)
+        self._emitted = {}
+        # 轮询模式下上一次看到的目录状态
+        self._snapshot = {}
+
+    def stop(self):
+        self._stopped.set()
+
+    def _wanted(self, name):
+        return (not name.startswith((".", "~")) and name.lower().endswith(self.extensions)
+                and not name.lower().endswith(TEMP_SUFFIXES))
+
+    def _stat(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def _touch(self, path):
+        """文件有变化，重新开始等待稳定"""
+        signature = self._stat(path)
+        if signature is None:
+            self._pending.pop(path, None)
+        else:
+            self._pending[path] = (*signature, time.monotonic())
+
+    def _ready(self, path, signature):
+        """文件就绪，内容和上次产出时不同才返回 True"""
+        self._pending.pop(path, None)
+        if signature is None or signature[0] == 0 or self._emitted.get(path) == signature:
+            return False
+        self._emitted[path] = signature
+        return True
+
+    def _settled(self):
+        """大小和修改时间已经保持 settle 秒不变的文件"""
+        now = time.monotonic()
+        ready = []
+        for path, (size, mtime, since) in list(self._pending.items()):
+            signature = self._stat(path)
+            if signature != (size, mtime):
+                self._touch(path)
+            elif now - since >= self.settle and self._ready(path, signature):
+                ready.append(path)
+        return ready
+
+    def _scan(self):
+        """轮询模式：和上一次的目录状态比较，返回新增或变化的文件"""
+        changed = []
+        current = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.is_file() and self._wanted(entry.name):
+                    stat = entry.stat()
+                    current[entry.path] = (stat.st_size, stat.st_mtime_ns)
+                    if self._snapshot.get(entry.path) != current[entry.path]:
+                        changed.append(entry.path)
+        for path in set(self._emitted) - set(current):
+            del self._emitted[path]
+        self._snapshot = current
+        return changed
+
+    def _timeout(self):
+        if not self._pending:
+            return 1.0
+        return max(0.1, min(1.0, self.settle / 2))
+
+    def __iter__(self):
+        inotify = None
+        if not self.poll:
+            try:
+                inotify = Inotify(self.folder)
+            except OSError as e:
+                print(f"无法使用 inotify（{e}），改为每 {self.poll_interval} 秒轮询一次")
+        mode = "inotify" if inotify is not None else "轮询"
+        print(f"正在监视 {self.folder}（{mode}），按 Ctrl+C 停止")
+        try:
+            # 启动前已经在目录中的文件也要处理，已完成的由任务清单跳过
+            for path in self._scan():
+                self._touch(path)
+            last_scan = time.monotonic()
+            while not self._stopped.is_set():
+                if inotify is not None:
+                    for mask, name in inotify.read(self._timeout()):
+                        if mask & IN_Q_OVERFLOW:
+                            # 事件队列溢出时丢失了部分事件，只有这时才重新扫描目录
+                            for path in self._scan():
+                                self._touch(path)
+                            continue
+                        if not self._wanted(name):
+                            continue
+                        path = os.path.join(self.folder, name)
+                        if mask & (IN_DELETE | IN_MOVED_FROM):
+                            self._pending.pop(path, None)
+                            self._emitted.pop(path, None)
+                        elif mask & IN_MOVED_TO:
+                            if self._ready(path, self._stat(path)):
+                                yield path
+                        else:
+                            self._touch(path)
+                else:
+                    self._stopped.wait(min(self.poll_interval, self._timeout()))
+                    if time.monotonic() - last_scan >= self.poll_interval:
+                        last_scan = time.monotonic()
+                        for path in self._scan():
+                            self._touch(path)
+                for path in self._settled():
+                    yield path
+        finally:
+            if inotify is not None:
+                inotify.close()
+
+
+def main():
+    parser = build_parser("监视视频文件夹，新视频上传完成后自动生成字幕、烧录并压缩")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS,
+                        help="文件大小保持不变多少秒后认为上传完成")
+    parser.add_argument("--poll", action="store_true", help="不使用 inotify，定期轮询目录（网络文件系统上使用）")
+    parser.add_argument("--poll-interval", type=float, default=POLL_SECONDS, help="轮询间隔（秒）")
+    args = parse_args(parser)
+    if args.sequential:
+        parser.error("监视模式始终使用流水线，不支持 --sequential")
+
+    os.makedirs(args.output_folder, exist_ok=True)
+    watcher = FolderWatcher(args.videos_folder, settle=args.settle, poll=args.poll, poll_interval=args.poll_interval)
+    model, cache, manifest, report, index, burn = build_pipeline(args)
+
+    # 收到停止信号后不再接收新文件，已经进入流水线的视频处理完再退出
+    def stop(signum, frame):
+        print("正在停止监视，等待进行中的视频处理完成")
+        watcher.stop()
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    try:
+        failed = run_pipeline(model, watcher, args.output_folder, args.jobs, args.queue_size, args.stream,
+                              args.mmap, cache, args.model, args.language, not args.long_audio, burn, manifest,
+                              report, index)
+        if failed:
+            print(f"共 {len(failed)} 个视频处理失败")
+    finally:
+        close_pipeline(args, model, report, index)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,39 +6,44 @@ Description: some description
 FilePath: /Add-SRT-To-Video/wavToSrt.py
 '''
 import os
-import speech_recognition as sr
+from asyncRecognizer import get_backend, recognize_files
+from srtStream import write_cues, segments_to_cues
+from batchManifest import BatchManifest
 
-def generate_srt_from_audio(audio_path, srt_path):
-    recognizer = sr.Recognizer()
+# 识别引擎：vosk / sphinx 为离线引擎，google 为在线识别，stub 为本地测试桩，
+# mock / http / google-cloud 为异步后端（见 asyncRecognizer.py）
+ENGINE = os.environ.get("SRT_ENGINE", "vosk")
+# 同时在途的识别请求数
+CONCURRENCY = int(os.environ.get("SRT_CONCURRENCY", "16"))
 
-    try:
-        with sr.AudioFile(audio_path) as source:
-            audio = recognizer.record(source)
+def write_srt(srt_path, segments):
+    count = write_cues(srt_path, segments_to_cues(segments))
+    print(f"SRT文件生成成功: {srt_path}（{count} 条字幕）")
+    return srt_path
 
-        # 使用Google语音识别服务
-        text = recognizer.recognize_google(audio, language="zh-CN")
-
-        # 创建SRT文件
-        with open(srt_path, "w", encoding="utf-8") as f:
-            lines = text.split(". ")  # 按句号分割为行
-            for i, line in enumerate(lines):
-                start_time = i * 5  # 每段持续5秒
-                end_time = start_time + 5
-                f.write(f"{i+1}\n")
-                f.write(f"{start_time // 60:02d}:{start_time % 60:02d},000 --> {end_time // 60:02d}:{end_time % 60:02d},000\n")
-                f.write(f"{line.strip()}\n\n")
-        print(f"SRT文件生成成功: {srt_path}")
-    except Exception as e:
-        print(f"生成SRT时出错: {e}")
-
-def process_wav_files_in_folder(folder_path):
+def process_wav_files_in_folder(folder_path, manifest=None):
+    # 任务清单记录已完成的文件，重新运行时只处理新增或变化的文件
+    manifest = manifest or BatchManifest()
+    settings = {"engine": ENGINE, "language": "zh-CN"}
+    pending = []
     for filename in os.listdir(folder_path):
         if filename.endswith(".wav"):
             audio_path = os.path.join(folder_path, filename)
-            srt_path = audio_path.replace(".wav", ".srt")
-            
-            # 生成SRT文件
-            generate_srt_from_audio(audio_path, srt_path)
+            if not manifest.needs_run(audio_path, "wav_to_srt", settings):
+                print(f"跳过未变化的文件: {audio_path}")
+                continue
+            pending.append(audio_path)
+
+    # 所有文件的识别窗口一起并发提交，阻塞的在线识别不再一个接一个地等待
+    results = recognize_files(pending, get_backend(ENGINE), "zh-CN", CONCURRENCY)
+    for audio_path in pending:
+        segments = results[audio_path]
+        if isinstance(segments, Exception):
+            print(f"生成SRT时出错: {segments}")
+            manifest.fail(audio_path, "wav_to_srt", settings, str(segments))
+            continue
+        srt_path = audio_path.replace(".wav", ".srt")
+        manifest.done(audio_path, "wav_to_srt", settings, [write_srt(srt_path, segments)])
 
 # 输入文件夹路径
 folder_path = "./videos"